@@ -60,6 +60,8 @@
 #   The script can be run in the command-line and its main function requires two paths as arguments:
 #       (a) path to areas directory (where IGES or/and DXF files are stored);
 #       (b) path to original Safir Structural 3D input file, whereto loads should be inserted.
+#       (c) [optional] path to cache directory, where SAFIR results of dummy shells are stored and reused when the
+#           dummy shell has not changed.
 #
 #   All files produced by script (including converted input file) will be stored in 'out-files' directory.
 #   The 'out-files' directory will be created in the same catalogue where original input file is.
@@ -74,11 +76,14 @@
 import sys
 from math import sqrt, isclose
 from os import scandir, makedirs
-from os.path import basename, dirname, abspath
+from os.path import basename, dirname, abspath, join
 import dxfgrabber
-from safir_tools import run_safir, ReadXML, read_in
+from safir_tools import run_safir, load_results, read_in, renumber as renumber_nodes, INFILE_CACHE
+from safir_cache import SafirCache
 import gmsh
 from numpy import interp
+import numpy as np
+from spatial import SpatialIndex, element_nodes, distances
 from shutil import rmtree
 
 
@@ -198,7 +203,9 @@ class DummyShell:
 
         return edges
 
-    def write(self):
+    # renumber=True orders gmsh nodes to reduce the bandwidth (reverse Cuthill-McKee), reactions are mapped to beams
+    # by coordinates of the nodes, so their tags do not matter
+    def write(self, renumber=False):
         node_template = ['      NODE     ', '  \n']
         element_template = ['      ELEM     ', '   1  \n']
         fix_template = ['     BLOCK     ', '   F0   F0   F0   F0   F0   F0   F0\n']
@@ -243,15 +250,19 @@ class DummyShell:
 
             dummy_sh.insert(-1, '   '.join(l_line))
 
-        with open(f'{self.calcdir}\dummy_{self.str_no}.in', 'w+') as d:
+        path = join(self.calcdir, f'dummy_{self.str_no}.in')
+        with open(path, 'w+') as d:
             d.write(''.join(dummy_sh))
+        if renumber:
+            renumber_nodes(path, out_path=path)
 
         if 'dummy.tsh' not in scandir(self.calcdir):
-            with open(f'{self.calcdir}\dummy.tsh', 'w') as d:
+            with open(join(self.calcdir, 'dummy.tsh'), 'w') as d:
                 d.writelines(self.section)
 
-    def run(self):
-        run_safir(f'{self.calcdir}\dummy_{self.str_no}.in', fix_rlx=False)
+    def run(self, cache=None, safir_exe_path='safir'):
+        run_safir(join(self.calcdir, f'dummy_{self.str_no}.in'), safir_exe_path=safir_exe_path, fix_rlx=False,
+                  cache=cache)
 
 
 class DummyShellIGES(DummyShell):
@@ -341,8 +352,8 @@ class DummyShellIGES(DummyShell):
 
 class DummyShellDXF(DummyShell):
     def __init__(self, number: int, path_to_file: str, element_size: float = None, calcdir: str = None):
+        self.dxf = dxfgrabber.readfile(path_to_file)    # required by geometry() called in DummyShell.__init__
         super().__init__(number, path_to_file, element_size=element_size, calcdir=calcdir)
-        self.dxf = dxfgrabber.readfile(self.filepath)
 
     # geometry from dxf file, mesh generated with gmsh, loads from layer name
     def geometry(self):
@@ -433,12 +444,15 @@ class DummyShellDXF(DummyShell):
         for e in range(len(gmsh_elements[0])):
             elements.append([gmsh_elements[1][4 * e + i] for i in range(4)])
 
+        # get edgenodes
+        etagsnodes = shell.mesh.getNodes(1, includeBoundary=True)
+
         gmsh.finalize()
 
         # add load attribute from DXF layers names
         self.load = dxf_areas[1]
 
-        return nodes, elements  # [[tag1, [x1,y1,z1]], ... n]   [[tag1, [nodetag1,nodetag1, ... nodetagm]], ... n]
+        return nodes, elements, etagsnodes  # [[tag1, [x1,y1,z1]], ... n]   [[tag1, [nodetag1, ... nodetagm]], ... n]
 
     # read edges from dxf file layer 'edges'
     def edges_from_file(self):
@@ -477,8 +491,13 @@ class DummyShellDXF(DummyShell):
 
 
 class Convert:
-    def __init__(self, path_to_areas: str, path_to_in: str):
-        self.paths = {'areas': path_to_areas, 'infile': path_to_in, 'calc': f'{dirname(path_to_in)}\\out-files'}
+    def __init__(self, path_to_areas: str, path_to_in: str, path_to_cache: str = None, safir_exe_path: str = 'safir',
+                 renumber: bool = False, parse_cache: str = None):
+        self.paths = {'areas': path_to_areas, 'infile': path_to_in, 'calc': join(dirname(path_to_in), 'out-files')}
+        self.cache = SafirCache(path_to_cache) if path_to_cache else None  # results of unchanged dummies are reused
+        self.safir_exe_path = safir_exe_path
+        self.renumber = renumber    # nodes of dummy shells renumbered before running SAFIR
+        self.parse_cache = parse_cache  # directory of parsed IN files (safir_tools.read_in)
         try:
             rmtree(self.paths['calc'], ignore_errors=True)
         except FileNotFoundError:
@@ -494,7 +513,7 @@ class Convert:
     def get_edges(self):
         gmsh.initialize()
         gmsh.model.add('edges')
-        gmsh.model.occ.importShapes(f'{self.paths["areas"]}\\edges.igs')
+        gmsh.model.occ.importShapes(join(self.paths['areas'], 'edges.igs'))
         gmsh.model.occ.synchronize()
 
         # find nodes of meshed edgelines
@@ -523,52 +542,62 @@ class Convert:
 
     def run_dummies(self):
         for d in self.prepare_dummies():
-            d.write()
-            d.run()
+            d.write(renumber=self.renumber)
+            d.run(cache=self.cache, safir_exe_path=self.safir_exe_path)
 
     def read_results(self):
         print('Reading results...', end='\r')
         reac_data = []
         for s in scandir(self.paths['calc']):
-            if all(i in s.name for i in ['XML', 'dummy']):
+            if s.is_file() and s.name.endswith('.XML') and 'dummy' in s.name:
                 dum_reac = [s.name.split('_')[-1][:-4]]
-                r = ReadXML(s.path)
-                # [[node_no, R(node_no)_dof1,...,R(node_no)_dof7],...,[node_no, R(node_no)_dof1,...,R(node_no)_dof7]]
-                reactions = r.reactions(-1)
-                nodes = r.nodes()  # [[p1x,p1y,p1z],...,[pnx, pny, pnz]]
-                for r in reactions:
-                    dum_reac.append([nodes[r[0] - 1], r[1:]])  # convert node_no to its position in list
+                # XML is converted to NumPy arrays once, next runs load them from the dummy_<no>_npy directory
+                r = load_results(s.path)
+                nodes = r.nodes  # [[p1x,p1y,p1z],...,[pnx, pny, pnz]]
+                # reactions at the last step [[R(node_no)_dof1,...,R(node_no)_dof7],...]
+                for node_no, reaction in zip(r.reaction_nodes, r.reactions[-1]):
+                    dum_reac.append([nodes[node_no - 1].tolist(), reaction.tolist()])  # node_no to its position
                 reac_data.append(dum_reac)
 
         print('[OK] Results read    ') if reac_data else print('[WARNING] Results matrix is empty')
         return reac_data  # [[dummy_no, [p1: list(len=3), r1: list(len=NRDOF)], [p2, r2], ... [pn, rn]]]
 
     def assign_loads(self, reactions: list[list[list]], function='F1', mass=False):
-        def map_l2e(points: list, reactions: list[list[list]]):
+        def map_l2e(points: list, reactions: list[list[list]], index: SpatialIndex, near: list):
             e_load = []  # summary line load per element with given endpoints
-            d1 = 999
-            d2 = 999
             middle = points[1][1:]
             length = distance(points[0][1:], points[2][1:])
-
-            # find the nearest reaction point
-            to_inter = [None, None]
-            for r in reactions:
-                d_r = distance(r[0], middle)
-                if all([isclose(middle[i], r[0][i], rel_tol=0.01) for i in range(3)]):
-                    return [-load / length for load in r[1]]
-                elif d_r < d1:
-                    d1 = d_r
-                    to_inter[0] = r
+            if not reactions:
+                return []
+
+            # reaction point matching the middle point of beam (the first one), it has to be inside the box around
+            # the middle point for isclose to hold
+            tolerance = 0.011 * np.abs(middle)
+            for r in index.box(middle - tolerance, middle + tolerance):
+                if all([isclose(middle[i], reactions[r][0][i], rel_tol=0.01) for i in range(3)]):
+                    return [-load / length for load in reactions[r][1]]
+
+            # find the nearest reaction point (near are reaction points nearest to the middle and distances to them)
+            to_inter = [reactions[near[0][0]], None]
+            d1 = distance(to_inter[0][0], middle)
+            d2 = 999
 
             # find opposite point if there is no direct matching between reaction point and middle point of beam
-            # check if it is almost between
-            for r in reactions:
-                if is_between(to_inter[0][0], middle, r[0]):
-                    d_r = distance(r[0], middle)
-                    if d_r < d2:
-                        d2 = d_r
-                        to_inter[1] = r
+            # check if it is almost between - the nearest such point is looked for among the near ones first, then
+            # among all of them
+            def between(candidates, d_r):
+                d_a = np.sqrt(((index.points[candidates] - to_inter[0][0]) ** 2).sum(axis=1))
+                found = np.abs(d1 + d_r - d_a) <= 0.0001 * np.maximum(d1 + d_r, d_a)
+                return candidates[found], d_r[found]
+
+            opposite = between(*near)
+            if len(near[0]) < len(index) and not (len(opposite[0]) and opposite[1][0] < near[1][-1]):
+                d_r = distances(np.array([middle]), index.points)[0]
+                order = np.argsort(d_r, kind='stable')
+                opposite = between(order, d_r[order])
+            if len(opposite[0]):
+                to_inter[1] = reactions[opposite[0][0]]
+                d2 = distance(to_inter[1][0], middle)
 
             for dof in range(6):  # for every DOF
                 try:
@@ -579,19 +608,21 @@ class Convert:
 
             return e_load
 
-        infile = read_in(self.paths['infile'])
+        infile = read_in(self.paths['infile'], cache=self.parse_cache)
         lloaded = infile.file_lines
         load_template = ' DISTRBEAM    {}    {}    {}    {}\n'
         mass_template = '    M_BEAM    {}    {}    2\n'
 
         # map beam elements to lineloads from each dummyfile
         for dummy in reactions:
+            index = SpatialIndex([r[0] for r in dummy[1:]])    # reaction points of the dummy
+            near = index.k_nearest(element_nodes(infile, 'beams', 1), 16)     # to middle nodes of all beams at once
             converted_loads = [f'   FUNCTION {function}\n', '  END_LOAD\n']
-            for be in infile.beams:
+            for i, be in enumerate(infile.beams):
                 # start, middle, end point of beam element like [x,y,z]
-                # convert node_no to its position in node list (-1)
-                points = [infile.nodes[int(i) - 1] for i in be[1:4]]
-                elem_loads = map_l2e(points, dummy[1:])     # mapping function
+                # nodes found by their tags (numbering may be sparse)
+                points = [infile.nodes.entity(int(i)) for i in be[1:4]]
+                elem_loads = map_l2e(points, dummy[1:], index, [a[i] for a in near])     # mapping function
                 converted_loads.insert(-1, load_template.format(be[0], *elem_loads)) if elem_loads else None
 
             print(f'[INFO] {len(converted_loads) - 2} elements mapped with dummy_{dummy[0]}')
@@ -604,7 +635,7 @@ class Convert:
                     lloaded = lloaded[:lloaded.index(line) + 1] + converted_loads + lloaded[lloaded.index(line) + 1:]
                     break
 
-        with open(f'{self.paths["calc"]}\\{infile.chid}_ll.in', 'w') as file:
+        with open(join(self.paths['calc'], f'{infile.chid}_ll.in'), 'w') as file:
             file.write(''.join(lloaded))
 
     def convert(self):
@@ -617,6 +648,6 @@ class Convert:
 
 
 if __name__ == '__main__':
-    case = Convert(*[abspath(p) for p in sys.argv[1:]])
+    case = Convert(*[abspath(p) for p in sys.argv[1:]], parse_cache=INFILE_CACHE)
     case.convert()
     exit(0)
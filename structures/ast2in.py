@@ -5,7 +5,8 @@ from os import scandir
 import argparse
 
 import safir_tools as st
-import numpy as np
+from safir_cache import SafirCache
+from spatial import SpatialIndex, middles
 import csv
 
 '''FDS results handling - Adiabatic Surface Temperature devices'''
@@ -95,7 +96,7 @@ class AST:
 
 # import InFile
 class Calculate4AST:
-    def __init__(self, inpath, fdspath, calc_dir='calc_files', config_dir='./config'):
+    def __init__(self, inpath, fdspath, calc_dir='calc_files', config_dir='./config', parse_cache=None):
         # set paths
         self.calc_dir = pjoin('.', calc_dir)
         try:
@@ -106,10 +107,11 @@ class Calculate4AST:
         self.config_path = config_dir
 
         # import data
-        self.infile = st.read_in(inpath)
+        self.infile = st.read_in(inpath, cache=parse_cache)
         self.middles = self.find_middles()
         self.truss_middles = self.find_middles(enttype='t')
         self.asts = AST(fdspath, self.calc_dir)
+        self.ast_index = SpatialIndex(list(self.asts.locations.values()), tags=list(self.asts.locations))
 
         # create attributes
         self.newbeams = []
@@ -123,43 +125,25 @@ class Calculate4AST:
             file.write('0 20\n99999 20\n')
 
 
-    # find middle node of beams
+    # find middle node of beams (middle point of trusses)
     def find_middles(self, enttype='b'):
-        mids = []
-        if enttype == 'b':
-            for b in self.infile.beams:
-                mids.append(self.infile.nodes[b[2] - 1][1:])    # middle node tag of the BEAM element is b[2]
-        elif enttype == 't':
-            for t in self.infile.trusses:
-                truss_points = [np.array(self.infile.nodes[t[i]-1][1:]) for i in [0, 1]]
-                mids.append(truss_points[0] + (truss_points[1] - truss_points[0])/2)
-
-        else:
+        if enttype not in ['b', 't']:
             raise ValueError('Invalid "enttype" in find_middles function')
 
-        return mids  # [[x1, y2, z2], ... [xn, yn, zn]]
-
-    # find the nearest AST device to the point
-    def find_ast(self, point):
-        def what_dist(p1, p2):
-            return np.linalg.norm(np.array(p1) - np.array(p2))
-
-        asttag = ''
-        min_dist = 1e9
-        all_asts = self.asts.locations
+        return middles(self.infile, 'beams' if enttype == 'b' else 'trusses')  # [[x1, y2, z2], ... [xn, yn, zn]]
 
-        for ak, av in all_asts.items():
-            actual_dist = what_dist(point, av)
-            if actual_dist < min_dist:
-                min_dist = actual_dist
-                asttag = ak
+    # find the nearest AST device to each of the points
+    def find_ast(self, points):
+        if not len(self.ast_index):
+            return [''] * len(points)
 
-        return asttag
+        return self.ast_index.nearest(points)[0].tolist()
 
     # assign btypes to proper beams
     def assign2beams(self):
+        asts = self.find_ast(self.middles)
         for i, b in enumerate(self.infile.beams):
-            newbtype = [f'{self.infile.beamtypes[b[-1] - 1][0][:-4]}_{self.find_ast(self.middles[i])}.tem',
+            newbtype = [f'{self.infile.beamtypes[b[-1] - 1][0][:-4]}_{asts[i]}.tem',
                         self.infile.beamtypes[b[-1] - 1][1]]
             try:
                 newbtypeindex = self.newbeamtypes.index(newbtype)
@@ -173,8 +157,9 @@ class Calculate4AST:
 
     # assign temp_curves to proper trusses
     def assign2trusses(self):
+        asts = self.find_ast(self.truss_middles)
         for i, t in enumerate(self.infile.trusses):
-            newttype = [f'{self.find_ast(self.truss_middles[i])}.txt',
+            newttype = [f'{asts[i]}.txt',
                         *self.infile.trusstypes[t[-1]-1][1:]]
             try:
                 newttypeindex = self.newtrusstypes.index(newttype)
@@ -193,7 +178,7 @@ class Calculate4AST:
                 return [str(i) for i in item]
             return str(item)
 
-        newinfilelines = []
+        patch = st.Patch(self.infile.file_lines)    # old lines are replaced, deleted or preceded by new ones
 
         # === wrt ===
         # -2    don't edit
@@ -203,76 +188,69 @@ class Calculate4AST:
         # 1     save newbeams
         # 1.5   save newtrusses
         wrt = -2
-        for line in self.infile.file_lines:
+        for i, line in enumerate(self.infile.file_lines):
             # save new beam number
             if 'ELEMENTS' in line:
                 wrt = -1
-                newinfilelines.append(line)
 
             elif wrt == -1:
-                newinfilelines.append('\t'+'\t'.join(line.split()[:-1]+[str(len(self.newbeamtypes))])+'\n')
+                patch.replace(i, '\t'+'\t'.join(line.split()[:-1]+[str(len(self.newbeamtypes))])+'\n')
                 wrt = -2
 
             elif line.startswith('     TRUSS'):
-                newinfilelines.append('\t'.join(line.split()[:-1]+[str(len(self.newtrusstypes))])+'\n')
+                patch.replace(i, '\t'.join(line.split()[:-1]+[str(len(self.newtrusstypes))])+'\n')
 
             # write new beams an beamtypes
             elif 'NODOFBEAM' in line:
-                newinfilelines.append(line)     # add current line
                 wrt = 0
 
             elif wrt == -2:
-                newinfilelines.append(line)     # add current line
+                continue    # keep current line
 
             elif wrt == 0 and 'ELEM' in line:
                 # add new beamtypes
                 for b in self.newbeamtypes:
                     translation = '\n'.join([f'TRANSLATE  {to_str(i+1)}  {to_str(t)}' for i, t in enumerate(b[1])])
-                    newinfilelines.append(f'{b[0]}\n{translation}\nEND_TRANS\n')
+                    patch.insert(i, f'{b[0]}\n{translation}\nEND_TRANS\n')
+                patch.delete(i)
                 wrt = 1
 
             elif wrt == 0:
-                continue    # pass old beamtypes
+                patch.delete(i)    # pass old beamtypes
 
             elif wrt == 1:
                 if 'ELEM' not in line:
-                    [newinfilelines.append(f'\t\tELEM\t{"    ".join(to_str(b))}\n') for b in self.newbeams]   # add all new beams
+                    [patch.insert(i, f'\t\tELEM\t{"    ".join(to_str(b))}\n') for b in self.newbeams]   # add all new beams
 
                     if 'NODOFTRUSS' in line:    # switch to trusses
-                        newinfilelines.append(line)
                         wrt = 0.5
                     else:
                         wrt = -2    # stop passing routine
                 else:
-                    continue  # pass old beam definitions
+                    patch.delete(i)  # pass old beam definitions
 
             # write new trusses an trusstypes
             elif 'NODOFTRUSS' in line:
-                newinfilelines.append(line)
                 wrt = 0.5
 
-            elif wrt == -2:
-                newinfilelines.append(line)     # add current line
-
             elif wrt == 0.5 and 'ELEM' in line:
                 # add new trusstypes
                 for t in self.newtrusstypes:
-                    newinfilelines.append('\t'.join(to_str(t) + ['\n']))
+                    patch.insert(i, '\t'.join(to_str(t) + ['\n']))
+                patch.delete(i)
                 wrt = 1.5
 
-            elif wrt == 0:
-                continue    # pass old trusstypes
+            elif wrt == 0.5:
+                patch.delete(i)    # pass old trusstypes
 
             elif wrt == 1.5:
                 if any(['ELEM' not in line, 'RELAX_ELEM' in line]):
-                    [newinfilelines.append(f'\t\tELEM\t{"    ".join(to_str(t))}\n') for t in self.newtrusses]   # add all new trusses
-                    newinfilelines.append(line)
+                    [patch.insert(i, f'\t\tELEM\t{"    ".join(to_str(t))}\n') for t in self.newtrusses]   # add all new trusses
                     wrt = -2    # stop passing routine
                 else:
-                    continue  # pass old truss definitions
+                    patch.delete(i)  # pass old truss definitions
 
-        with open(pjoin(self.calc_dir, f'{self.infile.chid}_ast.in'),'w') as f:
-            f.writelines(newinfilelines)
+        patch.write(pjoin(self.calc_dir, f'{self.infile.chid}_ast.in'))
 
         return 0
 
@@ -314,7 +292,7 @@ class Calculate4AST:
                 copyfile(pjoin(self.config_path, f'{prof[0][:-4]}{tor_suffix}'),
                          pjoin(self.calc_dir, f'{prof[0][:-4]}{tor_suffix}'))
 
-    def run_t2d(self, safir_path, safir_version=2019):
+    def run_t2d(self, safir_path, safir_version=2019, cache=None):
         self.asts.csv2safir()
 
         tor = '-t.TOR' if safir_version >= 2022 else '-1.T0R'
@@ -329,11 +307,11 @@ class Calculate4AST:
                 ext = spltd[-1]
 
             if ext.lower() == 'in' and f'{chid}.tem' in [nbt[0] for nbt in self.newbeamtypes]:
-                st.run_safir(i.path, safir_exe_path=safir_path, fix_rlx=False)
+                st.run_safir(i.path, safir_exe_path=safir_path, fix_rlx=False, cache=cache)
                 insert_tor(f'{i.path[:-3]}.tem', i.path[:-3]+tor)
     
-    def run_s3d(self, safir_path):
-        st.run_safir(f'{self.infile.chid}_ast.in', safir_exe_path=safir_path)
+    def run_s3d(self, safir_path, cache=None):
+        st.run_safir(f'{self.infile.chid}_ast.in', safir_exe_path=safir_path, cache=cache)
 
 
 ### from iso2nf.py
@@ -391,11 +369,13 @@ if __name__ == '__main__':
     parser.add_argument('-f', '--fds', help='Path to FDS input file', type=str, required=True)
     parser.add_argument('-i', '--infile',type=str, help='SAFIR structural input file IN', required=True)
     parser.add_argument('-v', '--safir_version', help='Major version of SAFIR you use (2019 or 2022)', default=2019, type=int)
+    parser.add_argument('-c', '--cache', help='Path to directory with cached SAFIR results', default=None, type=str)
 
     args = parser.parse_args()
     # argv = [..., 'SAFIR mechanical input file path', 'FDS input file']
-    a = Calculate4AST(args.infile, args.fds)
+    a = Calculate4AST(args.infile, args.fds, parse_cache=st.INFILE_CACHE)
     a.edit_in()
-    a.run_t2d(args.safir)
-    a.run_s3d(args.safir)
+    cache = SafirCache(args.cache) if args.cache else None
+    a.run_t2d(args.safir, cache=cache)
+    a.run_s3d(args.safir, cache=cache)
 
@@ -0,0 +1,393 @@
+import argparse as ar
+import json
+import os
+import shutil
+import tempfile
+from contextlib import nullcontext, redirect_stdout
+from importlib import import_module
+from math import ceil
+from os.path import abspath, dirname, join
+from time import perf_counter
+
+'''Timing pipeline stages (run_safir, iso2nf, manycfds, area2lineload, IN file parsers) on generated models with mock SAFIR executable,
+so regressions in the orchestration code show up without a license and hours of real solver time. Solver time of the frame
+before and after renumbering of the nodes (run_safir vs run_safir_rcm) needs real SAFIR executable (-e)'''
+
+MOCK_SAFIR = join(dirname(abspath(__file__)), 'mock_safir.py')
+PROFILES = ['hea180', 'ipe300']     # profile of columns (beam type 1) and beams (beam type 2)
+SIZES = {'small': {'bays': 3, 'storeys': 2, 'fibers': 50},  # bays in X and Y direction, fibers of each section
+         'medium': {'bays': 6, 'storeys': 3, 'fibers': 100},
+         'large': {'bays': 10, 'storeys': 5, 'fibers': 200},
+         'huge': {'bays': 52, 'storeys': 26, 'fibers': 50}}  # over 500k nodes, for parsers rather than pipeline
+STAGES = {'run_safir': 'safir_tools', 'iso2nf': 'iso2nf', 'manycfds': 'manycfds', 'area2lineload': 'area2lineload',
+          'read_in': 'safir_tools', 'read_in_cached': 'safir_tools', 'read_in_legacy': 'safir_tools',
+          'renumber': 'safir_tools',
+          'run_safir_rcm': 'safir_tools'}
+SPAN = 6.0  # [m]
+HEIGHT = 4.0    # [m]
+T_END = 1800.0  # [s]
+T_PRINT = 300.0     # [s]
+
+
+def frame(path, bays, storeys, fibers):
+    '''Writing structural input file of steel frame with HEA180 columns and IPE300 beams'''
+    nodes = [[i * SPAN, j * SPAN, k * HEIGHT] for k in range(storeys + 1) for j in range(bays + 1)
+             for i in range(bays + 1)]
+
+    def joint(i, j, k):
+        return k * (bays + 1) ** 2 + j * (bays + 1) + i + 1
+
+    # [start, end, beam type], orientation node is the next after the middle one
+    members = []
+    for k in range(storeys):
+        members += [[joint(i, j, k), joint(i, j, k + 1), 1] for j in range(bays + 1) for i in range(bays + 1)]
+        members += [[joint(i, j, k + 1), joint(i + 1, j, k + 1), 2] for j in range(bays + 1) for i in range(bays)]
+        members += [[joint(i, j, k + 1), joint(i, j + 1, k + 1), 2] for j in range(bays) for i in range(bays + 1)]
+
+    elements = []
+    for start, end, btype in members:
+        middle = [(a + b) / 2 for a, b in zip(nodes[start - 1], nodes[end - 1])]
+        nodes.append(middle)
+        nodes.append([middle[0] + 1, middle[1], middle[2]] if btype == 1 else [middle[0], middle[1], middle[2] + 1])
+        elements.append([start, len(nodes) - 1, end, len(nodes), btype])
+
+    lines = ['Frame generated by benchmark.py\n', '\n',
+             f'     NNODE    {len(nodes)}\n', '      NDIM    3\n', '   NDOFMAX    7\n', '    NCORES    1\n',
+             'STATIC    PURE_NR\n', '     NLOAD    1\n', '   OBLIQUE    0\n', '  COMEBACK    0.0001\n',
+             '   NORENUM\n', '      NMAT    1\n', 'ELEMENTS\n', f'      BEAM    {len(elements)}    2\n',
+             '        NG    2\n', f'    NFIBER    {fibers}\n', '  END_ELEM\n', '     NODES\n']
+    lines += [f'      NODE    {t + 1}    {x:.3f}    {y:.3f}    {z:.3f}\n' for t, (x, y, z) in enumerate(nodes)]
+    lines += [' FIXATIONS\n']
+    lines += [f'     BLOCK    {t}    F0    F0    F0    F0    F0    F0    F0\n' for t in range(1, (bays + 1) ** 2 + 1)]
+    lines += ['   END_FIX\n', 'NODOFBEAM\n']
+    for p in PROFILES:
+        lines += [f'{p}.tem\n', ' TRANSLATE    1    1\n', ' END_TRANS\n']
+    lines += [f'      ELEM    {t + 1}    {"    ".join(str(n) for n in e)}\n' for t, e in enumerate(elements)]
+    lines += [' PRECISION    1.0E-3\n', 'LOADS\n', '  FUNCTION    F1\n']
+    lines += [f' DISTRBEAM    {t + 1}    0.0    0.0    -10000.0\n' for t, e in enumerate(elements) if e[-1] == 2]
+    lines += ['  END_LOAD\n', ' MATERIALS\n', 'STEELEC3EN\n', '    2.10E+11    0.3    3.55E+08    1200.    1200.\n',
+              'TIME\n', f'    10.0    {T_END}\n', 'ENDTIME\n', 'LARGEDISPL\n', 'EPSTH\n', 'IMPRESSION\n', 'TIMEPRINT\n',
+              f'    {T_PRINT}    {T_END}\n', 'END_TIMEPR\n', 'PRINTREACT\n', 'PRINTMN\n']
+
+    with open(path, 'w') as file:
+        file.writelines(lines)
+
+    return len(nodes), len(elements)
+
+
+def section(path, profile, fibers):
+    '''Writing thermal input file of rectangular section meshed with given number of SOLID elements (fibers)'''
+    ny = max(int(fibers ** 0.5), 1)
+    nz = fibers // ny
+    size = [0.2 / ny, 0.2 / nz]
+    nodes = [[iy * size[0] - 0.1, iz * size[1] - 0.1] for iz in range(nz + 1) for iy in range(ny + 1)]
+
+    lines = [f'Section {profile} generated by benchmark.py\n', '\n',
+             f'     NNODE    {len(nodes)}\n', '      NDIM    2\n', '   NDOFMAX    1\n', 'ELEMENTS\n',
+             f'     SOLID    {ny * nz}\n', '        NG    2\n', '     NVOID    0\n', '  END_ELEM\n',
+             '  TEMPERAT\n', '      TETA    0.9\n', '  TINITIAL    20.0\n', 'MAKE.TEM\n', '   NORENUM\n',
+             '      NMAT    1\n', '     NODES\n']
+    lines += [f'      NODE    {t + 1}    {y:.4f}    {z:.4f}\n' for t, (y, z) in enumerate(nodes)]
+    lines += ['NODOFSOLID\n']
+    frontier = []
+    for iz in range(nz):
+        for iy in range(ny):
+            tag = iz * ny + iy + 1
+            n1 = iz * (ny + 1) + iy + 1
+            lines.append(f'      ELEM    {tag}    {n1}    {n1 + 1}    {n1 + ny + 2}    {n1 + ny + 1}    1    0.\n')
+            if iz in {0, nz - 1} or iy in {0, ny - 1}:
+                frontier.append(f'   F  {tag}    FISO    FISO    FISO    FISO\n')
+    lines += ['  FRONTIER\n', *frontier, '  END_FRONT\n', '  SYMMETRY\n', '   END_SYM\n', ' PRECISION    1.0E-3\n',
+              ' MATERIALS\n', 'STEELEC3EN\n', '    25.    4.    0.7\n', 'TIME\n', f'    60.0    {T_END}\n',
+              'ENDTIME\n', 'IMPRESSION\n', 'TIMEPRINT\n', f'    {T_PRINT}    {T_END}\n', 'END_TIMEPR\n']
+
+    with open(path, 'w') as file:
+        file.writelines(lines)
+
+    return ny * nz
+
+
+def torsion(path, fibers):
+    '''Writing results of torsion analysis (T0R file)'''
+    with open(path, 'w') as file:
+        file.write(f' NFIBERBEAM    {fibers}\n NMAT    1\n STEELEC3EN\n\n w\n')
+        file.writelines(f'{i + 1:>8}    {(i % 7 - 3) * 1e-4:.4E}\n' for i in range(fibers))
+        file.write(' GJ    0.1500E+06\n\n COLD\n')
+
+
+def transfer(path, domain, step=60.0):
+    '''Writing CFD transfer file with uniform heat flux in [XA, XB, YA, YB, ZA, ZB] domain'''
+    axes = []
+    for start, end in zip(domain[::2], domain[1::2]):
+        cells = max(ceil((end - start) / (SPAN / 2)), 1)     # cell size of about half of the span
+        axes.append([start + (end - start) * c / cells for c in range(cells + 1)])
+    points = [[x, y, z] for x in axes[0] for y in axes[1] for z in axes[2]]
+    times = [step * i for i in range(int(T_END / step) + 1)]
+
+    with open(path, 'w') as file:
+        file.write(f'TRANSFER FILE generated by benchmark.py\nNSTEPS\n    {len(times)}\nNP\n    {len(points)}\n'
+                   'XYZ_INTENSITIES\n')
+        file.writelines(f'    {x:.3f}    {y:.3f}    {z:.3f}\n' for x, y, z in points)
+        file.write('END_XYZ\n')
+        for t in times:
+            file.write(f'TIME\n    {t}\n')
+            file.writelines(f'    {min(t, 600) * 50:.1f}\n' for _ in points)
+
+
+def areas(path, bays):
+    '''Writing DXF file with floor slab (3DFACE) loaded with 3.5 kPa'''
+    corners = [[0, 0], [bays * SPAN, 0], [bays * SPAN, bays * SPAN], [0, bays * SPAN]]
+    face = ['0', '3DFACE', '8', '0 0 -3500']
+    for no, (x, y) in enumerate(corners):
+        face += [f'1{no}', str(x), f'2{no}', str(y), f'3{no}', str(HEIGHT)]
+
+    with open(path, 'w') as file:
+        file.write('\n'.join(['0', 'SECTION', '2', 'ENTITIES', *face, '0', 'ENDSEC', '0', 'EOF']) + '\n')
+
+
+def produced(directory, before):
+    '''Number and size of files created or modified in the directory tree'''
+    count = size = 0
+    for root, dirs, files in os.walk(directory):
+        for f in files:
+            path = join(root, f)
+            stat = os.stat(path)
+            if before.get(path) != (stat.st_size, stat.st_mtime_ns):
+                count += 1
+                size += stat.st_size
+    return count, size
+
+
+def snapshot(directory):
+    files = {}
+    for root, dirs, names in os.walk(directory):
+        for f in names:
+            stat = os.stat(join(root, f))
+            files[join(root, f)] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+class Benchmark:
+    def __init__(self, size, work_dir, jobs=1, verbose=False, safir=MOCK_SAFIR):
+        self.size = size
+        self.dir = join(work_dir, size)
+        self.config = join(self.dir, 'config')
+        self.parse_cache = join(work_dir, 'parse_cache', size)  # outside of the model directory watched for results
+        self.jobs = jobs
+        self.verbose = verbose
+        self.safir = safir  # SAFIR executable of the solver stages
+        self.results = []
+        self.model = {}
+
+    def prepare(self):
+        params = SIZES[self.size]
+        os.makedirs(join(self.config, 'transfer_files'), exist_ok=True)
+        nnode, nbeam = frame(join(self.dir, 'frame.IN'), params['bays'], params['storeys'], params['fibers'])
+        for p in PROFILES:
+            fibers = section(join(self.config, f'{p}.IN'), p, params['fibers'])
+            torsion(join(self.config, f'{p}-1.T0R'), fibers)
+
+        # two fire compartments split in half of the frame length
+        length = params['bays'] * SPAN
+        height = params['storeys'] * HEIGHT
+        transfer(join(self.config, 'transfer_files', 'cfd_1.txt'), [0, length / 2, 0, length, 0, height])
+        transfer(join(self.config, 'transfer_files', 'cfd_2.txt'), [length / 2, length, 0, length, 0, height])
+
+        os.makedirs(join(self.dir, 'areas'), exist_ok=True)
+        areas(join(self.dir, 'areas', 'floor.dxf'), params['bays'])
+        self.model = {'nodes': nnode, 'beams': nbeam, 'fibers': params['fibers']}
+
+    # fresh copy of the structural model for each stage
+    def stage_dir(self, stage, files=()):
+        path = join(self.dir, stage)
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        for f in ['frame.IN', *files]:
+            shutil.copy2(join(self.dir, f) if f == 'frame.IN' else join(self.config, f), path)
+        return path
+
+    def run_safir(self):
+        path = self.stage_dir('run_safir', files=[f'{p}.IN' for p in PROFILES])
+        from safir_tools import run_safir
+        for p in PROFILES:
+            run_safir(join(path, f'{p}.IN'), safir_exe_path=self.safir, print_time=False, fix_rlx=False)
+        run_safir(join(path, 'frame.IN'), safir_exe_path=self.safir, print_time=False)
+        return path
+
+    def iso2nf(self):
+        path = self.stage_dir('iso2nf')
+        import iso2nf
+        iso2nf.run_user_mode(0, iso2nf.get_arguments(['-c', self.config, '-s', self.safir, '-r', join(path, 'frame.IN'),
+                                                      '-m', 'locafi', '-v', 'warning', '-j', str(self.jobs)]))
+        return path
+
+    def manycfds(self):
+        path = self.stage_dir('manycfds')
+        from manycfds import ManyCfds
+        ManyCfds(self.config, join(self.config, 'transfer_files'), join(path, 'frame.IN'), self.safir,
+                 jobs=self.jobs).main()
+        return path
+
+    def area2lineload(self):
+        path = self.stage_dir('area2lineload')
+        from area2lineload import Convert
+        Convert(join(self.dir, 'areas'), join(path, 'frame.IN'), safir_exe_path=self.safir).convert()
+        return path
+
+    # single pass parser of the structural input file
+    def read_in(self):
+        from safir_tools import read_in
+        read_in(join(self.dir, 'frame.IN'), cache=None)
+
+    # the same file restored from the parse cache filled before the stage
+    def read_in_cached(self):
+        from safir_tools import read_in
+        read_in(join(self.dir, 'frame.IN'), cache=self.parse_cache)
+
+    # the same tables scanned one by one, as InFile did before the single pass parser
+    def read_in_legacy(self):
+        from safir_tools import InFile
+        infile = InFile.__new__(InFile)
+        with open(join(self.dir, 'frame.IN')) as file:
+            infile.file_lines = file.readlines()
+        [infile.get(e) for e in ['nodes', 'trusses', 'beams', 'shells', 'solids']]
+        infile.get_beamparameters()
+        infile.get_types()
+        infile.get_time()
+        infile.get_materials()
+
+    # reverse Cuthill-McKee order of the frame nodes (middle and orientation nodes are numbered after all joints)
+    def renumber(self):
+        path = self.stage_dir('renumber')
+        from safir_tools import renumber
+        _, before, after = renumber(join(path, 'frame.IN'))
+        return {'bandwidth': [before[0], after[0]], 'profile': [before[1], after[1]]}
+
+    # run_safir of the frame renumbered in place (renumbering itself is timed by the renumber stage)
+    def run_safir_rcm(self):
+        path = self.stage_dir('run_safir_rcm', files=[f'{p}.IN' for p in PROFILES])
+        from safir_tools import run_safir, renumber
+        renumber(join(path, 'frame.IN'), out_path=join(path, 'frame.IN'))
+        for p in PROFILES:
+            run_safir(join(path, f'{p}.IN'), safir_exe_path=self.safir, print_time=False, fix_rlx=False)
+        run_safir(join(path, 'frame.IN'), safir_exe_path=self.safir, print_time=False)
+        return path
+
+    def run(self, stages=tuple(STAGES)):
+        print(f'[INFO] Preparing {self.size} model...')
+        self.prepare()
+        print(f'[INFO] {self.size} model: {self.model["nodes"]} nodes, {self.model["beams"]} beams, '
+              f'{self.model["fibers"]} fibers per section')
+
+        for stage in stages:
+            try:
+                import_module(STAGES[stage])
+            except (ImportError, OSError) as e:
+                # optional dependencies of the stage (e.g. gmsh) are missing
+                print(f'[WARNING] {self.size} {stage} skipped: {e}')
+                continue
+            if stage == 'read_in_cached':
+                from safir_tools import read_in
+                shutil.rmtree(self.parse_cache, ignore_errors=True)
+                read_in(join(self.dir, 'frame.IN'), cache=self.parse_cache)
+
+            before = snapshot(self.dir)
+            cwd = os.getcwd()
+            start = perf_counter()
+            try:
+                with open(os.devnull, 'w') as devnull, nullcontext() if self.verbose else redirect_stdout(devnull):
+                    os.chdir(self.dir)  # some scripts write to the working directory
+                    extra = getattr(self, stage)()
+            except Exception as e:
+                print(f'[ERROR] {self.size} {stage} failed: {type(e).__name__}: {e}')
+                continue
+            finally:
+                os.chdir(cwd)
+            duration = perf_counter() - start
+            files, size = produced(self.dir, before)
+
+            self.results.append({'size': self.size, 'stage': stage, 'time': duration, 'files': files,
+                                 'mb': size / 2**20, 'mb_s': size / 2**20 / duration, **self.model,
+                                 **(extra if isinstance(extra, dict) else {})})
+            print(f'[OK] {self.size} {stage}: {duration:.2f} s, {files} files, {size / 2**20:.1f} MB')
+
+        return self.results
+
+
+# compare results with the previous run, regression when stage is slower than tolerance
+def compare(results, baseline_path, tolerance=0.2):
+    with open(baseline_path) as file:
+        baseline = {(b['size'], b['stage']): b for b in json.load(file)}
+
+    regressions = 0
+    for r in results:
+        b = baseline.get((r['size'], r['stage']))
+        if not b:
+            continue
+        ratio = r['time'] / b['time']
+        r['baseline'] = b['time']
+        if ratio > 1 + tolerance:
+            regressions += 1
+            print(f'[WARNING] {r["size"]} {r["stage"]} is {ratio:.2f} times slower than baseline '
+                  f'({r["time"]:.2f} s vs {b["time"]:.2f} s)')
+
+    print(f'[OK] No regressions against {baseline_path}') if not regressions else None
+    return regressions
+
+
+def summary(results):
+    print(f'\n{"size":<8}{"stage":<15}{"time [s]":>10}{"files":>8}{"MB":>10}{"MB/s":>10}')
+    for r in results:
+        print(f'{r["size"]:<8}{r["stage"]:<15}{r["time"]:>10.2f}{r["files"]:>8}{r["mb"]:>10.1f}{r["mb_s"]:>10.1f}')
+
+    renumbered = [r for r in results if 'bandwidth' in r]
+    if renumbered:
+        print(f'\n{"size":<8}{"bandwidth":>20}{"profile":>30}')
+        for r in renumbered:
+            print(f'{r["size"]:<8}{r["bandwidth"][0]:>10}{r["bandwidth"][1]:>10}{r["profile"][0]:>15}'
+                  f'{r["profile"][1]:>15}')
+
+
+def get_arguments():
+    parser = ar.ArgumentParser(description='Benchmark of pipeline stages with mock SAFIR executable')
+    parser.add_argument('-s', '--sizes', nargs='+', choices=list(SIZES), default=['small', 'medium'],
+                        help='Model sizes to be benchmarked [small and medium by default]')
+    parser.add_argument('-t', '--stages', nargs='+', choices=list(STAGES), default=list(STAGES),
+                        help='Pipeline stages to be benchmarked [all by default]')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Cores used by concurrent thermal analyses')
+    parser.add_argument('-e', '--safir', default=MOCK_SAFIR,
+                        help='SAFIR executable of the solver stages, e.g. to compare run_safir with run_safir_rcm '
+                             '[mock SAFIR by default]')
+    parser.add_argument('-d', '--delay', type=float, default=0, help='Mock SAFIR wall clock time per time step [s]')
+    parser.add_argument('-n', '--steps', type=int, default=None, help='Mock SAFIR number of time steps printed')
+    parser.add_argument('-w', '--work_dir', default=None, help='Directory for models [temporary by default]')
+    parser.add_argument('-o', '--output', default=None, help='Save results to JSON file')
+    parser.add_argument('-b', '--baseline', default=None, help='Compare with results saved previously')
+    parser.add_argument('-r', '--tolerance', type=float, default=0.2,
+                        help='Relative slowdown reported as regression [0.2 by default]')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Show output of the pipeline stages')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_arguments()
+    os.environ['MOCK_SAFIR_DELAY'] = str(args.delay)
+    if args.steps:
+        os.environ['MOCK_SAFIR_STEPS'] = str(args.steps)
+
+    work_dir = abspath(args.work_dir) if args.work_dir else tempfile.mkdtemp(prefix='fireeng-benchmark-')
+    results = []
+    for s in args.sizes:
+        results += Benchmark(s, work_dir, jobs=args.jobs, verbose=args.verbose,
+                             safir=abspath(args.safir)).run(args.stages)
+
+    summary(results)
+    if args.baseline:
+        compare(results, abspath(args.baseline), tolerance=args.tolerance)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=4)
+        print(f'[OK] Results saved to {args.output}')
+    if not args.work_dir:
+        shutil.rmtree(work_dir, ignore_errors=True)
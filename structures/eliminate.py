@@ -3,8 +3,8 @@ from sys import argv
 
 
 class Eliminator:
-    def __init__(self, infilepath):
-        self.infile = st.read_in(infilepath)
+    def __init__(self, infilepath, parse_cache=None):
+        self.infile = st.read_in(infilepath, lazy=True, cache=parse_cache)   # beam types and materials only
 
     def check(self, what):
         objects = [[self.infile.materials, 'INSULATION'], [self.infile.beamtypes, 'ins_foo.tem']]
@@ -14,6 +14,7 @@ class Eliminator:
         return True
 
     def eliminate(self, to_be_eliminated):
+        patch = self.infile.patch   # written by save_line
         change = False
         for i, line in enumerate(self.infile.file_lines):
             if 'RELAX' in line or 'PRECISION' in line:
@@ -21,21 +22,20 @@ class Eliminator:
             elif all([change, 'ELEM' in line]):
                 spltd = line.split()
                 if spltd[1] in to_be_eliminated:
-                    self.infile.file_lines[i] = '\t'.join(spltd[:-1]) + '\t' + str(len(self.infile.beamtypes)) + '\n'
+                    patch.replace(i, '\t'.join(spltd[:-1]) + '\t' + str(len(self.infile.beamtypes)) + '\n')
 
             elif 'NMAT' in line and self.check(0):
-                self.infile.file_lines[i] = f'\tNMAT\t{str(int(line.split()[-1]) + 1)}\n'
+                patch.replace(i, f'\tNMAT\t{str(int(line.split()[-1]) + 1)}\n')
             elif all(['BEAM' in line, 'NODOF' not in line, 'S' not in line, self.check(1)]):
                 spltd = line.split()
-                self.infile.file_lines[i] = '\t'.join(spltd[:-1]) + '\t' + str(int(spltd[-1]) + 1) + '\n'
+                patch.replace(i, '\t'.join(spltd[:-1]) + '\t' + str(int(spltd[-1]) + 1) + '\n')
             elif all(['END_TRANS' in line, 'ELEM' in self.infile.file_lines[i + 1]]):
                 if self.check(1):
-                    self.infile.file_lines.insert(i + 1,
-                                                  f'ins_foo.tem\nTRANSLATE\t1\t{len(self.infile.materials) + 1}\nEND_TRANS\n')
+                    patch.insert(i + 1, f'ins_foo.tem\nTRANSLATE\t1\t{len(self.infile.materials) + 1}\nEND_TRANS\n')
                     self.infile.beamtypes.append(['ins_foo.tem', [len(self.infile.materials) + 1]])
                 change = True
             elif 'TIME' in line and self.check(0):
-                self.infile.file_lines.insert(i, 'INSULATION\n')
+                patch.insert(i, 'INSULATION\n')
                 self.infile.materials.append(['INSULATION', []])
                 break
 
@@ -73,5 +73,5 @@ class Eliminator:
 
 
 if __name__ == '__main__':
-    e = Eliminator(argv[1])
+    e = Eliminator(argv[1], parse_cache=st.INFILE_CACHE)
     e.eliminate(argv[2:])
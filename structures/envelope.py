@@ -0,0 +1,127 @@
+import argparse as ar
+import csv
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from os import cpu_count
+from os.path import abspath, basename, dirname
+
+import numpy as np
+
+from safir_tools import ReadXML, step_arrays, MNV_QUANTITIES
+
+'''Max/min envelopes of results over many scenarios (e.g. mechanical analyses of iso2nf) and their time steps'''
+
+
+# rows of the envelope table: entity, number, gauss point and quantity for each value of step array
+def labels(name, shape, reaction_nodes):
+    for index in np.ndindex(*shape):
+        if name == 'displacements':
+            yield 'node', index[0] + 1, '', f'D{index[1] + 1}'
+        elif name == 'reactions':
+            yield 'reaction', reaction_nodes[index[0]], '', f'R{index[1] + 1}'
+        elif name == 'mnv':
+            yield 'beam', index[0] + 1, index[1] + 1, MNV_QUANTITIES[index[2]]
+        elif name == 'temperatures':
+            yield 'node', index[0] + 1, '', 'T'
+
+
+class Envelope:
+    '''Running max and min of step arrays with the scenario and time they come from'''
+    def __init__(self):
+        self.arrays = {}    # {name: [max, max_scenario, max_time, min, min_scenario, min_time], ...}
+        self.reaction_nodes = []
+
+    def update(self, name, values, scenario, time):
+        if name not in self.arrays:
+            self.arrays[name] = [values.copy(), np.full(values.shape, scenario), np.full(values.shape, time),
+                                 values.copy(), np.full(values.shape, scenario), np.full(values.shape, time)]
+            return
+        env = self.arrays[name]
+        if env[0].shape != values.shape:
+            raise ValueError(f'Shape of {name} {values.shape} differs from {env[0].shape} - scenarios of different'
+                             f' models cannot be enveloped')
+
+        # NaN (missing value) never governs
+        for value, where in [(0, values > env[0]), (3, values < env[3])]:
+            where |= np.isnan(env[value]) & ~np.isnan(values)
+            env[value][where] = values[where]
+            env[value + 1][where] = scenario
+            env[value + 2][where] = time
+
+    # merging envelope of another scenario (or group of scenarios)
+    def merge(self, other):
+        for name, env in other.arrays.items():
+            if name not in self.arrays:
+                self.arrays[name] = env
+                continue
+            for value, governs in [(0, np.greater), (3, np.less)]:
+                mine = self.arrays[name]
+                if mine[value].shape != env[value].shape:
+                    raise ValueError(f'Shape of {name} {env[value].shape} differs from {mine[value].shape} - '
+                                     f'scenarios of different models cannot be enveloped')
+                where = governs(env[value], mine[value]) | (np.isnan(mine[value]) & ~np.isnan(env[value]))
+                for i in range(3):
+                    mine[value + i][where] = env[value + i][where]
+        self.reaction_nodes = self.reaction_nodes if len(self.reaction_nodes) else other.reaction_nodes
+
+        return self
+
+    def write(self, path, scenarios):
+        with open(path, 'w', newline='') as file:
+            table = csv.writer(file)
+            table.writerow(['entity', 'number', 'gauss', 'quantity', 'max', 'max_scenario', 'max_time', 'min',
+                            'min_scenario', 'min_time'])
+            for name, env in self.arrays.items():
+                for index, label in zip(np.ndindex(*env[0].shape), labels(name, env[0].shape, self.reaction_nodes)):
+                    table.writerow([*label, env[0][index], scenarios[env[1][index]], env[2][index], env[3][index],
+                                    scenarios[env[4][index]], env[5][index]])
+
+
+# envelope of a single XML file streamed step by step, run in the worker processes
+def scenario_envelope(path_to_xml, scenario):
+    xml = ReadXML(path_to_xml)
+    envelope = Envelope()
+    for i, t in enumerate(xml.times()):
+        values, reaction_nodes = step_arrays(xml.step(i), xml.ngb if xml.ngb else 0)
+        envelope.reaction_nodes = reaction_nodes if reaction_nodes else envelope.reaction_nodes
+        for name, array in values.items():
+            envelope.update(name, array, scenario, t)
+
+    return envelope
+
+
+def envelope(xml_paths, output='envelope.csv', jobs=None):
+    '''Envelopes of displacements, reactions and MNV (temperatures for thermal results) over all scenarios'''
+    jobs = jobs if jobs else cpu_count()
+    scenarios = [basename(dirname(abspath(p))) + '/' + basename(p) for p in xml_paths]
+    total = Envelope()
+
+    # at most [jobs] scenarios are processed at once, finished ones are merged into the total envelope immediately
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        running = set()
+        for i, path in enumerate(xml_paths):
+            if len(running) >= jobs:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                [total.merge(d.result()) for d in done]
+            running.add(pool.submit(scenario_envelope, path, i))
+        [total.merge(d.result()) for d in wait(running)[0]]
+
+    total.write(output, scenarios)
+    print(f'[OK] Envelope of {len(xml_paths)} scenarios written to {output}')
+
+    return total
+
+
+def get_arguments():
+    parser = ar.ArgumentParser(description='Max/min envelopes of SAFIR results over many scenarios and time steps')
+    parser.add_argument('xmls', nargs='+', help='Paths to SAFIR XML results (one per scenario)')
+    parser.add_argument('-o', '--output', help='Path to the envelope table [envelope.csv by default]',
+                        default='envelope.csv')
+    parser.add_argument('-j', '--jobs', help='Number of scenarios processed at once [all cores by default]', type=int,
+                        default=None)
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_arguments()
+    envelope([abspath(p) for p in args.xmls], output=args.output, jobs=args.jobs)
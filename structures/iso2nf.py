@@ -4,10 +4,14 @@ from os.path import abspath as ap
 from os.path import isfile, basename, dirname
 from shutil import copy2
 from sys import argv
+from concurrent.futures import ProcessPoolExecutor
 import argparse as ar
-from safir_tools import run_safir
+from safir_tools import run_safir, NewInFile, INFILE_CACHE
+from preflight import check_in, check_t0r, check_transfer
 from manycfds import ManyCfds
-from os import symlink
+from scheduler import Scheduler
+from safir_cache import SafirCache, DEFAULT_DIR
+from os import symlink, scandir, cpu_count
 
 '''New, simpler and more object-oriented code'''
 
@@ -210,7 +214,7 @@ class Thermal:
         copy2(self.config_paths[0], self.sim_dir)
 
     # default calculations (preparations should have already been done)
-    def run_thermal(self, safir_exe, verb, unix, ident=None):
+    def run_thermal(self, safir_exe, verb, unix, ident=None, cache=None):
         # verbose output - all SAFIR logs are passed to the console
         if verb == 'verbose':
             v = True
@@ -226,7 +230,7 @@ class Thermal:
 
         ident = ident if unix else None
         run_safir(f'{self.sim_dir}/{self.chid}.IN', safir_exe_path=safir_exe, print_time=pt, verbose=v, fix_rlx=False, \
-                key=ident)
+                key=ident, cache=cache)
 
 
 
@@ -293,9 +297,12 @@ class ThermalTEM(Thermal):
         return 0
 
     # default calculations (preparations should have already been done)
-    def run(self, safir_exe, verb, unix, identity=None):
-        self.run_thermal(safir_exe, verb, unix, identity)
+    def run(self, safir_exe, verb, unix, identity=None, cache=None):
+        self.run_thermal(safir_exe, verb, unix, identity, cache=cache)
+        self.finish()
 
+    # postprocessing of thermal results
+    def finish(self):
         self.insert_tor()
 
 
@@ -351,9 +358,12 @@ class ThermalTSH(Thermal):
 
 
     # default calculations (preparations should have already been done)
-    def run(self, safir_exe, verb, unix, identity=None):
-        self.run_thermal(safir_exe, verb, unix, identity)
+    def run(self, safir_exe, verb, unix, identity=None, cache=None):
+        self.run_thermal(safir_exe, verb, unix, identity, cache=cache)
+        self.finish()
 
+    # postprocessing of thermal results
+    def finish(self):
         self.insert_data()
 
 
@@ -406,7 +416,7 @@ class Mechanical:
         with open(self.input_file, 'w') as file:
             file.writelines(init)
 
-    def run(self, safir_exe, verb, unix, identity=None):
+    def run(self, safir_exe, verb, unix, identity=None, cache=None):
         # verbose output - all SAFIR logs are passed to the console
         if verb == 'verbose':
             v = True
@@ -420,45 +430,18 @@ class Mechanical:
             v = False
             pt = True
 
-        run_safir(self.input_file, safir_exe_path=safir_exe, print_time=pt, verbose=v, wine=bool(unix), key=identity)
+        run_safir(self.input_file, safir_exe_path=safir_exe, print_time=pt, verbose=v, wine=bool(unix), key=identity,
+                  cache=cache)
 
 
-# to be rewritten in the future
 class Check:
-    def __init__(self, mechanical: Mechanical):
+    '''Pre-flight checks of the scenario: the mechanical input file, input files of the thermal analyses, torsion
+    results and CFD transfer files are checked concurrently (one pass over each file), then compared with each other'''
+    def __init__(self, mechanical: Mechanical, transfer_dir=None, jobs=None):
         self.mech = mechanical
-
-    def t0r_vs_in(self, thermal: ThermalTEM):
-        # check if torsion results are compatible with thermal input file
-        info = []
-
-        try:
-            with open(thermal.config_paths[1]) as file:
-                tor = file.read()
-        except FileNotFoundError:
-            return [f'Torsion file of "{thermal.chid}" profile was not found']
-
-        # looking for start of torsion results regexp in T0R file
-        try:
-            [tor.index(i) for i in ['w\n', 'GJ']]
-        except ValueError:
-            info.append([f'Torsion results were not found in "{thermal.chid}" TOR file'])
-
-        # find the number of elements in torsion file
-        n_tor = int(tor[:50].split('NFIBERBEAM')[1].split()[0])
-
-        # find the number of elements in initial file of thermal analysis
-        try:
-            with open(thermal.config_paths[0]) as file:
-                n_in = int(file.read()[:500].split('SOLID')[1].split()[0])
-        except FileNotFoundError:
-            return [f'Thermal analysis input file of "{thermal.chid}" profile was not found']
-
-        # ERROR if differences found
-        if n_in != n_tor:
-            info.append([f'Numbers of fibers in torsion ({n_tor}) and thermal ({n_in}) analyses do not match.'])
-
-        return info
+        self.transfer_dir = transfer_dir    # CFD transfer files checked as well if given
+        self.jobs = jobs if jobs else cpu_count()
+        self.transfers = []     # paths to the transfer files
 
     def name(self, file_name):
         info = []
@@ -471,48 +454,72 @@ class Check:
 
         return info
 
-    def nfiber(self):
-        # check if nfiber is correctly set
-        with open(self.mech.input_file) as file:
-            in_mech_file = file.readlines()
-            nfiber = int(''.join(in_mech_file)[:500].split('NFIBER')[1].split()[0])
-
-        nsolid_max = nfiber
+    # NFIBER of the mechanical input file set to the number of fibers of the biggest section
+    def nfiber(self, nsolid_max):
+        mech = NewInFile('Structural3D').read_sim(self.mech.input_file, dim=[])
+        print(f'[WARNING] NFIBER is too low - is {mech.nfiber} and should be {nsolid_max}. I\'ll try to fix it.')
+        mech.nfiber = nsolid_max
+        mech.write_lines(self.mech.input_file)
+
+    # problems and numbers of all files checked in worker processes, {path: (problems, numbers)}
+    def files(self):
+        self.transfers = [f.path for f in scandir(self.transfer_dir) if f.is_file()] if self.transfer_dir else []
+        tasks = [(check_in, self.mech.input_file)]
         for t in self.mech.thermals:
-            with open(t.config_paths[0]) as file:
-                n_in = int(file.read()[:500].split('SOLID')[1].split()[0])
-            if n_in > nsolid_max:
-                nsolid_max = n_in
-
-        # write with updated nfiber if necessary
-        if nsolid_max > nfiber:
-            print(f'[WARNING] NFIBER is too low - is {nfiber} and should be {nsolid_max}. I\'ll try to fix it.')
-
-            for line in in_mech_file:
-                if 'NFIBER' in line:
-                    in_mech_file[in_mech_file.index(line)] = '    NFIBER    {nsolid_max}\n'
-                    break
-
-            with open(self.mech.input_file, 'w') as file:
-                file.writelines(in_mech_file)
+            tasks.append((check_in, f'{t.sim_dir}/{t.chid}.IN'))
+            tasks.append((check_t0r, t.config_paths[1])) if t.ndim == 2 else None
+        tasks += [(check_transfer, path) for path in self.transfers]
+
+        checked = {}
+        with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+            # the mechanical input file is the biggest one, so it is submitted first
+            futures = [(path, pool.submit(check, path)) for check, path in tasks]
+            for path, future in futures:
+                # any error of a checker is a problem of that file, the other files are still checked
+                try:
+                    checked[path] = future.result()
+                except Exception as e:
+                    checked[path] = [f'{basename(path)} could not be read: {type(e).__name__}: {e}'], {}
 
-        return []
+        return checked
 
     def full_mech(self):
-        info = []
+        start = sec()
+        checked = self.files()
+        info = [p for problems, _ in checked.values() for p in problems]
+        mech = checked[self.mech.input_file][1]
 
-        # check mechanical
-        [info.extend(check) for check in [self.name(self.mech.chid), self.nfiber()]]
+        info.extend(self.name(self.mech.chid))
+        if self.transfer_dir and not self.transfers:
+            info.append(f'There are no transfer files in {self.transfer_dir}')
 
-        # check thermals
+        nsolid_max = 0
         for t in self.mech.thermals:
-            [info.extend(check) for check in [self.name(t.chid), self.t0r_vs_in(t)]]
+            info.extend(self.name(t.chid))
+            section = checked[f'{t.sim_dir}/{t.chid}.IN'][1]
+            if t.ndim != 2 or 'solids' not in section:
+                continue
+            nsolid_max = max(nsolid_max, section['solids'])
+            tor = checked[t.config_paths[1]][1]
+            if tor.get('nfiber') not in [None, section['solids']]:
+                info.append(f'Numbers of fibers in torsion ({tor["nfiber"]}) and thermal ({section["solids"]}) '
+                            f'analyses of "{t.chid}" do not match.')
+
+        # transfer files have to cover the whole mechanical analysis
+        for path in self.transfers:
+            end = checked[path][1].get('time_end')
+            if end is not None and mech.get('time_end') and end < mech['time_end']:
+                info.append(f'Transfer file {basename(path)} ends at {end} s, before the end of the analysis '
+                            f'({mech["time_end"]} s)')
 
         if len(info) > 0:
             print('[INFO] While checking your input files I found some mistakes:\n', '\n'.join(info))
             raise ValueError(f'[ERROR] {self.mech.chid} simulation was improperly set up.')
-        else:
-            print('[OK] Config files seems to be OK')
+
+        # write with updated nfiber if necessary
+        if mech.get('nfiber') is not None and nsolid_max > mech['nfiber']:
+            self.nfiber(nsolid_max)
+        print(f'[OK] Config files seems to be OK ({len(checked)} files checked in {sec() - start:.1f} s)')
 
 
 # # to be rewritten
@@ -562,37 +569,55 @@ def run_user_mode(sim_no, arguments):
             print('[OK] License file already linked')
     
     start = sec()
+    cache = SafirCache(arguments.cache) if arguments.cache else None
     m = Mechanical(arguments.results[sim_no], fire_model=arguments.model)
 
     # run thermal analyses
     m.make_thermals(arguments.config)
 
+    # check the set up (with transfer files of CFD heating)
+    transfer_dir = f'{arguments.config}/transfer_files/' if m.model in {'cfd', 'fds'} else None
+    Check(m, transfer_dir=transfer_dir).full_mech() if arguments.check else print('[WARNING] No checking routine applied')
+
     # run analysis with CFD results using manycfds.ManyCfds
     if m.model in {'cfd', 'fds'}:
         link_id() if arguments.unix else None
 
         # enable using many cfd transfer files
-        ManyCfds(m.sim_dir, f'{arguments.config}/transfer_files/', m.input_file, arguments.safir).main()
+        ManyCfds(m.sim_dir, f'{arguments.config}/transfer_files/', m.input_file, arguments.safir,
+                 jobs=arguments.jobs, parse_cache=INFILE_CACHE).main()
 
         print(f'Runtime of CFD-heating thermal analysis: {dt(seconds=int(sec() - start))}\n')
         for t in m.thermals:
             t.insert_tor()
 
     else:
-        # check the set up
-        Check(m).full_mech() if arguments.check else print('[WARNING] No checking routine applied')
-
-        for t in m.thermals:
+        # run thermal analyses concurrently
+        if arguments.jobs > 1:
             st = sec()
-            t.change_in(m.chid)
-            t.run(arguments.safir, arguments.verbose, arguments.unix, identity=arguments.identity)
+            for t in m.thermals:
+                t.change_in(m.chid)
+            # each analysis runs in its own directory (SAFIR writes temporary files with fixed names)
+            Scheduler([f'{t.sim_dir}/{t.chid}.IN' for t in m.thermals], safir_exe_path=arguments.safir,
+                      cores=arguments.jobs, isolate=True, fix_rlx=False,
+                      key=arguments.identity if arguments.unix else None, cache=cache).run()
+            for t in m.thermals:
+                t.finish()
             if arguments.verbose != 'warning':
-                print(f'Runtime of "{t.chid}" thermal analysis: {dt(seconds=int(sec() - st))}\n')
+                print(f'Runtime of thermal analyses: {dt(seconds=int(sec() - st))}\n')
+
+        else:
+            for t in m.thermals:
+                st = sec()
+                t.change_in(m.chid)
+                t.run(arguments.safir, arguments.verbose, arguments.unix, identity=arguments.identity, cache=cache)
+                if arguments.verbose != 'warning':
+                    print(f'Runtime of "{t.chid}" thermal analysis: {dt(seconds=int(sec() - st))}\n')
 
     # run mechanical analysis
     st = sec()
     m.change_in()
-    m.run(arguments.safirmech, arguments.verbose, arguments.unix, identity=arguments.identity)
+    m.run(arguments.safirmech, arguments.verbose, arguments.unix, identity=arguments.identity, cache=cache)
 
     if arguments.verbose != 'warning':
         print(f'Runtime of "{m.chid}" mechanical analysis: {dt(seconds=int(sec() - st))}\n')
@@ -619,13 +644,18 @@ def get_arguments(from_argv):
     parser.add_argument('-u', '--unix', default=False, const=True, nargs='?',
                         help='Compatibility with Linux version of the script.')
     parser.add_argument('-i', '--identity', default=None, help='SAFIR license file [required for Linux].')
+    parser.add_argument('-j', '--jobs', default=1, type=int,
+                        help='Number of cores to be used by concurrent thermal analyses [1 by default]')
+    parser.add_argument('-cc', '--cache', default=None, const=DEFAULT_DIR, nargs='?',
+                        help='Restore results of unchanged analyses from the cache directory '
+                             '[~/.cache/fireeng-tools/safir by default]')
     
 
     argums = parser.parse_args(args=from_argv)
 
     # change paths to absolute
     for k in argums.__dict__:
-        if k in {'model', 'unix', 'verbose', 'check'}:
+        if k in {'model', 'unix', 'verbose', 'check', 'jobs'}:
             continue
         elif k == 'safirmech' and not argums.__dict__[k]:
             argums.__dict__[k] = argums.safir
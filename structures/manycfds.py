@@ -1,5 +1,7 @@
 import copy
 import safir_tools
+from scheduler import Scheduler
+from spatial import element_nodes, inside
 import shutil
 import sys
 import os
@@ -10,18 +12,19 @@ from decimal import Decimal as dec
 
 
 class ManyCfds:
-    def __init__(self, config_dir, transfer_dir, mechanical_input_file, safir_exe_path):
+    def __init__(self, config_dir, transfer_dir, mechanical_input_file, safir_exe_path, jobs=1, parse_cache=None):
         self.config_dir = config_dir
         self.transfer_dir = transfer_dir
         self.mechanical_input_file = mechanical_input_file  # path do mechanical input file
         self.safir_exe_path = safir_exe_path
+        self.jobs = jobs    # number of cores for concurrent thermal analyses
         self.working_dir = os.path.dirname(mechanical_input_file)
 
         self.all_transfer_files = []
         self.all_thermal_infiles = []
         self.gid_structure = False  # checks whether directory structure is gid-structure
 
-        self.mechinfile = MechInFile(self.mechanical_input_file)  # object created based on mechanical input file
+        self.mechinfile = MechInFile(self.mechanical_input_file, parse_cache)  # object created based on mechanical input file
         self.beamtypes = self.mechinfile.beamparameters['beamtypes']
 
         self.all_sections = []
@@ -84,7 +87,8 @@ class ManyCfds:
     def run_sections(self):
         """Create object based on transfer file"""
         for transfer_file in self.all_transfer_files:
-            sect = Section(transfer_file,  self.mechinfile, self.working_dir, self.all_thermal_infiles, self.safir_exe_path)
+            sect = Section(transfer_file,  self.mechinfile, self.working_dir, self.all_thermal_infiles, self.safir_exe_path,
+                           jobs=self.jobs)
             sect.main()
 
 
@@ -184,9 +188,10 @@ class ThermInFile:
 
 
 class MechInFile(safir_tools.InFile):
-    def __init__(self, mechanical_input_file):
-        with open(mechanical_input_file) as file:
-            super().__init__('dummy', file.readlines())
+    def __init__(self, mechanical_input_file, parse_cache=None):
+        # parsed once, then restored from parse_cache directory if given
+        self.__dict__.update(safir_tools.read_in(mechanical_input_file, cache=parse_cache).__dict__)
+        self.chid = 'dummy'
 
         self.name = os.path.basename(mechanical_input_file)
         self.beamline = self.beamparameters['BEAM']
@@ -207,29 +212,30 @@ class MechInFile(safir_tools.InFile):
         for num in range(len(data_add)):
             if '.tem' in data_add[num].lower():
                 data_add[num] = 'cfd_' + data_add[num]
-        self.file_lines.insert(self.end_beams_line+1, ''.join(data_add))
+        self.patch.insert(self.end_beams_line+1, ''.join(data_add))
 
     def double_beam_num(self):
         """Doubling beam number in BEAM line"""
-        line_params = self.file_lines[self.beamline].split()
+        line_params = self.patch[self.beamline].split()
         line_param_num = line_params[2]
         doubled_param = str(int(line_param_num) * 2)
         newbemline = ' \t '.join(("    ", line_params[0], line_params[1], doubled_param, '\n'))
-        self.file_lines[self.beamline] = newbemline
+        self.patch.replace(self.beamline, newbemline)
 
 
 class Section:
 
     """  Zmienic na uruchamianie tylko na btypes """
-    def __init__(self, transfer_file, inFile, working_dir, thermal_files, safir_exe_path):
+    def __init__(self, transfer_file, inFile, working_dir, thermal_files, safir_exe_path, jobs=1):
         self.transfer_file = transfer_file
         self.inFile = inFile
         self.working_dir = working_dir
         self.thermal_files = thermal_files
         self.safir_exe_path = safir_exe_path
+        self.jobs = jobs
 
         self.inFileCopy = copy.deepcopy(self.inFile)
-        self.file_lines = self.inFileCopy.file_lines
+        self.file_lines = self.inFileCopy.file_lines  # unedited lines, edits are recorded in inFileCopy.patch
 
         self.btypes_in_domain = []
         self.beamparams = self.inFileCopy.beamparameters
@@ -322,19 +328,13 @@ class Section:
         shutil.copyfile(self.transfer_file, os.path.join(self.working_dir, 'cfd.txt'))
 
     def find_elements_inside_domain(self, inFileCopy):
-        elements_inside_domain = []
-        for element in inFileCopy.beams:
+        # first and last node of all elements at once
+        first_node_coor, last_node_coor = [element_nodes(inFileCopy, 'beams', i) for i in (0, 2)]
+        lower, upper = self.domain[0::2], self.domain[1::2]
 
-            first_node_id = element[1]
-            last_node_id = element[3]
-            first_node_coor = inFileCopy.nodes[first_node_id - 1][1:]
-            last_node_coor = inFileCopy.nodes[last_node_id - 1][1:]
-
-            # enable elements to be partially within domain (only start or end point is enough)
-            if ((self.domain[1] > first_node_coor[0] > self.domain[0] or self.domain[1] > last_node_coor[0] > self.domain[0])
-                    and (self.domain[3] > first_node_coor[1] > self.domain[2] or self.domain[3] > last_node_coor[1] > self.domain[2])
-                    and (self.domain[5] > first_node_coor[2] > self.domain[4] or self.domain[5] > last_node_coor[2] > self.domain[4])):
-                elements_inside_domain.append(element[0])
+        # enable elements to be partially within domain (only start or end point is enough)
+        inside_domain = (inside(first_node_coor, lower, upper) | inside(last_node_coor, lower, upper)).all(axis=1)
+        elements_inside_domain = inFileCopy.beams.tags[inside_domain].tolist()
 
         print(f'[INFO] There are {len(elements_inside_domain)} BEAM elements located in the {self.domain} domain:')
 
@@ -349,12 +349,13 @@ class Section:
         """ need refactorization"""
         self.beamparams = self.inFileCopy.get_beamparameters(update=True) # update elem_start
         lines = 0
+        inside_domain = set(self.elements_inside_domain)
         for line in self.file_lines[self.beamparams['elem_start']+1:]:
             elem_data = line.split()
             if 'ELEM' not in line or 'RELAX' in line:
                 break
 
-            elif int(elem_data[1]) in self.elements_inside_domain:
+            elif int(elem_data[1]) in inside_domain:
                 actual_line = self.beamparams['elem_start'] + lines 
                 new_beam_number = int(elem_data[-1]) + self.beamparams['beamnumber']
 
@@ -364,28 +365,35 @@ class Section:
                 except ValueError:
                     self.btypes_in_domain.append(int(elem_data[-1]) - 1)
 
-                self.file_lines[actual_line] = f'  \t{"    ".join(elem_data[:-1])}\t{new_beam_number}\n'
+                self.inFileCopy.patch.replace(actual_line, f'  \t{"    ".join(elem_data[:-1])}\t{new_beam_number}\n')
             lines += 1
 
     def save_as_dummy(self):
-        with open(os.path.join(self.working_dir, 'dummy.in'), 'w') as f:
-            for line in self.file_lines:
-                f.write(line)
+        self.inFileCopy.patch.write(os.path.join(self.working_dir, 'dummy.in'))
 
     def run_safir_for_all_thermal(self):
+        files = []
         for thermal_file in self.thermal_files:
             beamtype = os.path.basename(thermal_file)[4:-3]
             if self.beamtypes.index(beamtype) in self.btypes_in_domain:
-                file = os.path.join(self.working_dir, thermal_file)
-                print(f'\n >>>> {os.path.basename(self.transfer_file)} <<<<')
+                files.append(os.path.join(self.working_dir, thermal_file))
+        if not files:
+            return
+
+        print(f'\n >>>> {os.path.basename(self.transfer_file)} <<<<')
+        if self.jobs > 1:
+            # each section runs in its own directory with copies of cfd.txt and dummy.in, results are moved back then
+            Scheduler(files, self.safir_exe_path, cores=self.jobs, isolate=True, fix_rlx=False).run()
+        else:
+            for file in files:
                 safir_tools.run_safir(file, self.safir_exe_path, fix_rlx=False)  # safir returns one .xml and one .out file
-                number = 1
-                while True:
-                    try:
-                        [os.rename(f'{file[:-3]}.{e}', f'{file[:-3]}_{number}.{e}') for e in ['XML', 'OUT']]
-                        break
-                    except FileExistsError:
-                        number += 1
+
+        # results of the previous domains are kept, os.rename would replace them silently on Linux
+        for file in files:
+            number = 1
+            while any(os.path.exists(f'{file[:-3]}_{number}.{e}') for e in ['XML', 'OUT']):
+                number += 1
+            [os.rename(f'{file[:-3]}.{e}', f'{file[:-3]}_{number}.{e}') for e in ['XML', 'OUT']]
 
 
     def get_data(self):
@@ -401,8 +409,8 @@ class Section:
         """ Get coordinates of nodes in element (not used yet)"""
         first_node_id = element[1]
         last_node_id = element[3]
-        first_node_coor = self.inFile.nodes[first_node_id - 1][1:]
-        last_node_coor = self.inFile.nodes[last_node_id - 1][1:]
+        first_node_coor = self.inFile.nodes.entity(first_node_id)[1:]
+        last_node_coor = self.inFile.nodes.entity(last_node_id)[1:]
         return first_node_coor, last_node_coor
 
 
@@ -457,6 +465,7 @@ def get_arguments():
     parser.add_argument('-t', '--transfer_dir', help='Path transfer directory', required=True)
     parser.add_argument('-m', '--mechanical_input_file', help='Mechanical input file', required=True)
     parser.add_argument('-s', '--safir_exe_path', help='Path to SAFIR executable', default='/safir.exe')
+    parser.add_argument('-j', '--jobs', help='Number of cores for concurrent thermal analyses', type=int, default=1)
     args = parser.parse_args()
 
     return args
@@ -475,8 +484,8 @@ if __name__ == '__main__':
         """Giving all parameters by hand"""
         args = get_arguments()
         for key, value in args.__dict__.items():
-            args.__dict__[key] = os.path.abspath(value)
-        manycfds = ManyCfds(**args.__dict__)
+            args.__dict__[key] = os.path.abspath(value) if key != 'jobs' else value
+        manycfds = ManyCfds(**args.__dict__, parse_cache=safir_tools.INFILE_CACHE)
         manycfds.main()
 
     except:
@@ -492,7 +501,8 @@ if __name__ == '__main__':
         dir_list = os.listdir(my_sim)
         #dir_list = os.listdir(args.__dict__["mechanical_input_file"])
         mech_in = os.path.join(my_sim, [x for x in dir_list if x.endswith("in") or x.endswith("IN")][0])
-        manycfds = ManyCfds(config_dir, transfer_dir, mech_in, args.__dict__["safir_exe_path"])
+        manycfds = ManyCfds(config_dir, transfer_dir, mech_in, args.__dict__["safir_exe_path"],
+                            parse_cache=safir_tools.INFILE_CACHE)
         manycfds.main()
 
 
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+import argparse as ar
+import os
+import sys
+from math import exp, log10, sqrt
+from os.path import isfile
+from time import sleep
+
+'''Stand-in for SAFIR executable - reads the input file and writes realistic stdout, XML, OUT and TEM/TSH files.
+Calculations are not performed, so orchestration scripts can be run and timed without a license.
+
+Usage is the same as SAFIR's: "mock_safir.py chid" in the model directory. As run_safir passes only chid, the size
+and run time of the results are dialled with environment variables:
+    MOCK_SAFIR_DELAY    [s] of wall clock time per printed time step (0 by default)
+    MOCK_SAFIR_STEPS    number of printed time steps (from TIME/TIMEPRINT of the input file by default)
+    MOCK_SAFIR_FAIL     [s] of simulated time when fatal error is reported (never by default)'''
+
+SEPARATOR = '======================'
+
+
+def iso_curve(t):
+    return 20 + 345 * log10(8 * t / 60 + 1)
+
+
+# each value in its own line, the same as SAFIR does
+def tagged(tag, *values):
+    return ''.join(f'<{tag}>{v}</{tag}>\n' for v in values)
+
+
+def block(tag, content):
+    return f'<{tag}>\n{content}</{tag}>\n'
+
+
+class MockModel:
+    def __init__(self, chid):
+        self.chid = chid
+        self.path = self.find(f'{chid}.IN')
+        with open(self.path) as file:
+            self.lines = file.readlines()
+
+        self.make = None    # MAKE.TEM, MAKE.TEMLF, MAKE.TSHCD ... for thermal analyses, None for structural ones
+        self.elem_type = None   # [BEAM_TYPE or SHELL_TYPE, structural input file] of natural fire analyses
+        self.ndim = 3
+        self.ndof = 7
+        self.nodes = {}     # {tag: [coordinates]}
+        self.elements = {'BEAM': [], 'SHELL': [], 'SOLID': [], 'TRUSS': []}    # [[tag, node1, ... noden, type]]
+        self.fixed = []     # tags of nodes with fixations
+        self.load = [0, 0, 0]   # summary load [Fx, Fy, Fz]
+        self.files = []     # files referenced by the input file
+        self.step = 1.0     # [s] time step
+        self.t_end = 1.0    # [s]
+        self.print_step = None  # [s] time step of printing the results
+
+        self.read()
+
+    # SAFIR on Windows does not distinguish letter case of file names
+    @staticmethod
+    def find(name):
+        if isfile(name):
+            return name
+        for f in os.listdir('.'):
+            if f.lower() == name.lower():
+                return f
+        raise FileNotFoundError(name)
+
+    def read(self):
+        section = None
+        block = None
+        shells = {}
+        beams = {}
+        for no, line in enumerate(self.lines):
+            spltd = line.split()
+            if not spltd:
+                continue
+            key = spltd[0]
+
+            if key.startswith('MAKE.'):
+                self.make = key[5:]
+            elif key in {'BEAM_TYPE', 'SHELL_TYPE'}:
+                # structural input file is given next to the element type
+                names = [self.lines[i].strip() for i in (no - 1, no + 1)
+                         if self.lines[i].strip().lower().endswith('.in')]
+                self.elem_type = [int(spltd[1]), names[0] if names else '']
+            elif key == 'NDIM':
+                self.ndim = int(spltd[1])
+            elif key == 'NDOFMAX':
+                self.ndof = int(spltd[1])
+            elif key in {'NODES', 'FIXATIONS'}:
+                block = key
+            elif key in {'END_FIX', 'PRECISION'} or key.startswith('NODOF'):
+                block = None
+                section = key[5:] if key.startswith('NODOF') else None
+            elif key == 'NODE' and block == 'NODES':
+                self.nodes[int(spltd[1])] = [float(c) for c in spltd[2:]]
+            elif key == 'BLOCK' and block == 'FIXATIONS':
+                self.fixed.append(int(spltd[1]))
+            elif key == 'ELEM' and section in self.elements:
+                self.elements[section].append([int(i) for i in spltd[1:] if '.' not in i])
+            elif key == 'DISTRSH':
+                shells[int(spltd[1])] = [float(p) for p in spltd[2:5]]
+            elif key == 'DISTRBEAM':
+                beams[int(spltd[1])] = [float(q) for q in spltd[2:5]]
+            elif key == 'TIME' and len(self.lines) > no + 1:
+                self.step, self.t_end = [float(v) for v in self.lines[no + 1].split()[:2]]
+            elif key == 'TIMEPRINT':
+                self.print_step = float(self.lines[no + 1].split()[0])
+            elif key.lower().endswith(('.tem', '.tsh', '.txt')) and len(spltd) == 1:
+                self.files.append(key)
+
+        if self.make and self.make.endswith('CD'):
+            self.files.append('cfd.txt')
+        if self.elem_type:
+            self.files.append(self.elem_type[1])
+
+        # summary load is distributed uniformly over fixed nodes
+        for e in self.elements['SHELL']:
+            if e[0] in shells:
+                area = self.area(e[1:5])
+                self.load = [self.load[i] + shells[e[0]][i] * area for i in range(3)]
+        for e in self.elements['BEAM']:
+            if e[0] in beams:
+                length = self.distance(e[1], e[3])
+                self.load = [self.load[i] + beams[e[0]][i] * length for i in range(3)]
+
+    def distance(self, a, b):
+        return sqrt(sum((i - j) ** 2 for i, j in zip(self.nodes[a], self.nodes[b])))
+
+    # area of quadrilateral as a half of the diagonals' cross product
+    def area(self, tags):
+        p = [self.nodes[t] + [0] * (3 - len(self.nodes[t])) for t in tags]
+        d1 = [p[2][i] - p[0][i] for i in range(3)]
+        d2 = [p[3][i] - p[1][i] for i in range(3)]
+        cross = [d1[1] * d2[2] - d1[2] * d2[1], d1[2] * d2[0] - d1[0] * d2[2], d1[0] * d2[1] - d1[1] * d2[0]]
+        return sqrt(sum(c ** 2 for c in cross)) / 2
+
+    def times(self, steps=None):
+        print_step = self.print_step if self.print_step else self.step
+        if steps:
+            print_step = self.t_end / steps
+        else:
+            steps = max(1, int(round(self.t_end / print_step)))
+        return [print_step * (i + 1) for i in range(steps)]
+
+    def missing(self):
+        missing = []
+        for f in self.files:
+            try:
+                self.find(f)
+            except FileNotFoundError:
+                missing.append(f)
+        return missing
+
+    # names of TEM/TSH files, one per element (BEAM: two longitudinal Gauss points) of analysed type
+    def thermal_results(self):
+        if not self.make:
+            return []
+        ext = self.make[:3].lower()
+        if not self.elem_type:
+            return [f'{self.chid}.{ext.upper()}']
+
+        structural = MockModel(self.find(self.elem_type[1])[:-3])
+        if ext == 'tem':
+            return [f'b{e[0]:05d}_{g}.tem' for e in structural.elements['BEAM'] if e[-1] == self.elem_type[0]
+                    for g in (1, 2)]
+        return [f's{e[0]:05d}_1.tsh' for e in structural.elements['SHELL'] if e[-1] == self.elem_type[0]]
+
+
+class MockWriter:
+    def __init__(self, model: MockModel, times):
+        self.model = model
+        self.times = times
+        self.thermal = model.make is not None
+        self.xml = open(f'{model.chid}.XML', 'w')
+        self.out = open(f'{model.chid}.OUT', 'w')
+        self.results = model.thermal_results()  # too many to be kept open, appended step by step
+        self.fibers = self.thermal_fibers()
+
+    # centres of SOLID elements of thermal analysis
+    def thermal_fibers(self):
+        fibers = []
+        for e in self.model.elements['SOLID']:
+            corners = [self.model.nodes[n] for n in e[1:-1] if n in self.model.nodes]
+            fibers.append([sum(c[i] for c in corners) / len(corners) for i in range(2)] if corners else [0, 0])
+        return fibers
+
+    def header(self):
+        m = self.model
+        x = self.xml
+        x.write('<?xml version="1.0" encoding="UTF-8"?>\n<SAFIR_RESULTS>\n')
+        x.write(tagged('TYPE', 'TEMPERATURES' if self.thermal else 'STRUCTURAL'))
+        x.write(tagged('NDIM', m.ndim) + tagged('NNODE', len(m.nodes)) + tagged('NGBM', 2))
+        x.write(block('NODES', ''.join(block('N', tagged('P', *coords)) for coords in m.nodes.values())))
+        for name, tag, elements in [('BEAMS', 'BM', m.elements['BEAM']), ('SHELLS', 'SH', m.elements['SHELL']),
+                                    ('SOLIDS', 'SD', m.elements['SOLID']), ('TRUSSES', 'TR', m.elements['TRUSS'])]:
+            if elements:
+                x.write(block(name, ''.join(block(tag, tagged('N', *e[1:-1]) + tagged('M', e[-1])) for e in elements)))
+        if self.thermal:
+            x.write(block('MATERIALS', tagged('M', 'STEELEC3EN')))
+        elif m.elements['BEAM']:
+            rlx = [f'{e[0]:>8}' + ' 0.000E+00' * 7 + ' -0.100E+01' * 7 for e in m.elements['BEAM']]
+            x.write(block('RELAX', block('BEAMS', tagged('RLX', *rlx))))
+
+        self.out.write(f'MOCK SAFIR - results of "{m.chid}" are not calculated\n\n')
+        self.out.writelines(m.lines)
+
+        for name in self.results:
+            with open(name, 'w') as file:
+                if name.lower().endswith('tem'):
+                    file.write(f' NFIBERBEAM    {max(len(self.fibers), 1)}\n NMAT    1\n STEELEC3EN\n\n HOT\n\n')
+                else:
+                    file.write(' THICKNESS    0.200\n MATERIAL    1\n REBARS    0\n\n HOT\n'
+                               ' POSITIONS OF THE NODES.\n =======================\n NUMBER OF POSITIONS:  11\n'
+                               + ''.join(f' {p / 100 - 0.1:10.3E}' for p in range(0, 21, 2)) + '\n\n')
+
+    def step(self, t):
+        m = self.model
+        x = self.xml
+        x.write(f'<STEP>\n<TIME format="F14.5">{t:14.5f}</TIME>\n')
+
+        if self.thermal:
+            # temperatures decrease with the distance from the centre of the section
+            heating = iso_curve(t) - 20
+            x.write(block('TEMPERATURES', tagged('T', *[f'{20 + heating * exp(-abs(c[-1])):.2f}'
+                                                       for c in m.nodes.values()])))
+            tem = f' TIME    {t:.5f}\n' + ''.join(f'{i + 1:>8} {20 + heating * exp(-abs(f[0] * f[1])):>12.2f}\n'
+                                                  for i, f in enumerate(self.fibers)) + '\n'
+            tsh = f' TIME    {t:.5f}\n' + ''.join(f'{20 + heating * (1 - p / 12):>10.2f}\n' for p in range(11)) + '\n'
+            for name in self.results:
+                with open(name, 'a') as file:
+                    file.write(tem if name.lower().endswith('tem') else tsh)
+
+        else:
+            # displacements grow linearly with time, summary load is carried by fixed nodes
+            factor = t / m.t_end
+            x.write(block('DISPLACEMENTS', ''.join(
+                block('N', tagged('D', *[f'{-factor * (c[-1] + i) * 1e-3:.4E}' for i in range(m.ndof)]))
+                for c in m.nodes.values())))
+            share = [-f / len(m.fixed) for f in m.load] if m.fixed else [0, 0, 0]
+            reaction = tagged('R', *[f'{share[i] if i < 3 else 0:.4E}' for i in range(m.ndof)])
+            x.write(block('REACTIONS', ''.join(tagged('N', n) + tagged('NR', m.ndof) + reaction for n in m.fixed)))
+            if m.elements['BEAM']:
+                mnv = ''
+                for e in m.elements['BEAM']:
+                    gauss = [tagged('V', *[f'{factor * (e[0] + g + v):.4E}' for v in range(7)]) for g in range(2)]
+                    mnv += block('BM', ''.join(block('GS', g) for g in gauss))
+                x.write(block('MNV', mnv))
+
+        x.write('</STEP>\n')
+        self.out.write(f'\n TIME = {t:14.5f} SEC\n CONVERGENCE REACHED IN 3 ITERATIONS\n')
+
+    def close(self, finished=True):
+        self.xml.write('</SAFIR_RESULTS>\n') if finished else None
+        self.xml.close()
+        self.out.close()
+
+
+def run(chid, delay=0.0, steps=None, fail=None):
+    print(' SAFIR - mock executable of fireeng-tools, nothing is calculated\n', flush=True)
+    print(f' Reading {chid}.IN...', flush=True)
+    try:
+        model = MockModel(chid)
+    except FileNotFoundError as e:
+        print(f' ERROR: input file {e} not found', flush=True)
+        return 1
+
+    missing = model.missing()
+    if missing:
+        print(f' ERROR: file {missing[0]} not found', flush=True)
+        return 1
+
+    writer = MockWriter(model, model.times(steps))
+    writer.header()
+    print(f' {SEPARATOR}', flush=True)
+    for t in writer.times:
+        if fail is not None and t >= fail:
+            print(f' ERROR: mock failure at time {t}', flush=True)
+            writer.close(finished=False)
+            return 1
+        sleep(delay) if delay else None
+        writer.step(t)
+        print(f' time = {t:14.5f} sec', flush=True)
+
+    writer.close()
+    print(' END OF CALCULATIONS', flush=True)
+
+    return 0
+
+
+def get_arguments():
+    parser = ar.ArgumentParser(description='Mock SAFIR executable producing realistic results without calculations')
+    parser.add_argument('chid', help='Name of the input file without extension')
+    parser.add_argument('-d', '--delay', type=float, default=float(os.environ.get('MOCK_SAFIR_DELAY', 0)),
+                        help='Wall clock time per printed time step [s]')
+    parser.add_argument('-n', '--steps', type=int, default=os.environ.get('MOCK_SAFIR_STEPS'),
+                        help='Number of printed time steps [from the input file by default]')
+    parser.add_argument('-f', '--fail', type=float, default=os.environ.get('MOCK_SAFIR_FAIL'),
+                        help='Simulated time when fatal error is reported [s]')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_arguments()
+    sys.exit(run(args.chid, delay=args.delay, steps=int(args.steps) if args.steps else None,
+                 fail=float(args.fail) if args.fail is not None else None))
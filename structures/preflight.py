@@ -0,0 +1,120 @@
+import os
+from os.path import abspath, basename, dirname, exists
+
+import numpy as np
+
+from safir_tools import NewInFile, Geometry, element_node_tags
+
+'''Pre-flight checks of single files of a scenario (input files, torsion results and CFD transfer files), run in
+worker processes by iso2nf.Check: each returns the list of problems found and numbers of the file compared with
+other files of the scenario'''
+
+
+def check_in(in_file_path):
+    '''Problems of the input file found in one pass of parsing: header counts (NNODE, NMAT, elements and their types)
+    not matching the file, elements of nodes, types or materials not defined and TXT files referenced but missing'''
+    model = NewInFile('unknown').read_sim(in_file_path)
+    name, problems = basename(in_file_path), []
+    header = model.find('NODES')
+    if header is None:
+        return [f'{name}: there is no NODES block'], {}
+
+    def counts(keyword):
+        line = model.find(keyword, end=header)
+        return [int(t) for t in model.lines[line].split()[1:3]] if line is not None else []
+
+    for entity, keyword in NewInFile.COUNTS.items():
+        table = getattr(model.geom, entity).table
+        declared = counts(keyword)
+        if declared and declared[0] != len(table):
+            problems.append(f'{name}: {keyword} is {declared[0]}, but there are {len(table)} {entity}')
+        profiles = model.geom.profiles.get(Geometry.PROFILES.get(entity))
+        if len(declared) > 1 and profiles is not None and declared[1] != len(profiles):
+            problems.append(f'{name}: {keyword} declares {declared[1]} types, but there are {len(profiles)}')
+        if entity == 'nodes' or not len(table):
+            continue
+
+        tags, given = element_node_tags(table, entity)
+        missing = given & ~np.isin(tags, model.geom.nodes.table.tags)
+        if missing.any():
+            row, column = np.argwhere(missing)[0]
+            problems.append(f'{name}: {missing.any(axis=1).sum()} {entity} refer to nodes not defined (element '
+                            f'{table.tags[row]} - node {tags[row, column]})')
+        if profiles is not None and len(table.values) and table.values[:, -1].max() > len(profiles):
+            problems.append(f'{name}: {entity} of type {table.values[:, -1].max()} while {len(profiles)} types are '
+                            f'defined')
+
+    # materials of beam and shell types, trusses and solids of thermal analyses
+    used = [int(m) for p in [*model.geom.profiles.get('b', []), *model.geom.profiles.get('sh', [])] for m in p[1]]
+    used += [int(p[-1]) for p in model.geom.profiles.get('t', [])]
+    solids = model.geom.solids.table
+    if len(solids) and solids.values.dtype == np.float64:
+        used.append(int(solids.values[:, element_node_tags(solids, 'solids')[0].shape[1]].max()))
+    nmat = counts('NMAT')
+    if nmat and nmat[0] != len(model.materials):
+        problems.append(f'{name}: NMAT is {nmat[0]}, but there are {len(model.materials)} materials')
+    if max(used, default=0) > len(model.materials):
+        problems.append(f'{name}: material {max(used)} is used while {len(model.materials)} are defined')
+
+    # function files (e.g. temperature curves of trusses) are looked for next to the input file
+    for line in model.lines:
+        if '.txt' in line or '.TXT' in line:
+            for token in line.split():
+                path = os.path.join(dirname(abspath(in_file_path)), token)
+                if token.lower().endswith('.txt') and token != 'cfd.txt' and not exists(path):
+                    problems.append(f'{name}: referenced file {token} was not found')
+
+    return problems, {'nfiber': model.nfiber, 'solids': len(solids), 'time_end': model.time_end}
+
+
+def check_t0r(t0r_path):
+    '''Problems of the torsion results file and the number of fibers it was calculated for'''
+    name = basename(t0r_path)
+    try:
+        with open(t0r_path) as file:
+            tor = file.read()
+    except FileNotFoundError:
+        return [f'{name}: torsion file was not found'], {}
+
+    problems = [] if all(t in tor for t in ['GJ', 'w\n']) else [f'{name}: there are no torsion results']
+    tokens = tor[:tor.find('\n', tor.find('NFIBERBEAM'))].split()
+    if 'NFIBERBEAM' not in tokens:
+        return problems + [f'{name}: there is no NFIBERBEAM line'], {}
+
+    return problems, {'nfiber': int(tokens[tokens.index('NFIBERBEAM') + 1])}
+
+
+def check_transfer(transfer_path, chunk=2**20):
+    '''Problems of the CFD transfer file: number of points (NP) not matching XYZ_INTENSITIES and the last time step
+    not complete. Only the header and the end of the file are read, the end time is returned'''
+    name, points, xyz, reading = basename(transfer_path), None, 0, False
+    with open(transfer_path, 'rb') as file:
+        for line in file:
+            tokens = line.split()
+            if reading and tokens[:1] == [b'END_XYZ']:
+                break
+            elif reading:
+                xyz += 1
+            elif tokens[:1] == [b'NP']:
+                points = int(file.readline())
+            elif tokens[:1] == [b'XYZ_INTENSITIES']:
+                reading = True
+
+        # the last TIME keyword looked for in bigger and bigger parts of the end of the file
+        size = file.seek(0, os.SEEK_END)
+        tail, start = b'', size
+        while start and b'TIME' not in tail:
+            start = max(size - len(tail) - chunk, 0)
+            file.seek(start)
+            tail = file.read()
+            chunk *= 2
+
+    problems = [] if points == xyz else [f'{name}: NP is {points}, but there are {xyz} points']
+    lines = tail[tail.rfind(b'TIME'):].split(b'\n')[1:] if b'TIME' in tail else []
+    if not lines or not lines[0].strip():
+        return problems + [f'{name}: there are no time steps'], {}
+    values = [line for line in lines[1:] if line.strip()]
+    if points is not None and len(values) != points:
+        problems.append(f'{name}: the last time step has {len(values)} values instead of {points}')
+
+    return problems, {'time_end': float(lines[0])}
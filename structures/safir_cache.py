@@ -0,0 +1,184 @@
+import argparse as ar
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime as dt
+from os.path import abspath, basename, dirname, expanduser, isfile, join
+
+from safir_tools import referenced_files, file_hash, read_in
+
+'''Content-addressed cache of SAFIR results - unchanged analyses are restored instead of being calculated again'''
+
+DEFAULT_DIR = join(expanduser('~'), '.cache', 'fireeng-tools', 'safir')
+OUTPUTS = ('.xml', '.tem', '.tsh', '.out', '.t0r', '.tor')     # extensions of files produced by SAFIR
+
+
+class SafirCache:
+    def __init__(self, cache_dir=DEFAULT_DIR, max_size=20 * 2**30):
+        self.dir = cache_dir
+        self.max_size = max_size    # [B] least recently used results are removed above this size
+        self.exe_hashes = {}    # {(path, size, mtime): hash} executables are hashed once per process
+        os.makedirs(self.dir, exist_ok=True)
+
+    def exe_hash(self, safir_exe_path):
+        path = shutil.which(safir_exe_path) or safir_exe_path
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return f'missing:{safir_exe_path}'
+        k = (abspath(path), stat.st_size, stat.st_mtime_ns)
+        if k not in self.exe_hashes:
+            self.exe_hashes[k] = file_hash(path).hexdigest()
+        return self.exe_hashes[k]
+
+    # hash of the input file, all files it references and SAFIR executable
+    def key(self, in_file_path, safir_exe_path='safir'):
+        hasher = hashlib.sha256()
+        hasher.update(self.exe_hash(safir_exe_path).encode())
+        file_hash(in_file_path, hasher)
+        for ref in sorted(referenced_files(in_file_path)):
+            hasher.update(basename(ref).lower().encode())
+            if isfile(ref):
+                file_hash(ref, hasher)
+            else:
+                hasher.update(b'missing')
+
+        return hasher.hexdigest()
+
+    # files in the model directory before the calculations {name: (size, mtime)}
+    def snapshot(self, in_file_path):
+        files = {}
+        for f in os.scandir(dirname(abspath(in_file_path))):
+            if f.is_file():
+                stat = f.stat()
+                files[f.name] = (stat.st_size, stat.st_mtime_ns)
+        return files
+
+    # names of files written by SAFIR for the input file: [chid].XML, OUT, TEM, TSH, T0R files of torsion analyses
+    # ([chid]-1.T0R) and TEM/TSH of the structural elements heated in natural fire analyses (b00001_1.tem), other
+    # jobs may be writing to the same directory
+    @staticmethod
+    def owned(in_file_path, names):
+        dirpath = dirname(abspath(in_file_path))
+        chid = basename(in_file_path)[:-3].lower()
+        own = {f'{chid}{e}' for e in OUTPUTS}
+        prefixes = set()    # {('b00001', '.tem'), ...}
+
+        with open(in_file_path) as file:
+            lines = file.readlines()
+        for no, line in enumerate(lines):
+            spltd = line.split()
+            if not spltd:
+                continue
+            if spltd[0] == 'NODES':
+                break
+            if spltd[0] in {'BEAM_TYPE', 'SHELL_TYPE'}:
+                # structural input file is given next to the element type
+                structural = [lines[i].strip() for i in (no - 1, no + 1)
+                              if 0 <= i < len(lines) and lines[i].strip().lower().endswith('.in')]
+                if not structural or not isfile(join(dirpath, structural[0])):
+                    return []   # results cannot be told from the other jobs' ones
+                model = read_in(join(dirpath, structural[0]), lazy=True, cache=None)
+                table, prefix, ext = (model.beams, 'b', '.tem') if spltd[0] == 'BEAM_TYPE' else \
+                    (model.shells, 's', '.tsh')
+                if len(table.values):
+                    prefixes.update((f'{prefix}{t:05d}', ext) for t in
+                                    table.tags[table.values[:, -1] == int(spltd[1])].tolist())
+
+        return [n for n in names if n.lower() in own or (n.lower().split('_')[0], n.lower()[-4:]) in prefixes or
+                (n.lower().startswith(f'{chid}-') and n.lower().endswith(('.t0r', '.tor')))]
+
+    # key has to be calculated before the calculations, as SAFIR may produce files referenced by the input file
+    def restore(self, key, in_file_path):
+        entry = join(self.dir, key)
+        try:
+            with open(join(entry, 'meta.json')) as file:
+                meta = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+
+        for name in meta['files']:
+            shutil.copyfile(join(entry, name), join(dirname(abspath(in_file_path)), name))
+        os.utime(join(entry, 'meta.json'))     # mark as recently used
+
+        return True
+
+    def store(self, key, in_file_path, before=None):
+        dirpath = dirname(abspath(in_file_path))
+        before = before if before else {}
+        after = self.snapshot(in_file_path)
+
+        # results are files of this input file created or modified during the calculations
+        produced = self.owned(in_file_path, [n for n, s in after.items() if before.get(n) != s])
+        if not produced:
+            return False
+
+        temp = join(self.dir, f'{key}.{os.getpid()}.tmp')
+        os.makedirs(temp, exist_ok=True)
+        size = 0
+        for name in produced:
+            shutil.copyfile(join(dirpath, name), join(temp, name))
+            size += after[name][0]
+        with open(join(temp, 'meta.json'), 'w') as file:
+            json.dump({'in_file': abspath(in_file_path), 'files': produced, 'size': size, 'created': str(dt.now())},
+                      file, indent=4)
+
+        try:
+            os.rename(temp, join(self.dir, key))
+        except OSError:
+            shutil.rmtree(temp, ignore_errors=True)     # the same results have already been stored
+
+        self.evict()
+        return True
+
+    def entries(self):
+        entries = []
+        for e in os.scandir(self.dir):
+            try:
+                with open(join(e.path, 'meta.json')) as file:
+                    meta = json.load(file)
+                entries.append([os.stat(join(e.path, 'meta.json')).st_mtime, meta['size'], e.path])
+            except (FileNotFoundError, NotADirectoryError, json.JSONDecodeError):
+                continue
+
+        return sorted(entries)  # [[last used, size, path], ...] the least recently used first
+
+    # remove the least recently used results until the cache is smaller than max_size
+    def evict(self, max_size=None):
+        max_size = self.max_size if max_size is None else max_size
+        entries = self.entries()
+        total = sum(e[1] for e in entries)
+        removed = 0
+        for used, size, path in entries:
+            if total <= max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            removed += 1
+
+        return removed
+
+    def info(self):
+        entries = self.entries()
+        print(f'[INFO] {len(entries)} results stored in {self.dir}, '
+              f'{sum(e[1] for e in entries) / 2**20:.1f} MB of {self.max_size / 2**20:.1f} MB used')
+
+
+def get_arguments():
+    parser = ar.ArgumentParser(description='Manage the cache of SAFIR results')
+    parser.add_argument('action', choices=['info', 'evict', 'clear'], help='What to do with the cache')
+    parser.add_argument('-d', '--dir', help='Path to cache directory', default=DEFAULT_DIR)
+    parser.add_argument('-m', '--max_size', help='Maximum size of the cache [GB]', type=float, default=20)
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_arguments()
+    cache = SafirCache(abspath(args.dir), max_size=int(args.max_size * 2**30))
+    if args.action == 'evict':
+        print(f'[OK] {cache.evict()} results removed')
+    elif args.action == 'clear':
+        print(f'[OK] {cache.evict(max_size=0)} results removed')
+    cache.info()
@@ -1,169 +1,763 @@
+import asyncio
+import csv
+import gc
+import hashlib
+import json
+import mmap
 import os.path
+import re
+import shutil
 import subprocess
 import sys
-from os import getcwd, chdir, symlink
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations, islice, repeat
+from os import symlink
+from queue import Queue, Empty
+from threading import Thread
+from time import time
 from datetime import datetime as dt
+from datetime import timedelta as td
 
-from xml.dom.minidom import parse as pxml
-from xml.etree import ElementTree
-from os.path import dirname, basename, abspath, exists
+import numpy as np
+from numpy.lib.format import open_memmap
 
-from file_read_backwards import FileReadBackwards as frb
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape, quoteattr
+from os.path import dirname, basename, abspath, exists, expanduser
 
 
 
 ### USEFUL FUNCTIONS TO BE USED WITH SAFIR ###
 
+NUMBER = re.compile(r'[-+]?(?:\d+\.\d*|\.\d+|\d+)(?:[eEdD][-+]?\d+)?')
+MNV_VALUE = re.compile(rb'<V>([^<]*)</V>')
+DISPLACEMENT = re.compile(rb'<D>([^<]*)</D>')
+# internal forces in the order of MNV values at the Gauss point
+MNV_QUANTITIES = ['N', 'Mz', 'My', 'Mw', 'Mr', 'Vz', 'Vy']
+
 def repair_relax_in_xml(xml_file_path):
     """Modifying relaxations in the XML output file to the correct format for Diamond"""
-    # Check if there is </SAFIR_RESULTS> at the end of the file
+    # relaxations are fixed in place with memory-mapped file, the same as in repair_relax, instead of parsing the tree
+    print(f"[WAIT] Modifying relaxations in the {basename(xml_file_path)} file")
+    repair_relax(xml_file_path, copyxml=False, verb=False)
+    print(f"[OK] Changes written to the {basename(xml_file_path)} file")
 
-    # Currently works only for beams
-    print(f"[WAIT] Parsing the {basename(xml_file_path)} file")
-    tree = ElementTree.parse(xml_file_path)
-    print(f"[OK] File parsed")
 
-    def modify_rlx(rlx_text):
-        return rlx_text.replace('-0.100E+01', '-1').replace('0.000E+00', '0')
+class SafirOutput:
+    '''Parsing SAFIR stdout line by line - shared by synchronous and asynchronous runners'''
+    def __init__(self, chid, print_time=True, verbose=False, t_end=None, timeline_path=None):
+        self.chid = chid
+        self.print_time = print_time
+        self.print_all = verbose
+        self.success = True
+        self.count = 0      # number of simulations, counted with '=====' separators
+        self.start = dt.now()
+
+        # progress of the simulation
+        self.t_end = t_end  # [s] simulated end time, required for ETA
+        self.first = None   # [wall clock, simulated time, sim counter] of the first step of the current simulation
+        self.last = None    # [wall clock, simulated time] of the last step
+        self.timestep = None    # [s] the last increment of simulated time
+        self.progress = time()  # wall clock of the last increment of simulated time
+        self.fatal = None   # the first fatal message
+        self.killed = None  # reason of killing the process by Watchdog
+        self.timeline = open(timeline_path, 'w', buffering=1) if timeline_path else None
+        self.record('start', t_end=t_end)
+
+    # write one record of JSONL timeline
+    def record(self, event, **data):
+        if self.timeline:
+            self.timeline.write(json.dumps({'event': event, 'wall': time(), 'sim': self.count, **data}) + '\n')
+
+    # throughput - simulated seconds per wall clock second in the current simulation
+    def rate(self):
+        try:
+            wall = self.last[0] - self.first[0]
+            simulated = self.last[1] - self.first[1]
+        except TypeError:
+            return None
+        return simulated / wall if wall > 0 and simulated > 0 else None
+
+    # [s] estimated wall clock time to the end of the current simulation
+    def eta(self):
+        rate = self.rate()
+        if rate and self.t_end:
+            return max(self.t_end - self.last[1], 0) / rate
+
+    def step(self, output):
+        found = NUMBER.search(output)
+        if not found:
+            return
+        simulated = float(found.group().upper().replace('D', 'E'))
+        now = time()
+        if not self.first or self.first[2] != self.count:
+            self.first = [now, simulated, self.count]
+            self.timestep = None
+        elif simulated > self.last[1]:
+            self.timestep = simulated - self.last[1]
+        if not self.last or simulated != self.last[1]:
+            self.progress = now
+        self.last = [now, simulated]
+        self.record('step', time=simulated, rate=self.rate(), eta=self.eta())
+
+    def read(self, output):
+        if not output:
+            return
+        fatal = 'ERROR' in output or 'forrtl' in output
+        if fatal:
+            self.fatal = self.fatal if self.fatal else output
+            self.success = False
+            self.record('error', message=output)
+        elif '======================' in output:
+            self.count += 1
+        elif 'time' in output:
+            self.step(output)
+
+        if self.print_all:
+            print('    ', output)
+        # check for errors
+        elif fatal:
+            print('[ERROR] FatalSafirError: ')
+            self.print_all = True
+            print('    ', output)
+        # check for timestep
+        elif 'time' in output and '======================' not in output and self.print_time:
+            eta = self.eta()
+            eta = f' (ETA {td(seconds=int(eta))})' if eta is not None else ''
+            print(f'SAFIR started "{self.chid}" (sim #{self.count}) calculations: {output[7:]}{eta}', end='\r')
+
+    def kill(self, process, reason):
+        process.kill()
+        self.killed = reason
+        self.success = False
+        self.record('kill', reason=reason)
+        print(f'[WARNING] "{self.chid}" killed by watchdog: {reason}')
+
+    def finish(self, rc, xml_path, fix_rlx=True):
+        self.record('end', rc=rc, success=self.success, time=self.last[1] if self.last else None, rate=self.rate(),
+                    elapsed=(dt.now() - self.start).total_seconds(), killed=self.killed)
+        self.timeline.close() if self.timeline else None
+
+        if self.killed:
+            return -1
+        elif not rc:
+            if self.success:
+                if self.print_time:
+                    count = 1 if self.count == 0 else self.count
+                    print(f'[OK] SAFIR finished {count} "{self.chid}" calculations at')
+                    print(f'[INFO] Computing time: {dt.now() - self.start}')
+                repair_relax(xml_path) if fix_rlx else None
+                return 0
+            else:
+                print(f'[WARNING] SAFIR finished "{self.chid}" calculations with error!')
+                return -1
 
-    for rlx in tree.find('RELAX/BEAMS'):
-        rlx.text = modify_rlx(rlx.text)
-    print("[OK] Relaxations modified")
 
-    print(f"[WAIT] Writing changes to the {basename(xml_file_path)} file")
-    tree.write(xml_file_path)
-    print(f"[OK] Changes written to the {basename(xml_file_path)} file")
+class Watchdog:
+    '''Policies of killing SAFIR processes that will not finish properly, one Watchdog guards one run'''
+    def __init__(self, kill_on_error=True, stall_timeout=None, min_timestep=None):
+        self.kill_on_error = kill_on_error  # kill on the first ERROR or forrtl message
+        self.stall_timeout = stall_timeout  # [s] of wall clock time without a new time step
+        self.min_timestep = min_timestep    # [s] of simulated time between two steps
+        self.reason = None  # why the process was killed
 
+    def copy(self):
+        return Watchdog(self.kill_on_error, self.stall_timeout, self.min_timestep)
 
-def run_safir(in_file_path, safir_exe_path='safir', print_time=True, fix_rlx=True, verbose=False, wine=False, key=None):
-    '''Running SAFIR simulation with clear output under Linux or Windows'''
-    start = dt.now()
-    backpath = getcwd()
-    dirpath = dirname(in_file_path)
-    chdir(dirpath)
+    # how long to wait for a line of output before checking the process again
+    def interval(self):
+        return min(1.0, self.stall_timeout / 4) if self.stall_timeout else None
+
+    # reason of killing the process or None if it should run on
+    def check(self, out):
+        if self.kill_on_error and out.fatal:
+            self.reason = f'fatal message "{out.fatal}"'
+        elif self.min_timestep and out.timestep is not None and out.timestep < self.min_timestep:
+            self.reason = f'time step {out.timestep:g} s at {out.last[1]:g} s is below {self.min_timestep:g} s'
+        elif self.stall_timeout and time() - out.progress > self.stall_timeout:
+            self.reason = f'no new time step for {time() - out.progress:.0f} s'
+
+        return self.reason
+
+
+def prepare_safir(in_file_path, safir_exe_path='safir', print_time=True, wine=False, key=None):
+    '''Linking the license and building SAFIR command, returns [command, model directory, chid]'''
+    # SAFIR runs in the model directory, the working directory of Python process is not changed
+    dirpath = dirname(abspath(in_file_path))
     chid = basename(in_file_path)[:-3]
-    
+
     if key:
         try:
-            symlink(key, './identity.key')
+            symlink(key, os.path.join(dirpath, 'identity.key'))
             print('[OK] License file linked')
         except FileExistsError:
             print('[OK] License file already linked')
 
-    print(f'[INFO] Calculations started at {start}') if print_time else print(f'Running {chid}...')
+    print(f'[INFO] Calculations started at {dt.now()}') if print_time else print(f'Running {chid}...')
     print(f'Reading {chid} input file...') if print_time else None
-    if not wine:
-        process = subprocess.Popen([safir_exe_path, chid], shell=False, stdout=subprocess.PIPE)
-    else:
-        process = subprocess.Popen(['wine', safir_exe_path, chid], shell=False, stdout=subprocess.PIPE)
 
-    print_all = verbose
-    success = True
-    count = 0
+    command = [safir_exe_path, chid] if not wine else ['wine', safir_exe_path, chid]
+
+    return command, dirpath, chid
 
-    # clear output
+
+def run_safir(in_file_path, safir_exe_path='safir', print_time=True, fix_rlx=True, verbose=False, wine=False, key=None,
+              cache=None, timeline=True, watchdog=None):
+    '''Running SAFIR simulation with clear output under Linux or Windows'''
+    # results of unchanged analysis are restored from safir_cache.SafirCache
+    if cache:
+        cache_key = cache.key(in_file_path, safir_exe_path)
+        if cache.restore(cache_key, in_file_path):
+            print(f'[OK] "{basename(in_file_path)[:-3]}" results restored from cache')
+            # relaxations are repaired the same as in calculated results (the fixed copy is not cached)
+            xml_path = f'{abspath(in_file_path)[:-3]}.XML'
+            repair_relax(xml_path) if fix_rlx and exists(xml_path) else None
+            return 0
+        before = cache.snapshot(in_file_path)
+
+    command, dirpath, chid = prepare_safir(in_file_path, safir_exe_path, print_time=print_time, wine=wine, key=key)
+    out = SafirOutput(chid, print_time=print_time, verbose=verbose, t_end=end_time(in_file_path),
+                      timeline_path=os.path.join(dirpath, f'{chid}_timeline.jsonl') if timeline else None)
+    process = subprocess.Popen(command, shell=False, stdout=subprocess.PIPE, cwd=dirpath)
+
+    # output is read in a separate thread, so the watchdog can check the process when SAFIR is silent
+    lines = Queue()
+
+    def read_lines():
+        for line in process.stdout:
+            lines.put(line)
+        lines.put(None)
+    Thread(target=read_lines, daemon=True).start()
+
+    # clear output, reading blocks until SAFIR prints next line or closes the pipe
+    interval = watchdog.interval() if watchdog else None
     while True:
-        if process.poll() is not None:
-            break
         try:
-            output = process.stdout.readline().strip().decode()
-        except UnicodeError:
-            continue
-        if output:
-            if print_all:
-                print('    ', output)
-            # check for errors
-            elif 'ERROR' in output or 'forrtl' in output:
-                print('[ERROR] FatalSafirError: ')
-                print_all = True
-                success = False
-                print('    ', output)
-            elif '======================' in output:
-                count += 1
-            # check for timestep
-            elif 'time' in output and print_time:
-                print(f'SAFIR started "{chid}" (sim #{count}) calculations: {output[7:]}', end='\r')
-
-    rc = process.poll()
-    chdir(backpath)
-
-    if not rc:
-        if success:
-            if print_time:
-                count = 1 if count == 0 else count
-                print(f'[OK] SAFIR finished {count} "{chid}" calculations at')
-                print(f'[INFO] Computing time: {dt.now() - start}')
-            repair_relax(f'{dirpath}/{chid}.XML') if fix_rlx else None
+            line = lines.get(timeout=interval)
+        except Empty:
+            line = b''
+        if line is None:
+            break
+        # undecodable bytes are replaced, so that the watchdog checks SAFIR printing only them too
+        out.read(line.strip().decode(errors='replace'))
+        if watchdog and watchdog.check(out):
+            out.kill(process, watchdog.reason)
+            break   # subprocesses of killed SAFIR (e.g. under wine) may keep the pipe open
+
+    rc = process.wait()
+    result = out.finish(rc, os.path.join(dirpath, f'{chid}.XML'), fix_rlx=fix_rlx)
+    cache.store(cache_key, in_file_path, before) if cache and result == 0 else None
+
+    return result
+
+
+async def run_safir_async(in_file_path, safir_exe_path='safir', print_time=True, fix_rlx=True, verbose=False,
+                          wine=False, key=None, cache=None, timeline=True, watchdog=None):
+    '''Running SAFIR simulation as a coroutine - many simulations can be supervised by one event loop'''
+    loop = asyncio.get_running_loop()
+    if cache:
+        cache_key = await loop.run_in_executor(None, cache.key, in_file_path, safir_exe_path)
+        if await loop.run_in_executor(None, cache.restore, cache_key, in_file_path):
+            print(f'[OK] "{basename(in_file_path)[:-3]}" results restored from cache')
+            xml_path = f'{abspath(in_file_path)[:-3]}.XML'
+            if fix_rlx and exists(xml_path):
+                await loop.run_in_executor(None, repair_relax, xml_path)
             return 0
-        else:
-            print(f'[WARNING] SAFIR finished "{chid}" calculations with error!')
-            return -1
+        before = cache.snapshot(in_file_path)
+
+    command, dirpath, chid = prepare_safir(in_file_path, safir_exe_path, print_time=print_time, wine=wine, key=key)
+    out = SafirOutput(chid, print_time=print_time, verbose=verbose, t_end=end_time(in_file_path),
+                      timeline_path=os.path.join(dirpath, f'{chid}_timeline.jsonl') if timeline else None)
+    if os.name == 'posix':
+        # pipe opened here can be closed even if it is kept open by subprocesses of SAFIR killed by watchdog (e.g. wine)
+        read_fd, write_fd = os.pipe()
+        try:
+            process = await asyncio.create_subprocess_exec(*command, stdout=write_fd, cwd=dirpath)
+        finally:
+            os.close(write_fd)
+        stdout = asyncio.StreamReader(limit=2**20)
+        pipe, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(stdout), os.fdopen(read_fd, 'rb'))
+    else:
+        # native SAFIR under Windows closes the pipe when killed
+        process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE, cwd=dirpath,
+                                                       limit=2**20)
+        stdout, pipe = process.stdout, None
+
+    # lines are streamed through the pipe, the loop is idle between them
+    interval = watchdog.interval() if watchdog else None
+    while True:
+        try:
+            line = await asyncio.wait_for(stdout.readline(), interval)
+            if not line:
+                break
+        except asyncio.TimeoutError:
+            line = b''
+        out.read(line.strip().decode(errors='replace'))
+        if watchdog and watchdog.check(out):
+            out.kill(process, watchdog.reason)
+            break   # subprocesses of killed SAFIR (e.g. under wine) may keep the pipe open
+
+    pipe.close() if pipe else None
+    rc = await process.wait()
+
+    # repairing relaxations is blocking, so it is done outside the event loop
+    result = await loop.run_in_executor(None, out.finish, rc, os.path.join(dirpath, f'{chid}.XML'), fix_rlx)
+    if cache and result == 0:
+        await loop.run_in_executor(None, cache.store, cache_key, in_file_path, before)
+
+    return result
+
+
+def end_time(in_file_path):
+    '''Simulated end time from the input file (the line before ENDTIME), None if not found'''
+    previous = ''
+    with open(in_file_path) as file:
+        for line in file:
+            if 'ENDTIME' in line:
+                try:
+                    return float(previous.split()[1])
+                except (IndexError, ValueError):
+                    return None
+            previous = line
+
+
+def timeline_summary(timeline_path):
+    '''Summary of the JSONL timeline recorded by run_safir'''
+    with open(timeline_path) as file:
+        records = [json.loads(l) for l in file if l.strip()]
+
+    sims = {}
+    for r in records:
+        if r['event'] == 'step':
+            sims.setdefault(r['sim'], []).append(r)
+
+    start = records[0]['wall']
+    for sim, steps in sims.items():
+        wall = steps[-1]['wall'] - steps[0]['wall']
+        simulated = steps[-1]['time'] - steps[0]['time']
+        rate = f'{simulated / wall:.3f}' if wall > 0 else '-'
+        print(f'[INFO] sim #{sim}: {len(steps)} steps, {steps[0]["time"]}-{steps[-1]["time"]} s simulated in '
+              f'{wall:.1f} s, throughput {rate} s/s')
+
+    end = records[-1]
+    if end['event'] == 'end':
+        print(f'[INFO] Finished with code {end["rc"]} after {end["wall"] - start:.1f} s')
+    else:
+        print(f'[INFO] Still running, last record {time() - end["wall"]:.1f} s ago')
+
+    return sims
+
 
+def referenced_files(in_file_path):
+    '''List of files referenced by the input file (TEM, TSH, TXT, IN, T0R, cfd.txt) as absolute paths'''
+    dirpath = dirname(abspath(in_file_path))
+    chid = basename(in_file_path)[:-3]
+    extensions = ('.tem', '.tsh', '.txt', '.in', '.t0r', '.tor')
+    found = []
+
+    def add(name):
+        path = os.path.join(dirpath, name)
+        if path not in found:
+            found.append(path)
+
+    with open(in_file_path) as file:
+        for line in file:
+            for token in line.split():
+                if token.lower().endswith(extensions):
+                    add(token)
+            # CFD heating reads the transfer file with a fixed name
+            if 'MAKE.TEMCD' in line or 'MAKE.TSHCD' in line:
+                add('cfd.txt')
+
+    # torsion results of the profile are used together with its thermal results
+    for suffix in ['-1.T0R', '-t.TOR', '.T0R']:
+        if exists(os.path.join(dirpath, f'{chid}{suffix}')):
+            add(f'{chid}{suffix}')
+
+    return found
+
+
+RLX_FIXES = [(b'-0.100E+01', b'-1'), (b'0.000E+00', b'0')]   # Diamond format of relaxations
+
+
+# [(start, end), ...] byte ranges of <RELAX> elements
+def relax_regions(mm):
+    regions = []
+    start = mm.find(b'<RELAX')
+    while start >= 0:
+        end = mm.find(b'</RELAX>', start)
+        end = len(mm) if end < 0 else end + len(b'</RELAX>')
+        regions.append((start, end))
+        start = mm.find(b'<RELAX', end)
+
+    return regions
 
-def repair_relax(path_to_xml, copyxml=True, verb=True):
+
+# relaxations in Diamond format, replacements are padded with spaces when the file is modified in place
+def fix_rlx(data, pad=False):
+    fixed = 0
+    lines = data.split(b'\n')
+    for i, line in enumerate(lines):
+        if b'RLX' in line:
+            for old, new in RLX_FIXES:
+                line = line.replace(old, new.ljust(len(old)) if pad else new)
+            lines[i] = line
+            fixed += 1
+
+    return b'\n'.join(lines), fixed
+
+
+def repair_relax(path_to_xml, copyxml=True, verb=True, chunk=2**24):
     '''Modifying relaxations in the XML output file to the correct format for Diamond --- no xml packages'''
-    rlx_lines = []
-    index = 0
+    # file is memory-mapped and only <RELAX> elements are rewritten, the rest is copied (or left) as it is
     fixed = 0
+    path_to_fixed = f'{path_to_xml[:-4]}_fixed.XML'
 
-    with open(path_to_xml) as xmlfile:
-        for line in xmlfile:
-            if 'RLX' in line:
-                rlx_lines.append('0'.join('-1'.join(line.split('-0.100E+01')).split('0.000E+00')))
-                fixed += 1
-            else:
-                rlx_lines.append(line)
+    with open(path_to_xml, 'rb' if copyxml else 'r+b') as xmlfile:
+        if os.fstat(xmlfile.fileno()).st_size == 0:
+            open(path_to_fixed, 'wb').close() if copyxml else None
+            return 0
+        mm = mmap.mmap(xmlfile.fileno(), 0, access=mmap.ACCESS_READ if copyxml else mmap.ACCESS_WRITE)
 
-            index += 1
+        # RLX records are processed in chunks of whole lines to keep memory bounded
+        def lines_chunks(start, end):
+            while start < end:
+                stop = min(start + chunk, end)
+                if stop < end:
+                    stop = mm.rfind(b'\n', start, stop) + 1 or stop
+                yield start, stop
+                start = stop
 
-    with open(f'{path_to_xml[:-4]}_fixed.XML' if copyxml else path_to_xml, 'w') as newxml:
-        newxml.writelines(rlx_lines)
+        try:
+            if copyxml:
+                with open(path_to_fixed, 'wb') as newxml, memoryview(mm) as view:
+                    position = 0
+                    for start, end in relax_regions(mm) + [(len(mm), len(mm))]:
+                        for i in range(position, start, chunk):
+                            newxml.write(view[i:min(i + chunk, start)])
+                        for i, j in lines_chunks(start, end):
+                            data, count = fix_rlx(mm[i:j])
+                            newxml.write(data)
+                            fixed += count
+                        position = end
+            else:
+                for start, end in relax_regions(mm):
+                    for i, j in lines_chunks(start, end):
+                        mm[i:j], count = fix_rlx(mm[i:j], pad=True)
+                        fixed += count
+                mm.flush()
+        finally:
+            mm.close()
 
     print(f'[OK] {fixed} XML file lines fixed (relaxations bug)') if verb else None
 
     return 0
 
 
-def move_in(infile_path, x, y, z):
+def move_in(infile_path, x, y, z, cache=None):
     '''Moving the model with given vector'''
-    infile = read_in(infile_path)
+    infile = read_in(infile_path, lazy=True, cache=cache)
     infile.move([float(i) for i in [x, y, z]])
     infile.save_line(f'{infile.chid}_moved.in')
     print(f'[OK] Model moved with ({x}, {y}, {z}) vector')
 
 
-def preview(xmlfile_path):
+def renumber(in_file_path, out_path=None, cache=None):
+    '''Nodes of the structural input file renumbered in reverse Cuthill-McKee order to reduce the bandwidth of the
+    stiffness matrix, saved as [chid]_rcm.in (or out_path) with the table of old and new node tags [..]_nodes.csv.
+    Returns old tags in the new order, (bandwidth, profile) before and after'''
+    infile = read_in(in_file_path, lazy=True, cache=cache)
+    graph = node_graph(infile)
+    order = rcm_order(graph)
+    before, after = bandwidth(infile, graph), bandwidth(infile, graph, order)
+    if after[1] >= before[1]:
+        # e.g. structured meshes numbered row by row already, tags are only made 1, 2, ..., n then
+        order, after = np.argsort(infile.nodes.tags, kind='stable'), before
+    old = infile.renumber(order)
+
+    out_path = abspath(out_path) if out_path else os.path.join(dirname(abspath(in_file_path)), f'{infile.chid}_rcm.in')
+    infile.save_line(basename(out_path), path=dirname(out_path))
+    with open(f'{os.path.splitext(out_path)[0]}_nodes.csv', 'w', newline='') as file:
+        table = csv.writer(file)
+        table.writerow(['old', 'new'])
+        table.writerows(zip(old.tolist(), range(1, len(old) + 1)))
+    print(f'[OK] Nodes of {infile.chid} renumbered: bandwidth {before[0]} -> {after[0]}, profile {before[1]} -> '
+          f'{after[1]}')
+
+    return old, before, after
+
+
+class XMLIndex:
+    '''Byte offsets of STEP blocks in SAFIR XML results, stored in a sidecar file and extended while the file grows'''
+    def __init__(self, path_to_xml, sidecar=True):
+        self.xml = path_to_xml
+        self.path = f'{path_to_xml}.idx' if sidecar else None
+        self.header = None  # offset of the first STEP (the end of the header)
+        self.steps = []     # [[start, end, simulated time], ...] of complete STEP blocks
+        self.scanned = 0    # offset where the next update starts
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as file:
+                index = json.load(file)
+            self.header, self.steps, self.scanned = index['header'], index['steps'], index['scanned']
+        except (TypeError, FileNotFoundError, json.JSONDecodeError, KeyError):
+            pass
+
+    def save(self):
+        if self.path:
+            try:
+                with open(self.path, 'w') as file:
+                    json.dump({'xml': basename(self.xml), 'header': self.header, 'scanned': self.scanned,
+                               'steps': self.steps}, file)
+            except PermissionError:
+                pass    # results directory is read-only, index is kept in memory
+
+    def reset(self):
+        self.header = None
+        self.steps = []
+        self.scanned = 0
+
+    # index is rebuilt when the file has been replaced (e.g. by a new run of the same model)
+    def valid(self, mm):
+        if self.scanned > len(mm):
+            return False
+        if self.steps:
+            start, end, t = self.steps[-1]
+            return mm[start:start + 5] == b'<STEP' and mm[end - 7:end] == b'</STEP>'
+        return True
+
+    # scan only the part of the file written since the last update, incomplete STEP is left for the next one
+    def update(self):
+        with open(self.xml, 'rb') as xmlfile:
+            if os.fstat(xmlfile.fileno()).st_size == 0:
+                return self
+            with mmap.mmap(xmlfile.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                self.reset() if not self.valid(mm) else None
+                start = mm.find(b'<STEP', self.scanned)
+                while start >= 0:
+                    end = mm.find(b'</STEP>', start)
+                    if end < 0:
+                        break
+                    end += len(b'</STEP>')
+                    self.header = start if self.header is None else self.header
+                    self.steps.append([start, end, self.time(mm, start, end)])
+                    self.scanned = end
+                    start = mm.find(b'<STEP', end)
+        self.save()
+
+        return self
+
+    @staticmethod
+    def time(mm, start, end):
+        tag = mm.find(b'<TIME', start, end)
+        if tag < 0:
+            return None
+        found = NUMBER.search(mm[mm.find(b'>', tag, end) + 1:mm.find(b'</TIME>', tag, end)].decode())
+        return float(found.group()) if found else None
+
+    # bytes of the header (relaxations fixed) and of the chosen step
+    def read(self, step=-1):
+        start, end, t = self.steps[step]
+        with open(self.xml, 'rb') as xmlfile:
+            header = fix_rlx(xmlfile.read(self.header))[0]
+            xmlfile.seek(start)
+            chunk = xmlfile.read(end - start)
+        return header, chunk, t
+
+    # standalone XML file with the header and one step
+    def extract(self, step=-1, path=None):
+        t = self.steps[step][2]
+        path = path if path else f'{self.xml[:-4]}_{t}.xml'
+        self.write([step], path)
+
+        return path, t
+
+    # XML file with the header and chosen steps copied chunk by chunk, relaxations are fixed on the way
+    def write(self, steps, path):
+        with open(self.xml, 'rb') as xmlfile, open(path, 'wb') as newxml:
+            for data in line_chunks(xmlfile, 0, self.header):
+                newxml.write(fix_rlx(data)[0])
+            for n in steps:
+                start, end, t = self.steps[n]
+                newxml.writelines(line_chunks(xmlfile, start, end))
+                newxml.write(b'\n')
+            newxml.write(b'</SAFIR_RESULTS>\n')
+
+        return path
+
+
+# byte range of the file in chunks of whole lines
+def line_chunks(file, start, end, chunk=2**24):
+    file.seek(start)
+    rest = b''
+    while start < end:
+        data = file.read(min(chunk, end - start))
+        if not data:
+            break
+        start += len(data)
+        data = rest + data
+        cut = data.rfind(b'\n') + 1 if start < end else len(data)
+        rest = data[cut:]
+        yield data[:cut]
+
+
+def preview(xmlfile_path, step=-1):
     '''Preview of XML results while calculation process is not finished yet'''
+    # the last complete step by default, sidecar index makes the next previews read only the new part of the file
+    index = XMLIndex(xmlfile_path).update()
+    if not index.steps:
+        print(f'[WARNING] There is no complete time step in {basename(xmlfile_path)} yet')
+        return -1
 
-    temp_xml_lines = ['</SAFIR_RESULTS>\n']
-    last_step = 0
-    do_write = False
+    path, last_step = index.extract(int(step))
+    print(f'[OK] Results preview at {last_step} s ready! ({basename(path)}, {len(index.steps)} steps available)')
 
-    i = 0
-    with frb(xmlfile_path, encoding='utf-8') as backward:
-        for l in backward:
-            print(f'Reading line {i} of original XML file...', end='\r')
-            if 'RLX' in l:  #prevent relaxations bug
-                temp_xml_lines.insert(0, '0'.join('-1'.join(line.split('-0.100E+01')).split('0.000E+00')))
-            if do_write:
-                temp_xml_lines.insert(0, l+'\n')
-                if 'TIME' in l and last_step == 0:
-                    #<TIME format="F14.5">      13.00000</TIME>
-                    last_step = float(l[21:-7])
+    return 0
 
-            elif 'STEP' in l:
-                do_write = True
-            i+=1
 
-    with open(f'{xmlfile_path[:-4]}_{last_step}.xml', 'w') as newxml:
-        print(f'Saving {xmlfile_path[:-4]}_{last_step}.xml file...', end='\r')
-        newxml.writelines(temp_xml_lines)
+# XML element written the same way as SAFIR does - each element in a separate line
+def serialized(elem):
+    attributes = ''.join([f' {name}={quoteattr(value)}' for name, value in elem.items()])
+    if len(elem) == 0:
+        return f'<{elem.tag}{attributes}>{escape(elem.text if elem.text else "")}</{elem.tag}>\n'
 
-    print(f'[OK] Results preview at {last_step} s ready!')
+    return f'<{elem.tag}{attributes}>\n' + ''.join([serialized(child) for child in elem]) + f'</{elem.tag}>\n'
 
-    return 0
-    
 
+class BoxFilter:
+    '''Results of nodes inside the bounding box and elements made of them only, both renumbered from 1'''
+    def __init__(self, bbox):
+        self.bbox = bbox    # [x_min, y_min, (z_min,) x_max, y_max, (z_max)]
+        self.nodes = {}     # {old number: new number}
+        self.elements = {}  # {group: {old number: new number}}
+
+    def inside(self, point):
+        ndim = len(self.bbox) // 2
+        return all([low <= p <= high for p, low, high in zip(point, self.bbox[:ndim], self.bbox[ndim:])])
+
+    # children of the header element are removed or renumbered in place
+    def header(self, elem):
+        if elem.tag == 'NODES':
+            for i, node in enumerate(list(elem)):
+                if self.inside([float(p.text) for p in node]):
+                    self.nodes[i + 1] = len(self.nodes) + 1
+                else:
+                    elem.remove(node)
+
+        elif elem.tag in ELEMENT_GROUPS:
+            numbers = self.elements.setdefault(elem.tag, {})
+            for i, element in enumerate(list(elem)):
+                nodes = [n for n in element if n.tag == 'N']
+                if all([int(n.text) in self.nodes for n in nodes]):
+                    numbers[i + 1] = len(numbers) + 1
+                    for n in nodes:
+                        n.text = str(self.nodes[int(n.text)])
+                else:
+                    elem.remove(element)
+
+        elif elem.tag == 'RELAX':
+            for group in elem:
+                numbers = self.elements.get(group.tag, {})
+                for rlx in list(group):
+                    number = rlx.text.split()[0]
+                    values = rlx.text[rlx.text.index(number) + len(number):]
+                    if int(number) in numbers:
+                        rlx.text = f'{numbers[int(number)]:>{len(rlx.text) - len(values)}}{values}'
+                    else:
+                        group.remove(rlx)
+
+    def step(self, step):
+        for block in step:
+            if block.tag in ['DISPLACEMENTS', 'TEMPERATURES']:
+                [block.remove(node) for i, node in enumerate(list(block)) if i + 1 not in self.nodes]
+            elif block.tag == 'MNV':
+                beams = self.elements.get('BEAMS', {})
+                [block.remove(bm) for i, bm in enumerate(list(block)) if i + 1 not in beams]
+            elif block.tag == 'REACTIONS':
+                keep = False
+                for value in list(block):
+                    if value.tag == 'N':
+                        keep = int(value.text) in self.nodes
+                        value.text = str(self.nodes[int(value.text)]) if keep else value.text
+                    block.remove(value) if not keep else None
+
+    def write(self, xml, steps, path):
+        with open(xml.path, 'rb') as xmlfile:
+            opening = xmlfile.read(xml.head)
+        opening = opening[:opening.find(b'>', opening.find(b'<SAFIR_RESULTS')) + 1] + b'\n'
+
+        with open(path, 'wb') as newxml:
+            newxml.write(opening)
+            # elements before NODES wait for the new number of nodes
+            waiting = []
+            renumbered = False
+            depth = 0
+            for event, elem in xml.iterparse(0, xml.head, events=('start', 'end')):
+                depth += 1 if event == 'start' else -1
+                if event == 'start' or depth != 1:
+                    continue
+                self.header(elem)
+                if elem.tag == 'NNODE':
+                    waiting.append(elem)
+                    continue
+                waiting.append(fix_rlx(serialized(elem).encode())[0])
+                elem.clear()
+                renumbered = renumbered or elem.tag == 'NODES'
+                if renumbered:
+                    for w in waiting:
+                        if isinstance(w, bytes):
+                            newxml.write(w)
+                        else:
+                            w.text = str(len(self.nodes))
+                            newxml.write(serialized(w).encode())
+                    waiting = []
+
+            for n in steps:
+                step = xml.step(n)
+                self.step(step)
+                newxml.write(serialized(step).encode())
+            newxml.write(b'</SAFIR_RESULTS>\n')
+
+        return path
+
+
+# steps chosen with the interval and/or the nearest to given times, the last step is always kept
+def decimated_steps(index, every=None, times=None):
+    chosen = set(range(0, len(index.steps), int(every))) if every else set()
+    if times:
+        step_times = np.array([t if t is not None else np.nan for start, end, t in index.steps])
+        chosen.update([int(np.nanargmin(np.abs(step_times - float(t)))) for t in times])
+    chosen.add(len(index.steps) - 1)
+
+    return sorted(chosen)
+
+
+# list of floats given as a list or as a comma-separated string (from the command line)
+def floats(values):
+    return [float(v) for v in (values.split(',') if isinstance(values, str) else values)]
+
+
+def decimate(xmlfile_path, every=None, times=None, bbox=None, path=None):
+    '''Smaller XML results for Diamond - every Nth step and/or steps the nearest to given times, optionally only nodes
+    inside the bounding box [x_min, y_min, (z_min,) x_max, y_max, (z_max)]'''
+    # the file is streamed step by step and relaxations are fixed in the same pass, as in preview and repair_relax
+    index = XMLIndex(xmlfile_path).update()
+    if not index.steps:
+        print(f'[WARNING] There is no complete time step in {basename(xmlfile_path)} yet')
+        return -1
+
+    steps = decimated_steps(index, every=every, times=floats(times) if times else None)
+    path = path if path else f'{xmlfile_path[:-4]}_decimated{xmlfile_path[-4:]}'
+    if bbox:
+        BoxFilter(floats(bbox)).write(ReadXML(xmlfile_path), steps, path)
+    else:
+        index.write(steps, path)
+    print(f'[OK] {len(steps)} of {len(index.steps)} steps written to {basename(path)}')
+
+    return 0
 
 
 #### ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^ ####
@@ -171,23 +765,75 @@ def preview(xmlfile_path):
 
 # call functions to read single parts of results file
 class ReadXML:
+    '''Results are streamed with iterparse - only the header or the requested STEP block is parsed at once'''
     def __init__(self, pathtoresults):
-        self.doc = pxml(pathtoresults)
+        self.path = pathtoresults
+        self.index = XMLIndex(pathtoresults).update()
+        self.size = os.path.getsize(pathtoresults)
+        self.head = self.index.header if self.index.header is not None else self.size
+
+        # tags found in the header are counted to number the blocks of the whole document as minidom did
+        self.counts = {}
+        self.ngb = None
+        for event, elem in self.iterparse(0, self.head):
+            self.counts[elem.tag] = self.counts.get(elem.tag, 0) + 1
+            if elem.tag == 'NGBM' and self.ngb is None:
+                self.ngb = int(elem.text)
+            elem.clear() if elem.tag not in ['NODES', 'SAFIR_RESULTS'] else None
+
+    # parse byte range of the file chunk by chunk
+    def iterparse(self, start, end, events=('end',), chunk=2**20):
+        parser = ElementTree.XMLPullParser(events=events)
+        with open(self.path, 'rb') as xmlfile:
+            xmlfile.seek(start)
+            while start < end:
+                data = xmlfile.read(min(chunk, end - start))
+                if not data:
+                    break
+                start += len(data)
+                parser.feed(data)
+                yield from parser.read_events()
+
+    # n-th <tag> block of the document, each STEP is assumed to hold one block of given tag at most
+    def block(self, tag, n):
+        in_header = self.counts.get(tag, 0)
+        total = in_header + len(self.index.steps)
+        if not -total <= n < total:
+            raise IndexError(f'There is no {tag} block no. {n} in {basename(self.path)}')
+        n = n + total if n < 0 else n
+
+        start, end = (0, self.head) if n < in_header else self.index.steps[n - in_header][:2]
+        n = n if n < in_header else 0
+        inside = 0
+        for event, elem in self.iterparse(start, end, events=('start', 'end')):
+            if elem.tag == tag:
+                if event == 'start':
+                    inside += 1
+                    continue
+                inside -= 1
+                if n == 0:
+                    return elem
+                n -= 1
+            # elements out of the block are freed as soon as they are parsed
+            if event == 'end' and not inside:
+                elem.clear()
+
+        raise IndexError(f'There is no {tag} block in the requested step of {basename(self.path)}')
 
     def reactions(self, timestep):
         reactions = []
         temp = []
         nr = -1
 
-        for node in self.doc.getElementsByTagName('REACTIONS')[timestep].childNodes[1:-1:2]:
-            if node.nodeName == 'N':
+        for node in self.block('REACTIONS', timestep):
+            if node.tag == 'N':
                 temp = []
-                x = int(node.firstChild.data)
+                x = int(node.text)
                 temp.append(int(x))
-            elif node.nodeName == 'NR':
-                nr = int(node.firstChild.data)
-            elif node.nodeName == 'R':
-                x = float(node.firstChild.data)
+            elif node.tag == 'NR':
+                nr = int(node.text)
+            elif node.tag == 'R':
+                x = float(node.text)
                 temp.append(x)
 
             reactions.append(temp) if len(temp) == nr else None
@@ -198,20 +844,19 @@ class ReadXML:
         mnvs = []
         bmvalues = []
         temp = []
-        ngb = int(self.doc.getElementsByTagName('NGBM')[0].firstChild.data)
 
-        for bm in self.doc.getElementsByTagName('MNV')[1+timestep].childNodes:
-            for gs in bm.childNodes:
-                for i in gs.childNodes:
+        for bm in self.block('MNV', 1+timestep):
+            for gs in bm:
+                for i in gs:
                     try:
-                        temp.append(float(i.firstChild.data))
-                    except AttributeError:
+                        temp.append(float(i.text))
+                    except TypeError:
                         pass
 
                 if len(temp) == 7:
                     bmvalues.append(temp)
                     temp = []
-            if len(bmvalues) == ngb:
+            if len(bmvalues) == self.ngb:
                 mnvs.append(bmvalues)
                 bmvalues = []
 
@@ -219,17 +864,116 @@ class ReadXML:
 
     def nodes(self):
         nodes = []
-        point = []
-        for node in self.doc.getElementsByTagName('NODES')[0].childNodes[1:-1:2]:
-            if node.nodeName == 'N':
-                point = []
-                for p in node.childNodes[1:-1:2]:
-                    point.append(p.firstChild.data)
-
-            nodes.append([float(coord) for coord in point]) if len(point) == 3 else None
+        inside = False
+        for event, elem in self.iterparse(0, self.head, events=('start', 'end')):
+            if elem.tag == 'NODES':
+                inside = event == 'start'
+                if not inside:
+                    break
+            elif inside and event == 'end' and elem.tag == 'N':
+                point = [p.text for p in elem]
+                nodes.append([float(coord) for coord in point]) if len(point) == 3 else None
+                elem.clear()
 
         return nodes
 
+    def times(self):
+        return np.array([t for start, end, t in self.index.steps], dtype=float)
+
+    # numbers of STEP blocks chosen with int, slice or list (all by default)
+    def chosen(self, steps=None):
+        return np.atleast_1d(np.arange(len(self.index.steps))[steps if steps is not None else slice(None)])
+
+    # up-to-date NumPy bundle holding given array is sliced instead of parsing the XML
+    def bundle(self, name):
+        try:
+            results = ResultsNpy(npy_bundle(self.path))
+            if results.fresh(self.path) and name in results.meta['arrays']:
+                return results
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            pass
+
+    # MNV of chosen steps (int, slice or list, all by default) and beams (list of tags, all by default) as one array
+    # (step, beam, gauss point, 7), unlike in mnvs() steps are numbered as STEP blocks of the file (see times())
+    def mnv_array(self, steps=None, beams=None):
+        chosen = self.chosen(steps)
+        beams = np.asarray(beams, dtype=int) - 1 if beams is not None else slice(None)
+
+        results = self.bundle('mnv')
+        if results:
+            return np.array(results.mnv[chosen][:, beams])
+
+        with open(self.path, 'rb') as xmlfile, mmap.mmap(xmlfile.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            mnv = [self.mnv_block(mm, *self.index.steps[n][:2])[beams] for n in chosen]
+
+        return np.stack(mnv) if mnv else np.empty((0, 0, self.ngb, 7))
+
+    # displacements of chosen nodes along given DOF (counted from 1) as array (step, node)
+    def history(self, node_ids, dof, steps=None):
+        chosen = self.chosen(steps)
+        nodes = np.asarray(node_ids, dtype=int)
+
+        results = self.bundle('displacements')
+        if results:
+            return np.array(results.displacements[chosen][:, nodes - 1, dof - 1])
+
+        with open(self.path, 'rb') as xmlfile, mmap.mmap(xmlfile.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            history = [self.entities(mm, *self.index.steps[n][:2], b'DISPLACEMENTS', b'</N>', nodes, DISPLACEMENT,
+                                     width=dof)[:, dof - 1] for n in chosen]
+
+        return np.array(history).reshape(len(chosen), len(nodes))
+
+    # internal force (number counted from 1 or name from MNV_QUANTITIES) at Gauss points of chosen beams as array
+    # (step, beam, gauss point)
+    def history_beam(self, elem_ids, quantity, steps=None):
+        chosen = self.chosen(steps)
+        beams = np.asarray(elem_ids, dtype=int)
+        q = MNV_QUANTITIES.index(quantity) if isinstance(quantity, str) else quantity - 1
+
+        results = self.bundle('mnv')
+        if results:
+            return np.array(results.mnv[chosen][:, beams - 1][..., q])
+
+        with open(self.path, 'rb') as xmlfile, mmap.mmap(xmlfile.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            history = [self.entities(mm, *self.index.steps[n][:2], b'MNV', b'</BM>', beams, MNV_VALUE,
+                                     width=self.ngb * 7)[:, :self.ngb * 7].reshape(len(beams), self.ngb, 7)[..., q]
+                       for n in chosen]
+
+        return np.array(history).reshape(len(chosen), len(beams), self.ngb)
+
+    # values of chosen entities (counted from 1) in the block of given tag, only the values requested are converted
+    @staticmethod
+    def entities(mm, start, end, tag, closing, ids, value, width=0):
+        first = mm.find(b'<' + tag + b'>', start, end)
+        last = mm.find(b'</' + tag + b'>', first, end)
+        if first < 0 or last < 0:
+            raise IndexError(f'There is no {tag.decode()} block in the requested step')
+
+        parts = mm[first:last].split(closing)
+        return padded([np.array(value.findall(parts[i - 1]), dtype=float) for i in ids], width=width)
+
+    # all values of the MNV block are converted at once when the block is regular (ngb x 7 values for each beam)
+    def mnv_block(self, mm, start, end):
+        first = mm.find(b'<MNV>', start, end)
+        last = mm.find(b'</MNV>', first, end)
+        if first < 0 or last < 0:
+            raise IndexError(f'There is no MNV block in the requested step of {basename(self.path)}')
+
+        block = mm[first:last + len(b'</MNV>')]
+        values = np.array(MNV_VALUE.findall(block), dtype=float)
+        beams = block.count(b'<BM>')
+        if values.size == beams * self.ngb * 7:
+            return values.reshape(beams, self.ngb, 7)
+
+        return step_arrays([ElementTree.fromstring(block)], self.ngb)[0]['mnv']
+
+    # whole parsed STEP element (one step is kept in memory at once)
+    def step(self, n):
+        start, end, t = self.index.steps[n]
+        for event, elem in self.iterparse(start, end):
+            if elem.tag == 'STEP':
+                return elem
+
     def beams(self):
         print('ReadXML.beams() module not ready yet')
         pass
@@ -237,63 +981,935 @@ class ReadXML:
 
 # load all results file to Python DB
 class LoadFullXML(ReadXML):
-    def __init__(self, pathtoresults):
+    '''All results as arrays in the db dictionary, blocks of STEPs are parsed by a pool of processes'''
+    def __init__(self, pathtoresults, processes=None, blocks_per_process=4):
         super().__init__(pathtoresults)
-        # read all data
-    pass
+        self.meta, self.db = header_arrays(self)
+        self.db['times'] = self.times()
+        self.processes = processes if processes else os.cpu_count()
+
+        # the same arrays as in xml2npy: displacements, reactions, mnv, temperatures with the step dimension first
+        steps = [s[:2] for s in self.index.steps]
+        size = max(1, -(-len(steps) // (self.processes * blocks_per_process)))
+        blocks = [steps[i:i + size] for i in range(0, len(steps), size)]
+        ngb = int(self.meta.get('ngbm', 0))
+        if self.processes > 1 and len(blocks) > 1:
+            with ProcessPoolExecutor(max_workers=self.processes) as pool:
+                parsed = list(pool.map(parse_steps, repeat(self.path), blocks, repeat(ngb)))
+        else:
+            parsed = [parse_steps(self.path, b, ngb) for b in blocks]
+
+        self.db['reaction_nodes'] = next((np.array(p[1], dtype=int) for p in parsed if p[1]), np.empty(0, dtype=int))
+        step_values = [values for p in parsed for values in p[0]]
+        for i, values in enumerate(step_values):
+            for name, array in values.items():
+                if name not in self.db:
+                    self.db[name] = np.full((len(step_values), *array.shape), np.nan)
+                fitted(self.db[name][i], array)
+
+        print(f'[OK] {basename(pathtoresults)} loaded ({len(step_values)} steps, {len(self.db)} arrays)')
+
+
+# arrays of given STEP blocks, run in the worker processes of LoadFullXML
+def parse_steps(path_to_xml, blocks, ngb):
+    steps = []
+    reaction_nodes = []
+    with open(path_to_xml, 'rb') as xmlfile:
+        for start, end in blocks:
+            xmlfile.seek(start)
+            values, nodes = step_arrays(ElementTree.fromstring(xmlfile.read(end - start)), ngb)
+            steps.append(values)
+            reaction_nodes = reaction_nodes if reaction_nodes else nodes
+
+    return steps, reaction_nodes
+
+
+#### COLUMNAR RESULTS ####
+# XML results converted once to NumPy arrays, one .npy file per array in <chid>_npy directory next to the XML
+# arrays with step dimension: times (step), displacements (step, node, dof), reactions (step, reaction, dof),
+# mnv (step, beam, gauss point, 7), temperatures (step, node)
+# arrays without step dimension: nodes (node, ndim), reaction_nodes (reaction), beams/shells/solids (element,
+# nodes + material)
+
+ELEMENT_GROUPS = {'BEAMS': 'beams', 'SHELLS': 'shells', 'SOLIDS': 'solids'}
+
+
+def npy_bundle(path_to_xml):
+    return f'{os.path.splitext(path_to_xml)[0]}_npy'
+
+
+# list of rows with different lengths to 2D array
+def padded(rows, fill=np.nan, dtype=float, width=0):
+    table = np.full((len(rows), max([width] + [len(r) for r in rows])), fill, dtype=dtype)
+    for i, row in enumerate(rows):
+        table[i, :len(row)] = row
+    return table
+
+
+def step_arrays(step, ngb):
+    arrays = {}
+    reaction_nodes = []
+    for block in step:
+        if block.tag == 'DISPLACEMENTS':
+            arrays['displacements'] = padded([[float(d.text) for d in n] for n in block])
+        elif block.tag == 'TEMPERATURES':
+            arrays['temperatures'] = np.array([float(t.text) for t in block])
+        elif block.tag == 'REACTIONS':
+            reactions = []
+            for value in block:
+                if value.tag == 'N':
+                    reaction_nodes.append(int(value.text))
+                    reactions.append([])
+                elif value.tag == 'R':
+                    reactions[-1].append(float(value.text))
+            arrays['reactions'] = padded(reactions)
+        elif block.tag == 'MNV':
+            mnv = np.full((len(block), ngb, 7), np.nan)
+            for b, bm in enumerate(block):
+                for g, gs in enumerate(bm[:ngb]):
+                    values = [float(v.text) for v in gs][:7]
+                    mnv[b, g, :len(values)] = values
+            arrays['mnv'] = mnv
+
+    return arrays, reaction_nodes
+
+
+# scalars, node coordinates, element tables, materials and relaxations from the header of XML results
+def header_arrays(xml):
+    meta = {'materials': []}
+    nodes = []
+    elements = {}
+    relaxations = []
+    depth = 0
+    group = None
+    for event, elem in xml.iterparse(0, xml.head, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            group = elem.tag if depth == 2 else group
+            continue
+
+        depth -= 1
+        if depth == 1 and elem.tag in ['TYPE', 'NDIM', 'NNODE', 'NGBM']:
+            meta[elem.tag.lower()] = elem.text.strip()
+        elif depth == 2 and group == 'NODES' and elem.tag == 'N':
+            nodes.append([float(p.text) for p in elem])
+        elif depth == 2 and group in ELEMENT_GROUPS:
+            rows = elements.setdefault(ELEMENT_GROUPS[group], ([], []))
+            rows[0].append([int(n.text) for n in elem if n.tag == 'N'])
+            rows[1].append(sum([int(m.text) for m in elem if m.tag == 'M']))
+        elif depth == 2 and group == 'MATERIALS':
+            meta['materials'].append(elem.text.strip())
+        elif depth == 3 and group == 'RELAX' and elem.tag == 'RLX':
+            relaxations.append([float(v) for v in elem.text.split()])
+        elem.clear() if depth <= 2 or elem.tag == 'RLX' else None
+
+    arrays = {'nodes': padded(nodes)}
+    # node tags padded with 0, material number in the last column
+    for name, (rows, materials) in elements.items():
+        arrays[name] = np.column_stack([padded(rows, fill=0, dtype=int), np.array(materials, dtype=int)])
+    # element number and 14 relaxation values for each beam with relaxations
+    arrays.update({'relaxations': padded(relaxations)} if relaxations else {})
+
+    return meta, arrays
+
+
+# copy array to the part of target it fits in (the first step defines the shape of step arrays)
+def fitted(target, array):
+    fit = tuple(slice(0, min(a, b)) for a, b in zip(array.shape, target.shape))
+    target[fit] = array[fit]
+
+
+def xml2npy(path_to_xml, bundle=None):
+    '''Convert SAFIR XML results to NumPy arrays to be memory-mapped with ResultsNpy'''
+    bundle = bundle if bundle else npy_bundle(path_to_xml)
+    os.makedirs(bundle, exist_ok=True)
+    stat = os.stat(path_to_xml)
+    xml = ReadXML(path_to_xml)
+    meta = {'xml': basename(path_to_xml), 'size': stat.st_size, 'mtime': stat.st_mtime, 'arrays': []}
+
+    def save(name, array):
+        np.save(os.path.join(bundle, f'{name}.npy'), array)
+        meta['arrays'].append(name)
+
+    header, arrays = header_arrays(xml)
+    meta.update(header)
+    [save(name, array) for name, array in arrays.items()]
+    save('times', xml.times())
+
+    # steps are written straight to memory-mapped files
+    ngb = int(meta.get('ngbm', 0))
+    nsteps = len(xml.index.steps)
+    arrays = {}
+    for i in range(nsteps):
+        values, reaction_nodes = step_arrays(xml.step(i), ngb)
+        save('reaction_nodes', np.array(reaction_nodes, dtype=int)) if i == 0 and reaction_nodes else None
+        for name, array in values.items():
+            if name not in arrays:
+                arrays[name] = open_memmap(os.path.join(bundle, f'{name}.npy'), mode='w+', dtype=float,
+                                           shape=(nsteps, *array.shape))
+                arrays[name][:] = np.nan
+                meta['arrays'].append(name)
+            fitted(arrays[name][i], array)
+
+    for array in arrays.values():
+        array.flush()
+    del arrays
+
+    # metadata is written as the last one, bundle without it is converted again
+    with open(os.path.join(bundle, 'meta.json'), 'w') as file:
+        json.dump(meta, file)
+    print(f'[OK] {basename(path_to_xml)} converted to {len(meta["arrays"])} arrays ({basename(bundle)})')
+
+    return bundle
+
+
+class ResultsNpy:
+    '''Arrays converted with xml2npy, each one is memory-mapped when accessed for the first time'''
+    def __init__(self, bundle):
+        self.bundle = bundle
+        with open(os.path.join(bundle, 'meta.json')) as file:
+            self.meta = json.load(file)
+
+    def __getattr__(self, name):
+        if name in ['bundle', 'meta'] or name not in self.meta['arrays']:
+            raise AttributeError(f'There is no {name} array in {basename(self.bundle)}')
+        array = np.load(os.path.join(self.bundle, f'{name}.npy'), mmap_mode='r')
+        setattr(self, name, array)
+
+        return array
+
+    # bundle is stale when the XML file has been changed since the conversion
+    def fresh(self, path_to_xml):
+        stat = os.stat(path_to_xml)
+        return self.meta['size'] == stat.st_size and self.meta['mtime'] == stat.st_mtime
+
+
+# arrays of XML results, converted only when there is no up-to-date bundle
+def load_results(path_to_xml, bundle=None):
+    bundle = bundle if bundle else npy_bundle(path_to_xml)
+    try:
+        results = ResultsNpy(bundle)
+        if results.fresh(path_to_xml):
+            return results
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        pass
+
+    return ResultsNpy(xml2npy(path_to_xml, bundle))
 
 
-def read_in(path):
+def file_hash(path, hasher=None, block=2**20):
+    hasher = hasher if hasher else hashlib.sha256()
+    with open(path, 'rb') as file:
+        while True:
+            chunk = file.read(block)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher
+
+
+INFILE_CACHE = os.path.join(expanduser('~'), '.cache', 'fireeng-tools', 'infile')
+
+
+def read_in(path, lazy=False, cache=None):
+    '''InFile of given path, restored from the parse cache directory (e.g. INFILE_CACHE) if the file has not changed
+    since the last time (cache=None switches the cache off). Files read lazily are not stored as that would require
+    full parsing'''
+    if cache:
+        try:
+            return ParseCache(cache).load(path)
+        except FileNotFoundError:
+            pass    # not parsed yet
+        except Exception as e:
+            print(f'[WARNING] Parse cache entry of {basename(path)} is corrupt ({type(e).__name__}: {e}), '
+                  f'it is removed')
+            ParseCache(cache).remove(path)
+
     with open(path) as file:
         f = file.readlines()
 
     # in the future add recognizing of analysis type
     # type = s3d/t2d/tsh2d/t3d/s2d
 
-    return InFile(basename(path)[:-3], f, type=None)
+    infile = InFile(basename(path)[:-3], f, type=None, lazy=lazy)
+    if cache and not lazy:
+        try:
+            ParseCache(cache).store(path, infile)
+        except OSError as e:
+            print(f'[WARNING] {basename(path)} could not be stored in the parse cache: {e}')
+
+    return infile
+
+
+class ParseCache:
+    '''Parsed InFiles stored as arrays (entity tables) and JSON (the rest) in a directory named with the hash of the
+    file content. Paths point to the hashes, these are trusted as long as the size and mtime of the file do not change.
+    Entries of previous versions of files are kept (other paths may point to them) until evicted by size'''
+    TABLES = ['nodes', 'trusses', 'beams', 'shells', 'solids']
+    ATTRIBUTES = ['type', 'sections', 'indexed_lines', 'beamtypes', 'shelltypes', 'trusstypes', 'materials',
+                  'beamparameters', 't_end']
+
+    def __init__(self, cache_dir=INFILE_CACHE, max_size=2 * 2**30):
+        self.dir = cache_dir
+        self.max_size = max_size    # [B] least recently used entries are removed above this size
+
+    def pointer(self, path):
+        return os.path.join(self.dir, 'paths', f'{hashlib.sha1(abspath(path).encode()).hexdigest()}.json')
+
+    # content hash of the file, calculated again only when its size or mtime has changed
+    def content(self, path):
+        stat = os.stat(path)
+        try:
+            with open(self.pointer(path)) as file:
+                known = json.load(file)
+            if [known['size'], known['mtime']] == [stat.st_size, stat.st_mtime_ns]:
+                return known['hash']
+        except (OSError, ValueError, KeyError):
+            pass
+
+        content = file_hash(path).hexdigest()
+        os.makedirs(os.path.dirname(self.pointer(path)), exist_ok=True)
+        with open(self.pointer(path), 'w') as file:
+            json.dump({'path': abspath(path), 'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': content}, file)
+
+        return content
+
+    def load(self, path):
+        entry = os.path.join(self.dir, self.content(path))
+        with open(os.path.join(entry, 'infile.json')) as file:
+            attributes = json.load(file)
+
+        infile = InFile.__new__(InFile)
+        # file_lines read when needed, callers may have changed the working directory by then
+        infile.chid, infile.path, infile.lazy = basename(path)[:-3], abspath(path), False
+        infile.__dict__.update(attributes)
+        for name in self.TABLES:
+            arrays = np.load(os.path.join(entry, f'{name}.npz'))
+            setattr(infile, name, EntityTable(arrays['tags'], arrays['values'], dtype=arrays['values'].dtype,
+                                              widths=arrays['widths'] if 'widths' in arrays else None))
+        os.utime(os.path.join(entry, 'infile.json'))    # mark as recently used
+
+        return infile
+
+    def store(self, path, infile):
+        content = self.content(path)
+        entry = os.path.join(self.dir, content)
+        if os.path.exists(os.path.join(entry, 'infile.json')):
+            return entry
+
+        # written aside and renamed, so that no other process finds an incomplete entry
+        temporary = f'{entry}.{os.getpid()}'
+        try:
+            os.makedirs(temporary, exist_ok=True)
+            for name in self.TABLES:
+                table = getattr(infile, name)
+                widths = {} if table.widths is None else {'widths': table.widths}
+                np.savez(os.path.join(temporary, f'{name}.npz'), tags=table.tags, values=table.values, **widths)
+            with open(os.path.join(temporary, 'infile.json'), 'w') as file:
+                json.dump({a: getattr(infile, a) for a in self.ATTRIBUTES}, file)
+        except OSError:
+            shutil.rmtree(temporary, ignore_errors=True)    # e.g. the disk is full
+            raise
+        try:
+            os.replace(temporary, entry)
+        except OSError:
+            shutil.rmtree(temporary, ignore_errors=True)     # stored by another process meanwhile
+
+        self.evict()
+        return entry
+
+    # entry of the file removed (e.g. when it is corrupt), the file is parsed and stored again next time
+    def remove(self, path):
+        try:
+            shutil.rmtree(os.path.join(self.dir, self.content(path)), ignore_errors=True)
+        except OSError:
+            pass
+
+    # remove the least recently used entries until the cache is smaller than max_size
+    def evict(self, max_size=None):
+        max_size = self.max_size if max_size is None else max_size
+        entries = []
+        for e in os.scandir(self.dir):
+            if '.' in e.name:
+                continue    # being written by another process
+            try:
+                used = os.stat(os.path.join(e.path, 'infile.json')).st_mtime
+                entries.append([used, sum(f.stat().st_size for f in os.scandir(e.path)), e.path])
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+
+        total = sum(e[1] for e in entries)
+        removed = 0
+        for used, size, path in sorted(entries):
+            if total <= max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            removed += 1
+
+        return removed
+
+
+# entity tables of InFile: aliases, keyword starting the block, keyword of entity lines, keywords ending the block
+ENTITIES = {'nodes': (['node', 'nodes', 'n', 0], 'NODES', 'NODE', ['FIXATIONS']),
+            'trusses': (['truss', 'trusses', 't', 0.5], 'NODOFTRUSS', 'ELEM',
+                        ['NODOFBEAM', 'NODOFSHELL', 'NODOFSOLID', 'PRECISION', 'RELAX_ELEM']),
+            'beams': (['beam', 'beams', 'b', 1], 'NODOFBEAM', 'ELEM',
+                      ['NODOFTRUSS', 'NODOFSHELL', 'NODOFSOLID', 'PRECISION', 'RELAX_ELEM']),
+            'shells': (['shell', 'shells', 'sh', 2], 'NODOFSHELL', 'ELEM',
+                       ['NODOFTRUSS', 'NODOFBEAM', 'NODOFSOLID', 'PRECISION', 'RELAX_ELEM']),
+            'solids': (['solid', 'solids', 'sd', 3], 'NODOFSOLID', 'ELEM',
+                       ['NODOFTRUSS', 'NODOFBEAM', 'NODOFSHELL', 'PRECISION', 'RELAX_ELEM'])}
+ELEMENT_TABLES = ['trusses', 'beams', 'shells', 'solids']
+# lines referring to nodes other than elements: keyword and positions of node tags in the line
+NODE_REFERENCES = {'BLOCK': [1], 'SAME': [1, 2], 'NODELOAD': [1], 'M_NODE': [1]}
+# keywords of the section index (line numbers of blocks), 'BEAM' is the first line mentioning BEAM
+SECTIONS = ['NODES', 'FIXATIONS', 'NODOFTRUSS', 'NODOFBEAM', 'NODOFSHELL', 'NODOFSOLID', 'PRECISION', 'RELAX_ELEM',
+            'END_TRANS', 'MATERIALS', 'TIME', 'ENDTIME']
+TYPE_BLOCKS = {'NODOFBEAM': 'beamtypes', 'NODOFSHELL': 'shelltypes', 'NODOFTRUSS': 'trusstypes'}
+# attributes of InFile parsed on the first access in lazy mode
+LAZY = [*ENTITIES, *TYPE_BLOCKS.values(), 'materials']
+
+
+class EntityTable:
+    '''Nodes or elements of InFile kept in NumPy arrays: tags, values (float coordinates of nodes or int tags of
+    lower entities of elements) and tag -> row index. Indexing and iterating give rows as lists [tag, value1, ...],
+    the same as the lists of lists used before: items assigned to these rows are written to the table (EntityRow),
+    rows of slices and tolist() are plain copies'''
+    def __init__(self, tags=(), values=(), widths=None, dtype=float):
+        self.tags = np.asarray(tags, dtype=np.int32)
+        self.values = np.asarray(values, dtype=dtype).reshape(len(self.tags), -1) if len(self.tags) else \
+            np.zeros((0, 0), dtype=dtype)
+        self.widths = widths    # number of values in each row if rows differ in length (shorter ones padded with 0)
+        self.order = None   # argsort of tags when they are not 1, 2, ..., n
+        self.stale = False  # tags changed since the index was made, it is made again when needed
+
+        self.indexed()
+
+    # flat buffers of tags, values and number of values in each row, to be filled while parsing
+    @staticmethod
+    def buffers(floats):
+        return array('i'), array('d' if floats else 'i'), array('i')
+
+    @classmethod
+    def from_buffers(cls, tags, values, widths):
+        dtype = np.float64 if values.typecode == 'd' else np.intc
+        if not len(tags):
+            return cls(dtype=dtype)
+        tags, widths = np.frombuffer(tags, dtype=np.intc), np.frombuffer(widths, dtype=np.intc)
+        values = np.frombuffer(values, dtype=dtype) if len(values) else np.zeros(0, dtype=dtype)
+        width = int(widths.max())
+
+        if (widths == width).all():
+            return cls(tags, values.reshape(-1, width), dtype=dtype)
+        table = np.zeros((len(widths), width), dtype=dtype)
+        table[np.arange(width) < widths[:, None]] = values
+        return cls(tags, table, widths=widths, dtype=dtype)
+
+    @classmethod
+    def from_rows(cls, rows, dtype=float):
+        widths = [len(r) - 1 for r in rows]
+        width = max(widths, default=0)
+        table = cls([r[0] for r in rows], [[*r[1:], *[0] * (width - len(r) + 1)] for r in rows], dtype=dtype)
+        table.widths = np.array(widths, dtype=np.int32) if len(set(widths)) > 1 else None
+        return table
+
+    # tag -> row index is needed only when tags are not 1, 2, ..., n
+    def indexed(self):
+        contiguous = (self.tags == np.arange(1, len(self.tags) + 1)).all()
+        self.order = None if contiguous else np.argsort(self.tags, kind='stable')
+        self.stale = False
+
+    def row(self, tag):
+        return int(self.rows([tag])[0])
+
+    def rows(self, tags):
+        tags = np.asarray(tags, dtype=np.int64)
+        if self.stale:
+            self.indexed()
+        if self.order is None:
+            rows = tags - 1
+            found = (rows >= 0) & (rows < len(self.tags))
+        else:
+            rows = self.order[np.minimum(np.searchsorted(self.tags, tags, sorter=self.order), len(self.tags) - 1)]
+            found = self.tags[rows] == tags
+        if not found.all():
+            raise KeyError(f'No entity tagged {tags[~found][0]}')
+
+        return rows
+
+    # row of entity by its tag, not by its position as nodes[tag - 1] does
+    def entity(self, tag):
+        return self[self.row(tag)]
+
+    def listed(self, tags, values, widths):
+        if widths is None:
+            return [[t, *v] for t, v in zip(tags.tolist(), values.tolist())]
+        return [[t, *v[:w]] for t, v, w in zip(tags.tolist(), values.tolist(), widths.tolist())]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.listed(self.tags[key], self.values[key], None if self.widths is None else self.widths[key])
+        try:
+            key = range(len(self))[key]     # negative indices as for lists
+        except IndexError:
+            raise IndexError('EntityTable index out of range')
+        return EntityRow(self, key, self[key:key + 1][0])
+
+    # the index is made again only if the tag has changed, on the next search by tag
+    def __setitem__(self, key, row):
+        if self.tags[key] != row[0]:
+            self.tags[key] = row[0]
+            self.stale = True
+        self.values[key, :len(row) - 1] = row[1:]
+
+    def append(self, row):
+        extended = EntityTable.from_rows(self.tolist() + [list(row)], dtype=self.values.dtype)
+        self.tags, self.values, self.widths, self.order = extended.tags, extended.values, extended.widths, \
+            extended.order
+
+    def __len__(self):
+        return len(self.tags)
+
+    def __iter__(self):
+        for start in range(0, len(self), 2**16):
+            for i, row in enumerate(self[start:start + 2**16], start=start):
+                yield EntityRow(self, i, row)
+
+    def __eq__(self, other):
+        return self.tolist() == list(other)
+
+    def __repr__(self):
+        return f'EntityTable({len(self)} rows)'
+
+    def tolist(self):
+        return self[:]
+
+
+class EntityRow(list):
+    '''Row of EntityTable [tag, value1, ...], items assigned to it are written to the row of the table too'''
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table, index, row):
+        super().__init__(row)
+        self.table, self.index = table, index
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.table[self.index] = self
+
+
+class EntityReader:
+    '''Tables of the first block of each of given entities filled line by line in flat buffers (tags, values and
+    number of values in each row) - the state machine of read_entities and InFile.parse'''
+    def __init__(self, names=tuple(ENTITIES)):
+        self.names = names
+        self.starts = {ENTITIES[n][1]: n for n in names}
+        self.buffers, self.blocks = {}, {}  # {name: buffers}, {name: line number of the keyword starting the block}
+        self.reading, self.entity, self.stops = None, None, ()     # table being filled, keyword of its lines
+        self.tags, self.values, self.widths, self.number = None, None, None, None
+
+    # tokens of the line starting with the entity keyword
+    def add(self, tokens):
+        self.tags.append(int(tokens[1]))
+        read = len(self.values)
+        try:
+            self.values.extend(map(self.number, tokens[2:]))
+        except ValueError:
+            # real values in element lines (e.g. solids of thermal analyses) - the whole table becomes float
+            del self.values[read:]
+            self.values, self.number = array('d', self.values), float
+            self.buffers[self.reading] = self.tags, self.values, self.widths
+            self.values.extend(map(float, tokens[2:]))
+        self.widths.append(len(tokens) - 2)
+
+    # keyword of the i-th line other than entity lines, True when all blocks have been read
+    def keyword(self, i, key):
+        if self.reading and key in self.stops:
+            self.reading, self.entity, self.stops = None, None, ()
+            if len(self.blocks) == len(self.names):
+                return True
+        if key in self.starts and self.starts[key] not in self.blocks:
+            self.reading = self.starts[key]
+            self.blocks[self.reading] = i
+            self.tags, self.values, self.widths = self.buffers[self.reading] = \
+                EntityTable.buffers(self.reading == 'nodes')
+            self.number = float if self.reading == 'nodes' else int
+            self.entity, self.stops = ENTITIES[self.reading][2:]
+        return False
+
+    def tables(self):
+        return {n: EntityTable.from_buffers(*self.buffers[n]) if n in self.buffers else
+                EntityTable(dtype=np.float64 if n == 'nodes' else np.intc) for n in self.names}
+
+
+# tables of the first block of each of given entities read in one pass from the line number first on, also the line
+# numbers of the keywords starting these blocks
+def read_entities(lines, names=tuple(ENTITIES), first=0):
+    reader = EntityReader(names)
+    for i, line in enumerate(islice(lines, first, None), start=first):
+        tokens = line.split()
+        if not tokens:
+            continue
+        if tokens[0] == reader.entity:
+            reader.add(tokens)
+        elif reader.keyword(i, tokens[0]):
+            break
+
+    return reader.tables(), reader.blocks
+
+
+# beam, shell or truss types from blocks starting in given lines (from NODOF line to the first ELEM)
+def read_types(lines, name, starts):
+    types, t = [], []
+    for start in starts:
+        for line in islice(lines, start + 1, None):
+            tokens = line.split()
+            if not tokens:
+                continue
+            elif tokens[0] == 'ELEM' or tokens[0] in TYPE_BLOCKS:
+                break
+            t = typed(name, types, tokens, line, t)
+
+    return types
+
+
+# line of beam/shell/truss types block, t is the beam or shell type being read
+def typed(name, types, tokens, line, t):
+    if name == 'trusstypes':
+        types.append([tokens[0], *[float(c) for c in tokens[1:-1]], int(tokens[-1])])
+    elif ('tem' if name == 'beamtypes' else 'tsh') in line.lower():
+        t = [tokens[0], []]
+    elif tokens[0] == 'TRANSLATE':
+        t[1].append(tokens[-1])
+    elif tokens[0] == 'END_TRANS':
+        types.append(t)
+
+    return t
+
+
+# NODE or ELEM lines of the table
+def entity_lines(name, table):
+    key = ENTITIES[name][2]
+    if table.widths is None and (name == 'nodes' or table.values.dtype != np.float64):
+        line = key + '\t{}' * (table.values.shape[1] + 1) + '\n'
+        return [line.format(t, *v) for t, v in zip(table.tags.tolist(), table.values.tolist())]
+    elif name == 'nodes':
+        return [key + '\t' + '\t'.join(map(str, row)) + '\n' for row in table]
+    # integers of real element tables are written without decimal part (lower entities tags)
+    return [key + '\t' + '\t'.join(str(int(v)) if v == int(v) else str(v) for v in row) + '\n' for row in table]
+
+
+# entity lines of the first block of given entities found from the line number first on replaced (or appended to
+# existing ones) in one pass, other lines of the block are kept - the ones before the first entity line stay there
+def replace_entities(lines, name, new, append=False, first=0):
+    start, entity, stops = ENTITIES[name][1:]
+    begin = next((i + 1 for i, line in enumerate(islice(lines, first, None), start=first)
+                  if line.split(None, 1)[:1] == [start]), None)
+    if begin is None:
+        raise ValueError(f'There is no {start} block in the lines')
+
+    end, old = len(lines), []   # old entity lines
+    for i, line in enumerate(islice(lines, begin, None), start=begin):
+        tokens = line.split(None, 1)
+        if tokens and tokens[0] == entity:
+            old.append(i)
+        elif tokens and tokens[0] in stops:
+            end = i
+            break
+
+    if append:
+        lines[old[-1] + 1 if old else end:old[-1] + 1 if old else end] = new
+    elif len(new) == len(old):
+        for i, line in zip(old, new):
+            lines[i] = line
+    else:
+        before = (old[0] if old else end) - begin
+        old = set(old)
+        others = [line for i, line in enumerate(lines[begin:end], start=begin) if i not in old]
+        lines[begin:end] = others[:before] + new + others[before:]
+
+    return lines
+
+
+# tags of the nodes of each element and where they are given (not 0 as the fourth node of triangles) - the rest of the
+# row is the type or material (and a real value in solids of thermal analyses: 4 or 8 nodes, material, 0.)
+def element_node_tags(table, name):
+    width = table.values.shape[1]
+    tags = table.values[:, :(4 if width <= 6 else 8) if name == 'solids' else width - 1].astype(np.int64)
+    given = tags != 0
+    if table.widths is not None:
+        given &= np.arange(tags.shape[1]) < table.widths[:, None] - 1
+    return tags, given
+
+
+# nodes sharing an element are neighbours: rows of the node table as a compressed adjacency (indptr, indices)
+def node_graph(infile):
+    n = len(infile.nodes)
+    pairs = [np.zeros((0, 2), dtype=np.int64)]
+    for name in ELEMENT_TABLES:
+        table = getattr(infile, name)
+        if not len(table):
+            continue
+        tags, given = element_node_tags(table, name)
+        rows = np.full(tags.shape, -1, dtype=np.int64)
+        rows[given] = infile.nodes.rows(tags[given])
+        for a, b in combinations(range(tags.shape[1]), 2):
+            both = given[:, a] & given[:, b] & (rows[:, a] != rows[:, b])
+            pairs.append(np.column_stack((rows[both, a], rows[both, b])))
+
+    pairs = np.concatenate(pairs)
+    codes = np.sort(np.concatenate((pairs[:, 0] * n + pairs[:, 1], pairs[:, 1] * n + pairs[:, 0])))
+    codes = codes[np.append(True, codes[1:] != codes[:-1])] if len(codes) else codes
+    return np.searchsorted(codes // n, np.arange(n + 1)), codes % n
+
+
+# neighbours of the nodes (rows) in order of the nodes, each one as many times as it neighbours them
+def neighbours(graph, rows):
+    indptr, indices = graph
+    counts = indptr[rows + 1] - indptr[rows]
+    positions = np.arange(counts.sum()) + np.repeat(indptr[rows] - np.cumsum(counts) + counts, counts)
+    return np.repeat(np.arange(len(rows)), counts), indices[positions]
+
+
+# levels of breadth-first search from the start node in Cuthill-McKee order: children of the earlier nodes first and
+# children of a node by increasing degree, the nodes of the levels are marked as visited
+def cuthill_mckee(graph, degree, start, visited):
+    level = np.array([start])
+    levels = [level]
+    visited[start] = True
+    while True:
+        parents, children = neighbours(graph, level)
+        fresh = ~visited[children]
+        parents, children = parents[fresh], children[fresh]
+        if not len(children):
+            return levels
+        children = children[np.lexsort((children, degree[children], parents))]
+        level = children[np.sort(np.unique(children, return_index=True)[1])]   # the first parent takes the child
+        visited[level] = True
+        levels.append(level)
+
+
+# start node of the component far from the others (George-Liu): the one of the lowest degree in the last level, as
+# long as the number of levels grows
+def peripheral(graph, degree, start, visited):
+    levels = cuthill_mckee(graph, degree, start, visited)
+    while True:
+        visited[np.concatenate(levels)] = False
+        last = levels[-1]
+        candidate = last[np.argmin(degree[last])]
+        further = cuthill_mckee(graph, degree, candidate, visited)
+        visited[np.concatenate(further)] = False
+        if len(further) <= len(levels):
+            return start
+        start, levels = candidate, further
+
+
+def rcm_order(graph):
+    '''Rows of the nodes in reverse Cuthill-McKee order, one component of the graph after another starting from the
+    ones with nodes of the lowest degree. Nodes of no element are left at the end'''
+    degree = np.diff(graph[0])
+    isolated = degree == 0
+    visited = isolated.copy()
+    order = [np.zeros(0, dtype=np.int64)]
+    for start in np.argsort(degree, kind='stable')[np.count_nonzero(isolated):].tolist():
+        if not visited[start]:
+            order += cuthill_mckee(graph, degree, peripheral(graph, degree, start, visited), visited)
+
+    return np.concatenate((np.concatenate(order)[::-1], np.flatnonzero(isolated)))
+
+
+def bandwidth(infile, graph=None, order=None):
+    '''Half-bandwidth and profile (sum of distances from the diagonal to the first neighbour in each row) of the
+    node adjacency in the current numbering or the one of given order of rows - the solver stores and factorises the
+    stiffness matrix within them'''
+    indptr, indices = node_graph(infile) if graph is None else graph
+    position = np.empty(len(infile.nodes), dtype=np.int64)
+    position[np.argsort(infile.nodes.tags, kind='stable') if order is None else order] = np.arange(len(infile.nodes))
+    connected = np.flatnonzero(np.diff(indptr))
+    if not len(connected):
+        return 0, 0
+    first = np.minimum.reduceat(position[indices], indptr[connected])
+    heights = np.maximum(position[connected] - first, 0)
+
+    return int(heights.max()), int(heights.sum())
+
+
+class Patch:
+    '''Edits of file lines recorded against their line numbers and applied in one streaming pass when written, so
+    that many edits of a big IN file do not shift or copy its lines again and again. Line numbers are always the ones
+    of the unedited lines, no matter what has been inserted or deleted before'''
+    def __init__(self, lines):
+        self.lines = lines
+        self.replaced = {}  # {line number: text replacing the line}, '' deletes the line
+        self.inserted = {}  # {line number: [texts inserted before the line]}, len(lines) for the end of the file
+
+    def replace(self, i, text):
+        self.replaced[i] = text
+
+    def delete(self, i):
+        self.replaced[i] = ''
+
+    def insert(self, i, text):
+        self.inserted.setdefault(i, []).append(text)
+
+    # line as it will be written
+    def __getitem__(self, i):
+        return self.replaced.get(i, self.lines[i])
+
+    def __iter__(self):
+        done = 0
+        for i in sorted({*self.replaced, *self.inserted}):
+            yield from self.lines[done:i]
+            yield from self.inserted.get(i, [])
+            if i < len(self.lines) and self[i]:
+                yield self[i]
+            done = i + 1
+        yield from self.lines[done:]
+
+    def write(self, path):
+        with open(path, 'w') as file:
+            file.writelines(self)
+
+    # edits applied to the lines (the same list object), then forgotten
+    def apply(self):
+        self.lines[:] = list(self)
+        self.replaced, self.inserted = {}, {}
+
+        return self.lines
 
 
 class InFile:
-    def __init__(self, chid, file_lines, type=None):
+    def __init__(self, chid, file_lines, type=None, lazy=False):
         self.file_lines = file_lines
+        self.patch = Patch(file_lines)  # edits of file_lines written by save_line()
         self.chid = chid
         self.type = 'type_of_analysis'
-        self.nodes = self.get(0)
-        self.trusses = self.get(0.5)
-        self.beams = self.get(1)
-        self.shells = self.get(2)
-        self.solids = self.get(3)
-        self.beamparameters = self.get_beamparameters()
-
-        # [['profilename.tsh', [material1no, ... materialnno]]]
-        # [['profilename.tem', [material1no, ... materialnno]]]
-        # ['tempcurve.txt', area, initial_stress, materialno]
-        self.beamtypes, self.shelltypes, self.trusstypes = self.get_types()
-
-        self.t_end = self.get_time()
+        self.lazy = lazy    # only the section index is made here, attributes from LAZY are parsed when first used
+        self.sections = {}  # {keyword: [line numbers]}
+        self.indexed_lines = len(file_lines)    # number of lines when the section index was made
 
-        self.materials = self.get_materials()
-
-    # import entities
+        if lazy:
+            self.sections = self.index_sections()
+        else:
+            self.nodes = EntityTable()    # [[tag, x, y, z], ...] views of float coordinates
+            self.trusses = EntityTable(dtype=np.int32)  # [[tag, node1, ..., type], ...] views of int connectivity
+            self.beams = EntityTable(dtype=np.int32)
+            self.shells = EntityTable(dtype=np.int32)
+            self.solids = EntityTable(dtype=np.int32)
+
+            # [['profilename.tsh', [material1no, ... materialnno]]]
+            # [['profilename.tem', [material1no, ... materialnno]]]
+            # ['tempcurve.txt', area, initial_stress, materialno]
+            self.beamtypes, self.shelltypes, self.trusstypes = [], [], []
+
+            # all above filled in one pass over the file lines, garbage collector is paused meanwhile as millions of
+            # tokens would trigger it again and again (~25% of the parsing time)
+            collecting = gc.isenabled()
+            gc.disable()
+            try:
+                self.parse()
+            finally:
+                gc.enable() if collecting else None
+            self.materials = self.get_materials(sections=self.sections)
+        self.beamparameters = self.get_beamparameters(sections=self.sections)
+        self.t_end = self.get_time(sections=self.sections)
+
+    # lazy mode: attribute parsed on the first access is kept as a usual one since then
+    def __getattr__(self, name):
+        if name in LAZY and self.__dict__.get('lazy'):
+            setattr(self, name, self.load(name))
+            return self.__dict__[name]
+        # InFile restored from ParseCache reads its lines only when they are needed
+        elif name in ['file_lines', 'patch'] and 'path' in self.__dict__:
+            with open(self.path) as file:
+                self.file_lines = file.readlines()
+            self.patch = Patch(self.file_lines)
+            return self.__dict__[name]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    # section index made again if lines have been inserted or removed since
+    def current_sections(self):
+        return self.sections if len(self.file_lines) == self.indexed_lines else self.index_sections()
+
+    def load(self, name):
+        sections = self.current_sections()
+
+        if name == 'materials':
+            return self.get_materials(sections=sections)
+        elif name in ENTITIES:
+            return self.parse_entities(name, sections)
+        return self.parse_types(name, sections)
+
+    # the first block of given entities only, the same way as parse() does
+    def parse_entities(self, name, sections):
+        start = ENTITIES[name][1]
+        return read_entities(self.file_lines, [name], sections[start][0] if start in sections else
+                             len(self.file_lines))[0][name]
+
+    # types from all blocks of given kind
+    def parse_types(self, name, sections):
+        return read_types(self.file_lines, name, sections.get({v: k for k, v in TYPE_BLOCKS.items()}[name], []))
+
+    # one pass of tokenised lines: section index, entity tables and beam/shell/truss types
+    def parse(self):
+        reader = EntityReader()     # only the first block of each entity type is read
+        add = reader.add
+        types = None    # types being read (from NODOF line to the first ELEM)
+        t = []
+
+        for i, line in enumerate(self.file_lines):
+            tokens = line.split()
+            if not tokens:
+                continue
+            key = tokens[0]
+
+            # entity lines are the most of the file, so they are checked first
+            if key == reader.entity:
+                add(tokens)     # coordinates or lower entities tags
+                types = None
+                continue
+
+            if key in SECTIONS:
+                self.sections.setdefault(key, []).append(i)
+            if 'BEAM' not in self.sections and 'BEAM' in line:
+                self.sections['BEAM'] = [i]
+
+            reader.keyword(i, key)
+
+            if key in TYPE_BLOCKS:
+                types = TYPE_BLOCKS[key]
+            elif types and key == 'ELEM':
+                types = None
+            elif types:
+                t = typed(types, getattr(self, types), tokens, line, t)
+
+        for name, table in reader.tables().items():
+            setattr(self, name, table)
+
+        return self.sections
+
+    # section index only, when file_lines have been changed since parsing
+    def index_sections(self):
+        sections = {}
+        for i, line in enumerate(self.file_lines):
+            tokens = line.split(None, 1)
+            if tokens and tokens[0] in SECTIONS:
+                sections.setdefault(tokens[0], []).append(i)
+            if 'BEAM' not in sections and 'BEAM' in line:
+                sections['BEAM'] = [i]
+
+        return sections
+
+    # import entities (scanning all lines, the same tables are filled by parse() when the file is read)
     def get(self, entity_type):
         got = []
         keys = []   # [start, element, end (tuple if many options possible)]
 
-        if entity_type in ['node', 'nodes', 'n', 0]:
-            keys = ['NODES', 'NODE', ['FIXATIONS']]
-            entity_type = 0
-        elif entity_type in ['truss', 'trusses', 't', 0.5]:
-            keys = ['NODOFTRUSS', 'ELEM', ['NODOFBEAM', 'NODOFSHELL', 'NODOFSOLID', 'PRECISION', 'RELAX_ELEM']]
-            entity_type = 0.5
-        elif entity_type in ['beam', 'beams', 'b', 1]:
-            keys = ['NODOFBEAM', 'ELEM', ['NODOFTRUSS', 'NODOFSHELL', 'NODOFSOLID', 'PRECISION', 'RELAX_ELEM']]
-            entity_type = 1
-        elif entity_type in ['shell', 'shells', 'sh', 2]:
-            keys = ['NODOFSHELL', 'ELEM', ['NODOFTRUSS', 'NODOFBEAM', 'NODOFSOLID', 'PRECISION', 'RELAX_ELEM']]
-            entity_type = 2
-        elif entity_type in ['solid', 'solids', 'sd', 3]:
-            keys = ['NODOFSOLID', 'ELEM', ['NODOFTRUSS', 'NODOFBEAM', 'NODOFSHELL', 'PRECISION', 'RELAX_ELEM']]
-            entity_type = 3
+        for name, (aliases, *block) in ENTITIES.items():
+            if entity_type in aliases:
+                keys = block
+                entity_type = aliases[-1]
 
         read = False
         for line in self.file_lines:
@@ -311,26 +1927,33 @@ class InFile:
 
         return got
 
-    def get_time(self):
+    def get_time(self, sections=None):
+        if sections is not None:
+            return float(self.file_lines[sections['ENDTIME'][-1] - 1].split()[1]) if 'ENDTIME' in sections else None
+
         for i, l in enumerate(reversed(self.file_lines)):
             if 'ENDTIME' in l:
                 return float(self.file_lines[-i-2].split()[1])
 
-    def get_beamparameters(self, update=False):
+    def get_beamparameters(self, update=False, sections=None):
         """ beamparameters mostly say in which line specific data appears.
                 IMPORTANT! table of data starts from 0 -> lines in notepad will be greater by 1
         """
         beamparameters = {}
-
-        beamparameters['BEAM'] = [x for x in range(len(self.file_lines)) if 'BEAM' in self.file_lines[x]][0]  #where beam line appears (begining of the file)
-
-        for x in range(len(self.file_lines)):
-            if 'NODOFBEAM' in self.file_lines[x]:
-                beamparameters['NODOFBEAM'] = x
-            if 'END_TRANS' in self.file_lines[x]:
-                beamparameters['END_TRANS_LAST'] = x
-            if 'NODES' in self.file_lines[x]:
-                beamparameters['nodes'] = x
+        sections = sections if sections is not None else self.index_sections()
+        if 'NODOFBEAM' not in sections:
+            # model of no beams (e.g. dummy shells of area2lineload)
+            beamparameters.update({'beamtypes': [], 'beamnumber': 0})
+            if update:
+                self.beamparameters = beamparameters
+            return beamparameters
+
+        beamparameters['BEAM'] = sections['BEAM'][0]  #where beam line appears (begining of the file)
+        beamparameters['NODOFBEAM'] = sections['NODOFBEAM'][-1]
+        if 'END_TRANS' in sections:
+            beamparameters['END_TRANS_LAST'] = sections['END_TRANS'][-1]
+        if 'NODES' in sections:
+            beamparameters['nodes'] = sections['NODES'][-1]
 
         beamparameters['elem_start'] = 0
         beamparameters['beamtypes'] = []
@@ -407,11 +2030,19 @@ class InFile:
 
         return beams, shells, trusses
 
-    def get_materials(self):
+    def get_materials(self, sections=None):
         materials = []      # [['mat1name', [par1, ..., parn], ...]
         m = []
         r = False
-        for line in reversed(self.file_lines):
+        lines = self.file_lines
+        # only lines between MATERIALS and TIME are read when the section index is known
+        if sections is not None:
+            if 'TIME' not in sections or 'MATERIALS' not in sections:
+                return None
+            start = max([i for i in sections['MATERIALS'] if i < sections['TIME'][-1]], default=0)
+            lines = self.file_lines[start:sections['TIME'][-1] + 1]
+
+        for line in reversed(lines):
             if r:
                 spltd = line.split()
                 if len(spltd) > 1:
@@ -428,17 +2059,105 @@ class InFile:
             elif all(['TIME' in line, 'TIMEPRINT' not in line, 'END' not in line]):
                 r = True
 
+    # affine transformation of all nodes at once: x' = matrix (x - point) + point + vector, 2D models use the XY part
+    def transform(self, matrix=None, vector=(0, 0, 0), point=(0, 0, 0)):
+        coords = self.nodes.values
+        ndim = coords.shape[1]
+        if matrix is not None:
+            point = np.asarray(point, dtype=float)[:ndim]
+            coords = (coords - point) @ np.asarray(matrix, dtype=float)[:ndim, :ndim].T + point
+        self.nodes.values = coords + np.asarray(vector, dtype=float)[:ndim]
+        self.write_nodes()
+
     def move(self, vector):
-        for n in self.nodes:
-            l = self.file_lines[self.beamparameters['nodes']+int(n[0])].split()
-            for i in range(3):
-                n[i+1] = n[i+1] + vector[i]
-                l[i+2] = str(float(l[i+2]) + vector[i])
-                self.file_lines[self.beamparameters['nodes']+int(n[0])] = '\t'.join(l) + '\n'
+        self.transform(vector=vector)
+
+    # angle in degrees, right-handed about the axis going through the point
+    def rotate(self, angle, axis=(0, 0, 1), point=(0, 0, 0)):
+        x, y, z = np.asarray(axis, dtype=float) / np.linalg.norm(axis)
+        cross = np.array([[0, -z, y], [z, 0, -x], [-y, x, 0]])
+        sin, cos = np.round([np.sin(np.radians(angle)), np.cos(np.radians(angle))], 15)    # exact for right angles
+        self.transform(np.eye(3) + sin * cross + (1 - cos) * cross @ cross, point=point)
+
+    # factor may be given for each axis
+    def scale(self, factor, point=(0, 0, 0)):
+        self.transform(np.diag(np.broadcast_to(np.asarray(factor, dtype=float), 3)), point=point)
+
+    # reflection in the plane of given normal going through the point
+    def mirror(self, normal, point=(0, 0, 0)):
+        normal = np.asarray(normal, dtype=float) / np.linalg.norm(normal)
+        self.transform(np.eye(3) - 2 * np.outer(normal, normal), point=point)
+
+    # edits recorded in the patch applied to file_lines before these are changed in place, as the line numbers of the
+    # edits would not match the lines anymore
+    def flush_patch(self):
+        if self.patch.replaced or self.patch.inserted:
+            self.patch.apply()
+            self.sections, self.indexed_lines = self.index_sections(), len(self.file_lines)
+
+    # NODE lines of the NODES block made again from the node table in one pass
+    def write_nodes(self):
+        self.flush_patch()
+        sections = self.current_sections()
+        if 'NODES' not in sections:
+            return
+        replace_entities(self.file_lines, 'nodes', entity_lines('nodes', self.nodes), first=sections['NODES'][0])
+        # number of nodes has changed
+        if len(self.file_lines) != self.indexed_lines:
+            self.sections, self.indexed_lines = self.index_sections(), len(self.file_lines)
+
+    # nodes tagged 1, 2, ..., n in given order of their rows (reverse Cuthill-McKee by default), NODE lines written in
+    # the new order and node tags changed in elements, fixations, loads and masses; old tags in new order are returned
+    def renumber(self, order=None):
+        self.flush_patch()
+        sections = self.current_sections()
+        if 'FIXATIONS' not in sections:
+            raise ValueError(f'{self.chid} is not a structural input file, only these are renumbered')
+        for i, line in enumerate(self.file_lines[:sections['NODES'][0]]):
+            tokens = line.split()
+            if tokens[:1] == ['OBLIQUE'] and int(tokens[1]):
+                raise ValueError(f'{self.chid} has oblique supports, these are not renumbered')
+            elif tokens[:1] == ['RENUMGEO']:
+                self.file_lines[i] = '   NORENUM\n'     # SAFIR would renumber the nodes again
+
+        order = rcm_order(node_graph(self)) if order is None else np.asarray(order)
+        new = np.empty(len(self.nodes), dtype=np.int64)
+        new[order] = np.arange(1, len(order) + 1)
+
+        for name in ELEMENT_TABLES:
+            table = getattr(self, name)
+            if not len(table):
+                continue
+            tags, given = element_node_tags(table, name)
+            tags[given] = new[self.nodes.rows(tags[given])]
+            table.values[:, :tags.shape[1]] = tags
+            replace_entities(self.file_lines, name, entity_lines(name, table), first=sections[ENTITIES[name][1]][0])
+        self.renumber_references(new)
+
+        old = self.nodes.tags[order]
+        self.nodes = EntityTable(np.arange(1, len(order) + 1), self.nodes.values[order])
+        self.write_nodes()
+
+        return old
+
+    # node tags of fixations, loads and masses changed to the new ones (by the rows of the current node table), lines
+    # of each run of the same keyword sorted by them
+    def renumber_references(self, new):
+        lines = self.file_lines
+        run = []    # [(new tag, line), ...] of the run being read
+        for i in range(self.current_sections()['FIXATIONS'][0], len(lines) + 1):
+            tokens = lines[i].split() if i < len(lines) else []
+            if run and tokens[:1] != [run[0][1].split()[0]]:
+                lines[i - len(run):i] = [line for _, line in sorted(run, key=lambda r: r[0])]
+                run = []
+            if tokens and tokens[0] in NODE_REFERENCES:
+                for p in NODE_REFERENCES[tokens[0]]:
+                    tokens[p] = str(new[self.nodes.row(int(tokens[p]))])
+                lines[i] = f'{tokens[0]:>10}    ' + '    '.join(tokens[1:]) + '\n'
+                run.append((int(tokens[1]), lines[i]))
 
     def save_line(self, name, path='.'):
-        with open(os.path.join(path, name), 'w') as file:
-            file.writelines(self.file_lines)
+        self.patch.write(os.path.join(path, name))
 
 
 
@@ -446,11 +2165,11 @@ class InFile:
 # vvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvv
 
 class Entity:
-    def __init__(self):
-        self.tag = int
-        self.value = []
-        self.dim = int
-        self.prop = str if self.dim > 0 else None
+    def __init__(self, tag=None, value=None, dim=None, prop=None):
+        self.tag = tag
+        self.value = value if value is not None else []     # coordinates of node or tags of lower entities
+        self.dim = dim
+        self.prop = prop if dim else None   # type (profile) of element
 
         #                           node (dim=0)   |  beam (dim=1)    | shell (dim=2)
         self.load = []  # [Px, Py, Pz, Mx, My, Mz] | [qx, qy, qz]     | [qarea]
@@ -460,45 +2179,50 @@ class Entity:
 
         self.relax = []     # [relxation parameters]
 
-    
+
 class Entities:
-    def __init__(self):
-        self.dim = int
-        self.entities = []  # list of Entity objects
-        self.taglist = self.dotaglist()
-        self.numlist = self.taglist.values()
+    '''Entities of one dimension kept in EntityTable (tags and values arrays), single Entity is made only on demand'''
+    def __init__(self, table=None, dim=0):
+        self.dim = dim
+        self.table = table if table is not None else EntityTable(dtype=np.float64 if dim == 0 else np.intc)
+
+    def __len__(self):
+        return len(self.table)
 
-        # properties
-        self.proprties = Propeties(self.dim)
+    # Entity of given tag
+    def __getitem__(self, tag):
+        row = self.table.entity(tag)
+        return Entity(row[0], row[1:], self.dim, prop=row[-1] if self.dim else None)
 
+    # return dictionary of entity tags and their rows in the table
+    def dotaglist(self):
+        return dict(zip(self.table.tags.tolist(), range(len(self.table))))
 
     # return dictionary of entities with tags as keys
     def dotagdict(self):
-        tag_dict = {}
-        for e in self.entities:
-            tag_dict[str(e.tag)] = e.value
-
-        return tag_dict
+        return {str(row[0]): row[1:] for row in self.table}
 
 
 class Nodes(Entities):
-    def __init__(self):
-        super().__init__(self)
-        self.dim = 0
+    def __init__(self, table=None):
+        super().__init__(table, dim=0)
+
+
+class Trusses(Entities):
+    def __init__(self, table=None):
+        super().__init__(table, dim=0.5)
 
 
 class Beams(Entities):
-    def __init__(self):
-        super().__init__(self)
-        self.dim = 1
+    def __init__(self, table=None):
+        super().__init__(table, dim=1)
         self.profiletag = int 
         # self.relax = {}     # {'tag': [relaxation parameters (float)], ... }
 
 
 class Shells(Entities):
-    def __init__(self):
-        super().__init__(self)
-        self.dim = 2
+    def __init__(self, table=None):
+        super().__init__(table, dim=2)
         self.vert = 4      # number of vertices (quad elements are default)
         self.tshtag = int
 
@@ -510,33 +2234,84 @@ class Shells(Entities):
         
 
 class Solids(Entities):
-    def __init__(self):
-        super().__init__(self)
-        self.dim = 2
+    def __init__(self, table=None):
+        super().__init__(table, dim=3)
         self.vert = 8      # number of vertices (hexahedral elements are default)
         
         # there should be some temperature constraints also
 
 
 class Geometry:
-    def __init__(self, n=None, b=None, sh=None, sd=None):
-        self.nodes = n
-        self.beams = b
-        self.shells = sh
-        self.solids = sd
-
-        self.profiles = {} # list of profiles {'b': {'profile': [globalmat1, globalmat2 ... ] ... }, 'sh': {...}}
+    KINDS = {'nodes': Nodes, 'trusses': Trusses, 'beams': Beams, 'shells': Shells, 'solids': Solids}
+    PROFILES = {'trusses': 't', 'beams': 'b', 'shells': 'sh'}   # keys of profiles
+
+    def __init__(self, n=None, b=None, sh=None, sd=None, t=None):
+        self.nodes = n if n else Nodes()
+        self.beams = b if b else Beams()
+        self.shells = sh if sh else Shells()
+        self.solids = sd if sd else Solids()
+        self.trusses = t if t else Trusses()
+
+        # {'b': [['profile.tem', [globalmat1, globalmat2 ... ]], ...], 'sh': [...],
+        #  't': [['curve.txt', area, initial_stress, globalmat], ...]}
+        self.profiles = {}
+
+    # names of entities of chosen dimensions (aliases from ENTITIES e.g. 'beams', 'b' or 1), all if None
+    @staticmethod
+    def chosen(dim=None):
+        dims = dim if isinstance(dim, (list, tuple, set)) else [dim]
+        return [n for n, (aliases, *_) in ENTITIES.items() if dim is None or any(d in aliases for d in dims)]
 
     def read(self, file_lines, dim=None):
         # read entities form file lines
         # possible to read only chosen dimensions
-        pass
-    
-    def write(self, file_lines=None, mode=None, dim=None):
-        # return geometry lines entities form file lines
+        names = self.chosen(dim)
+        tables, blocks = read_entities(file_lines, names)
+        for name in names:
+            setattr(self, name, self.KINDS[name](tables[name]))
+            if name in self.PROFILES:
+                self.profiles[self.PROFILES[name]] = read_types(file_lines, TYPE_BLOCKS[ENTITIES[name][1]],
+                                                                [blocks[name]] if name in blocks else [])
+
+        return self
+
+    def write(self, file_lines=None, mode='replace', dim=None):
+        # return geometry lines {name: [NODE or ELEM lines]} if file_lines are not given
         # possible to write only chosen dimensions
         # possible to write (append or replace) geometry in filelines
-        pass
+        lines = {name: entity_lines(name, getattr(self, name).table) for name in self.chosen(dim)}
+        if file_lines is None:
+            return lines
+
+        for name, new in lines.items():
+            try:
+                replace_entities(file_lines, name, new, append=mode == 'append')
+            # there is no block for entities the model has none of (e.g. trusses of a frame)
+            except ValueError:
+                if new:
+                    raise
+
+        return file_lines
+
+    # profiles block (from NODOF line to the first ELEM) replaced with current profiles
+    def write_profiles(self, file_lines, name):
+        start, stops = ENTITIES[name][1], ['ELEM', *ENTITIES[name][3]]
+        new = []
+        for p in self.profiles.get(self.PROFILES[name], []):
+            if name == 'trusses':
+                new.append('    '.join(map(str, p)) + '\n')
+            else:
+                new.extend([f'{p[0]}\n', *[f' TRANSLATE    {i + 1}    {m}\n' for i, m in enumerate(p[1])],
+                            ' END_TRANS\n'])
+
+        begin = next((i + 1 for i, line in enumerate(file_lines) if line.split(None, 1)[:1] == [start]), None)
+        if begin is None:
+            raise ValueError(f'There is no {start} block in the lines')
+        end = next((i for i, line in enumerate(islice(file_lines, begin, None), start=begin)
+                    if line.split(None, 1)[:1] and line.split(None, 1)[0] in stops), len(file_lines))
+        file_lines[begin:end] = new
+
+        return file_lines
 
 # 
 # class Thermal2D(Properties):
@@ -577,12 +2352,19 @@ class Geometry:
 
 # to be developed in the future: one material in SAFIR = one class
 class Material:
-    def __init__(self):
-        self.name = str
-        self.parameters = []    # list of parameters required by SAFIR for the Material
+    def __init__(self, name=None, parameters=None):
+        self.name = name
+        self.parameters = parameters if parameters else []    # list of parameters required by SAFIR for the Material
+        # (a list for each line)
+
+    def lines(self):
+        return [f'{self.name}\n', *['    ' + '    '.join(map(str, p)) + '\n' for p in self.parameters]]
 
 
 class NewInFile:
+    HEADER = {'nfiber': 'NFIBER', 'cores': 'NCORES'}    # integer values of header lines
+    COUNTS = {'nodes': 'NNODE', 'trusses': 'TRUSS', 'beams': 'BEAM', 'shells': 'SHELL', 'solids': 'SOLID'}
+
     def __init__(self, problemtype: str, chid=None, path=None):
         # file data
         self.chid = chid if chid else None
@@ -599,27 +2381,70 @@ class NewInFile:
         self.time_end = 1800    # default
         self.algorithm = 1      # 1 for PARDISO, 0 for CHOLESKY
         self.cores = 1  # valid only if self.algorithm == 1
-        self.description = 'SAFIR simulaion produced with safir_tools.py\nvisit'\
-                            'github.com\kowalskiw\\fireeng-tools for more details'
+        self.description = 'SAFIR simulaion produced with safir_tools.py\nvisit '\
+                           'github.com/kowalskiw/fireeng-tools for more details'
         self.materials = [] # list of Material objects
 
+        self.known = {}  # digest of data as read or written last time, only what has changed since is written
 
-
-        
     def read_lines(self, path):
         with open(path) as f:
             self.lines = f.readlines()
         
         self.path = path
-        self.chid = '.'.join(os.basename(path).split('.')[:-1])
+        self.chid = '.'.join(basename(path).split('.')[:-1])
 
-    def read_sim(self, path=None):
+    # geometry of chosen dimensions may be read only (dim=[] for header, materials and time only)
+    def read_sim(self, path=None, dim=None):
         p = self.path if not path else path
-        read_lines(p)
-        read_data()
-
-    def read_data(self):
-        pass
+        self.read_lines(p)
+        self.read_data(dim=dim)
+
+        return self
+
+    # number of the first line starting with the keyword (searched before end or from the end of file if reverse)
+    def find(self, keyword, reverse=False, end=None):
+        numbers = range(len(self.lines) - 1, -1, -1) if reverse else range(len(self.lines) if end is None else end)
+        return next((i for i in numbers if self.lines[i].split(None, 1)[:1] == [keyword]), None)
+
+    def read_data(self, dim=None):
+        header = self.find('NODES')
+        nnode = self.find('NNODE', end=header)
+        if nnode is not None:
+            self.description = ''.join(self.lines[:nnode]).strip('\n')
+        for attribute, keyword in self.HEADER.items():
+            line = self.find(keyword, end=header)
+            setattr(self, attribute, int(self.lines[line].split()[1]) if line is not None else None)
+
+        endtime = self.find('ENDTIME', reverse=True)
+        self.time_end = float(self.lines[endtime - 1].split()[1]) if endtime else None
+
+        self.materials = []
+        start, end = self.find('MATERIALS', reverse=True), self.find('TIME', reverse=True)
+        for line in self.lines[start + 1:end] if None not in [start, end] else []:
+            tokens = line.split()
+            if len(tokens) == 1:
+                self.materials.append(Material(tokens[0]))
+            elif tokens and self.materials:
+                self.materials[-1].parameters.append([float(p) for p in tokens])
+
+        if dim != []:
+            self.geom.read(self.lines, dim=dim)
+        self.known = self.state()
+
+    # digest of current data, geometry tables are hashed instead of being copied
+    def state(self):
+        state = {a: getattr(self, a) for a in ['description', 'time_end', *self.HEADER]}
+        state['materials'] = [[m.name, [list(p) for p in m.parameters]] for m in self.materials]
+        for key in Geometry.PROFILES.values():
+            state[key] = json.dumps(self.geom.profiles.get(key))
+        for name in ENTITIES:
+            table = getattr(self.geom, name).table
+            hasher = hashlib.sha1(np.ascontiguousarray(table.tags).data)
+            hasher.update(np.ascontiguousarray(table.values).data)
+            state[name] = hasher.hexdigest()
+
+        return state
     
     # save lines to path
     def write_lines(self, path, update=True):
@@ -628,14 +2453,57 @@ class NewInFile:
             f.writelines(self.lines)
         
 
-    # replace lines with current data
+    # replace lines with current data, only blocks and lines of changed data are written
     def update_lines(self):
-        pass
+        changed = [k for k, v in self.state().items() if self.known.get(k) != v]
+
+        # geometry first as it changes the number of lines
+        for name in ENTITIES:
+            profiles = Geometry.PROFILES.get(name)
+            if profiles in changed:
+                self.geom.write_profiles(self.lines, name)
+            if name in changed:
+                self.geom.write(self.lines, dim=name)
+            if name in changed or profiles in changed:
+                self.count(name)
+
+        header = self.find('NODES')
+        if 'description' in changed:
+            self.lines[:self.find('NNODE', end=header)] = [f'{self.description}\n', '\n']
+            header = self.find('NODES')
+        for attribute, keyword in self.HEADER.items():
+            line = self.find(keyword, end=header)
+            if attribute in changed and line is not None:
+                self.lines[line] = f'{keyword:>10}    {getattr(self, attribute)}\n'
+        if 'time_end' in changed:
+            line = self.find('ENDTIME', reverse=True) - 1
+            self.lines[line] = f'    {self.lines[line].split()[0]}    {self.time_end}\n'
+        if 'materials' in changed:
+            start, end = self.find('MATERIALS', reverse=True), self.find('TIME', reverse=True)
+            self.lines[start + 1:end] = [line for m in self.materials for line in m.lines()]
+            nmat = self.find('NMAT', end=header)
+            if nmat is not None:
+                self.lines[nmat] = f'{"NMAT":>10}    {len(self.materials)}\n'
+
+        self.known = self.state()
+
+        return self.lines
+
+    # number of entities (and their profiles) in the header
+    def count(self, name):
+        line = self.find(self.COUNTS[name], end=self.find('NODES'))
+        if line is None:
+            return
+        tokens = self.lines[line].split()
+        tokens[1] = str(len(getattr(self.geom, name)))
+        if len(tokens) > 2 and Geometry.PROFILES.get(name) in self.geom.profiles:
+            tokens[2] = str(len(self.geom.profiles[Geometry.PROFILES[name]]))
+        self.lines[line] = f'{tokens[0]:>10}    ' + '    '.join(tokens[1:]) + '\n'
 
 
 class Thermal2d(NewInFile):
-    def __init__(self):
-        super().__init__(self, 'Thermal2D')
+    def __init__(self, chid=None, path=None):
+        super().__init__('Thermal2D', chid=chid, path=path)
 
 # ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 
@@ -652,7 +2520,8 @@ if __name__ == '__main__':
         for arg in sys.argv[2:]:
             args.append(abspath(arg) if exists(abspath(arg)) else arg)
 
-        globals()[function](*args)
+        # parse cache is used by command line runs only
+        globals()[function](*args, **({'cache': INFILE_CACHE} if function in {'move_in', 'renumber'} else {}))
         exit(0)
     except IndexError:
         raise Exception("Please provide function name")
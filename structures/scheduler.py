@@ -0,0 +1,273 @@
+import argparse as ar
+import asyncio
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime as dt
+from os.path import abspath, basename, dirname, isfile, join
+from threading import Condition
+
+from safir_tools import run_safir, run_safir_async, referenced_files, Watchdog
+from safir_cache import SafirCache, DEFAULT_DIR
+
+'''Running many SAFIR simulations concurrently with bounded number of cores and license seats'''
+
+
+# number of cores declared in the input file (NCORES), 1 if not declared
+def declared_cores(in_file_path):
+    with open(in_file_path) as file:
+        for line in file:
+            spltd = line.split()
+            if len(spltd) > 1 and spltd[0] == 'NCORES':
+                return int(spltd[1])
+            elif 'NODES' in spltd:
+                break
+    return 1
+
+
+class Job:
+    def __init__(self, in_file_path, cores=None):
+        self.path = abspath(in_file_path)
+        self.chid = basename(self.path)[:-3]
+        self.dir = dirname(self.path)
+        self.cores = cores if cores else declared_cores(self.path)
+
+        # results
+        self.status = 'waiting'     # waiting / running / ok / error / killed / failed
+        self.rc = None      # value returned by run_safir
+        self.reason = ''
+        self.watchdog = None
+        self.start = None
+        self.end = None
+
+    def duration(self):
+        try:
+            return self.end - self.start
+        except TypeError:
+            return None
+
+    def summary(self):
+        return {'chid': self.chid, 'path': self.path, 'status': self.status, 'rc': self.rc, 'reason': self.reason,
+                'start': str(self.start), 'end': str(self.end), 'duration': str(self.duration())}
+
+
+# cores and license seats shared by all jobs
+class Resources:
+    def __init__(self, cores, seats):
+        self.cores = cores
+        self.seats = seats
+        self.free_cores = cores
+        self.free_seats = seats
+        self.condition = Condition()
+
+    def acquire(self, cores):
+        cores = min(cores, self.cores)  # a job bigger than the machine runs alone
+        with self.condition:
+            self.condition.wait_for(lambda: self.free_cores >= cores and self.free_seats > 0)
+            self.free_cores -= cores
+            self.free_seats -= 1
+        return cores
+
+    def release(self, cores):
+        with self.condition:
+            self.free_cores += cores
+            self.free_seats += 1
+            self.condition.notify_all()
+
+    # the same for jobs supervised by one event loop
+    async def acquire_async(self, cores, condition):
+        cores = min(cores, self.cores)
+        async with condition:
+            await condition.wait_for(lambda: self.free_cores >= cores and self.free_seats > 0)
+            self.free_cores -= cores
+            self.free_seats -= 1
+        return cores
+
+    async def release_async(self, cores, condition):
+        async with condition:
+            self.free_cores += cores
+            self.free_seats += 1
+            condition.notify_all()
+
+
+class Scheduler:
+    def __init__(self, in_file_paths, safir_exe_path='safir', cores=None, seats=None, isolate=False, wine=False,
+                 key=None, fix_rlx=True, job_cores=None, cache=None, watchdog=None):
+        self.jobs = [Job(p, cores=job_cores) for p in in_file_paths]
+        self.safir_exe_path = safir_exe_path
+        self.isolate = isolate  # run each job in its own subdirectory
+        self.wine = wine
+        self.key = key
+        self.fix_rlx = fix_rlx
+        self.cache = cache  # safir_cache.SafirCache or None
+        self.watchdog = watchdog    # safir_tools.Watchdog with policies copied to each job
+
+        cores = cores if cores else os.cpu_count()
+        seats = seats if seats else len(self.jobs)
+        self.resources = Resources(cores, max(1, seats))
+
+    # copy input file and all referenced files to the private job directory
+    def isolated_dir(self, job):
+        job_dir = join(job.dir, f'{job.chid}.job')
+        os.makedirs(job_dir, exist_ok=True)
+        copied = [shutil.copy2(job.path, job_dir)]
+        for ref in referenced_files(job.path):
+            if isfile(ref):
+                copied.append(shutil.copy2(ref, job_dir))
+
+        return job_dir, {basename(c) for c in copied}
+
+    # move results back to the model directory and remove the job directory (with the license linked to it)
+    def collect(self, job, job_dir, inputs):
+        for f in os.scandir(job_dir):
+            if f.name not in inputs and f.name != 'identity.key':
+                shutil.move(f.path, join(job.dir, f.name))
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+    def set_status(self, job):
+        if job.watchdog and job.watchdog.reason:
+            job.status = 'killed'
+            job.reason = job.watchdog.reason
+        elif job.rc == 0:
+            job.status = 'ok'
+        elif job.rc == -1:
+            job.status = 'error'
+            job.reason = 'SAFIR reported an error'
+        else:
+            job.status = 'failed'
+            job.reason = 'SAFIR exited with non-zero code'
+
+    def report(self, job):
+        print(f'[{"OK" if job.status == "ok" else "WARNING"}] {job.chid} {job.status} in {job.duration()}')
+        return job
+
+    def run_job(self, job):
+        cores = self.resources.acquire(job.cores)
+        job.watchdog = self.watchdog.copy() if self.watchdog else None
+        job.status = 'running'
+        job.start = dt.now()
+        try:
+            if self.isolate:
+                job_dir, inputs = self.isolated_dir(job)
+                try:
+                    job.rc = run_safir(join(job_dir, basename(job.path)), safir_exe_path=self.safir_exe_path,
+                                       print_time=False, fix_rlx=self.fix_rlx, wine=self.wine, key=self.key,
+                                       cache=self.cache, watchdog=job.watchdog)
+                finally:
+                    self.collect(job, job_dir, inputs)
+            else:
+                job.rc = run_safir(job.path, safir_exe_path=self.safir_exe_path, print_time=False,
+                                   fix_rlx=self.fix_rlx, wine=self.wine, key=self.key, cache=self.cache,
+                                   watchdog=job.watchdog)
+            self.set_status(job)
+        except Exception as e:
+            job.status = 'failed'
+            job.reason = f'{type(e).__name__}: {e}'
+        finally:
+            job.end = dt.now()
+            self.resources.release(cores)
+
+        return self.report(job)
+
+    async def run_job_async(self, job, condition):
+        cores = await self.resources.acquire_async(job.cores, condition)
+        job.watchdog = self.watchdog.copy() if self.watchdog else None
+        job.status = 'running'
+        job.start = dt.now()
+        try:
+            if self.isolate:
+                # copying and moving files of big models is blocking, so it is done outside the event loop
+                loop = asyncio.get_running_loop()
+                job_dir, inputs = await loop.run_in_executor(None, self.isolated_dir, job)
+                try:
+                    job.rc = await run_safir_async(join(job_dir, basename(job.path)),
+                                                   safir_exe_path=self.safir_exe_path, print_time=False,
+                                                   fix_rlx=self.fix_rlx, wine=self.wine, key=self.key,
+                                                   cache=self.cache, watchdog=job.watchdog)
+                finally:
+                    await loop.run_in_executor(None, self.collect, job, job_dir, inputs)
+            else:
+                job.rc = await run_safir_async(job.path, safir_exe_path=self.safir_exe_path, print_time=False,
+                                               fix_rlx=self.fix_rlx, wine=self.wine, key=self.key,
+                                               cache=self.cache, watchdog=job.watchdog)
+            self.set_status(job)
+        except Exception as e:
+            job.status = 'failed'
+            job.reason = f'{type(e).__name__}: {e}'
+        finally:
+            job.end = dt.now()
+            await self.resources.release_async(cores, condition)
+
+        return self.report(job)
+
+    def run(self):
+        print(f'[INFO] Running {len(self.jobs)} SAFIR jobs on {self.resources.cores} cores '
+              f'({self.resources.seats} license seats)')
+        with ThreadPoolExecutor(max_workers=min(len(self.jobs), self.resources.seats) or 1) as pool:
+            list(pool.map(self.run_job, self.jobs))
+
+        return self.summary()
+
+    # all jobs supervised by a single event loop instead of a thread per job
+    def run_async(self):
+        print(f'[INFO] Running {len(self.jobs)} SAFIR jobs on {self.resources.cores} cores '
+              f'({self.resources.seats} license seats) in asyncio mode')
+
+        async def run_all():
+            condition = asyncio.Condition()
+            await asyncio.gather(*[self.run_job_async(j, condition) for j in self.jobs])
+
+        asyncio.run(run_all())
+
+        return self.summary()
+
+    def summary(self):
+        failed = [j for j in self.jobs if j.status != 'ok']
+        print(f'[OK] {len(self.jobs) - len(failed)} of {len(self.jobs)} jobs finished successfully')
+
+        return [j.summary() for j in self.jobs]
+
+
+def run_many(in_file_paths, safir_exe_path='safir', asynchronous=False, **kwargs):
+    scheduler = Scheduler(in_file_paths, safir_exe_path=safir_exe_path, **kwargs)
+    return scheduler.run_async() if asynchronous else scheduler.run()
+
+
+def get_arguments():
+    parser = ar.ArgumentParser(description='Run many SAFIR simulations concurrently')
+    parser.add_argument('infiles', nargs='+', help='Paths to SAFIR input files')
+    parser.add_argument('-s', '--safir', help='Path to SAFIR executable', default='safir')
+    parser.add_argument('-j', '--cores', help='Number of cores to be used [all by default]', type=int, default=None)
+    parser.add_argument('-l', '--seats', help='Number of SAFIR license seats [no limit by default]', type=int,
+                        default=None)
+    parser.add_argument('-n', '--ncores', help='Cores used by each job [NCORES from the input file by default]',
+                        type=int, default=None)
+    parser.add_argument('-w', '--isolate', help='Run each job in its own directory', action='store_true')
+    parser.add_argument('-a', '--asyncio', help='Supervise all jobs with one asyncio event loop',
+                        action='store_true')
+    parser.add_argument('-u', '--unix', action='store_true', help='Compatibility with Linux version of the script.')
+    parser.add_argument('-i', '--identity', default=None, help='SAFIR license file [required for Linux].')
+    parser.add_argument('-c', '--cache', default=None,
+                        help=f'Restore unchanged results from the cache directory (e.g. {DEFAULT_DIR})')
+    parser.add_argument('-e', '--kill_on_error', action='store_true',
+                        help='Kill SAFIR on the first ERROR or forrtl message')
+    parser.add_argument('-t', '--stall_timeout', type=float, default=None,
+                        help='Kill SAFIR when no new time step appears within given time [s]')
+    parser.add_argument('-m', '--min_timestep', type=float, default=None,
+                        help='Kill SAFIR when the time step shrinks below given value [s]')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_arguments()
+    watchdog = None
+    if any([args.kill_on_error, args.stall_timeout, args.min_timestep]):
+        watchdog = Watchdog(kill_on_error=args.kill_on_error, stall_timeout=args.stall_timeout,
+                            min_timestep=args.min_timestep)
+    summary = run_many([abspath(p) for p in args.infiles], safir_exe_path=args.safir, cores=args.cores,
+                       seats=args.seats, job_cores=args.ncores, isolate=args.isolate, wine=bool(args.unix),
+                       asynchronous=args.asyncio, cache=SafirCache(abspath(args.cache)) if args.cache else None,
+                       key=abspath(args.identity) if args.identity else None, watchdog=watchdog)
+    for s in summary:
+        print(f'{s["chid"]}\t{s["status"]}\t{s["duration"]}\t{s["reason"]}')
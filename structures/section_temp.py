@@ -2,16 +2,17 @@ from sys import argv
 from os import path, scandir
 import argparse
 import numpy as np
-import xml.etree.ElementTree as ET
 import matplotlib.pyplot as plt
 
+from safir_tools import load_results
+
 
 # args: use -h flag to get some help
 # e.g. "python section_temp.py -f d:\my_sim.gid\hea180.XML -c 540 -x"
 
 class ReadXML:
     def __init__(self, path2xml, amb_temp=20):
-        self.data = ET.parse(path2xml).getroot()
+        self.data = load_results(path2xml)   # arrays converted from XML, reused in the next runs
         self.ambient = amb_temp
         self.steel_nmat = []
         self.temperatures = {}
@@ -19,61 +20,40 @@ class ReadXML:
         self.steel_nodes = []
 
     def check_if_t2d(self, name):
-        for n in self.data.iter('NDIM'):
-            if '2' in n.text:
-                break
-            else :
-                raise TypeError(f'{name} does not contain 2D results. Give me the right file, man!')
+        if '2' not in self.data.meta.get('ndim', ''):
+            raise TypeError(f'{name} does not contain 2D results. Give me the right file, man!')
 
-        for t in self.data.iter('TYPE'):
-            if 'TEMPERAT' in t.text:
-                break
-            else :
-                raise TypeError(f'{name} does not contain thermal results. Give me the right file, man!')
-
-        for m in self.data.iter('MATERIALS'):
-            for i, v in enumerate(m):
-                if 'STEEL' in v.text:
-                   self.steel_nmat.append(i+1)
-            if len(self.steel_nmat) == 0:
-                raise TypeError(f'{name} does not contain steel nodes. Give me the right file, man!')
+        if 'TEMPERAT' not in self.data.meta.get('type', ''):
+            raise TypeError(f'{name} does not contain thermal results. Give me the right file, man!')
+
+        for i, v in enumerate(self.data.meta['materials']):
+            if 'STEEL' in v:
+                self.steel_nmat.append(i+1)
+        if len(self.steel_nmat) == 0:
+            raise TypeError(f'{name} does not contain steel nodes. Give me the right file, man!')
             
         print(f'[OK] {name} file loaded')
 
     def find_steel_nodes(self):
-        for n in self.data.iter('NNODE'):
-            nnodes = int(n.text)
+        nnodes = int(self.data.meta['nnode'])
 
-        self.steel_nodes = list(range(1, nnodes))
-        
-        for solids in self.data.iter('SOLIDS'):
-            for i, s in enumerate(solids):
-                if int(s[-1].text) not in self.steel_nmat:
-                    for n in s[:-1]:
-                        try :
-                            self.steel_nodes.remove(int(n.text))
-                        except ValueError:
-                            continue
+        # nodes of non-steel solids are removed, material number is in the last column
+        solids = self.data.solids
+        other = set(solids[~np.isin(solids[:, -1], self.steel_nmat), :-1].ravel().tolist())
+        self.steel_nodes = [n for n in range(1, nnodes) if n not in other]
 
         print(f'[OK] {len(self.steel_nodes)} steel nodes out of total {nnodes} were taken')
 
     def find_times(self):
-        times = []
-        for time in self.data.iter('TIME'):
-            times.append(float(time.text))
-
-        return times
-
+        return self.data.times.tolist()
 
     def load_temps(self):
         self.find_steel_nodes()
         times = self.find_times()
 
-        for i, t in enumerate(self.data.iter('TEMPERATURES')):
-            step = []
-            for n in self.steel_nodes:
-                step.append(float(t[n-1].text))
-            self.temperatures[times[i]] = step
+        steel = self.data.temperatures[:, np.array(self.steel_nodes, dtype=int) - 1]
+        for i, t in enumerate(steel):
+            self.temperatures[times[i]] = t.tolist()
         
         return self.temperatures
     
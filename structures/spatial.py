@@ -0,0 +1,255 @@
+import numpy as np
+
+'''Spatial index over points of the model (nodes, middles of elements) for bulk nearest, k-nearest, radius and box
+queries'''
+
+
+SMALL = 256     # sets of at most that many points are searched by brute force, the grid would not pay off
+PER_CELL = 4    # mean number of points in a cell of the grid
+CHUNK = 2**18   # distances computed at once by brute force
+
+
+# coordinates of the i-th node of each element (beams, shells, trusses, solids) as an array (n, ndim)
+def element_nodes(infile, name, i):
+    table = getattr(infile, name)
+    if not len(table):
+        return np.zeros((0, infile.nodes.values.shape[1]))
+    return infile.nodes.values[infile.nodes.rows(table.values[:, i])]
+
+
+# points of elements: middle node of beams, centres of trusses and shells (by their corner nodes)
+def middles(infile, name='beams'):
+    if name == 'beams':
+        return element_nodes(infile, name, 1)
+    elif name == 'trusses':
+        first, last = [element_nodes(infile, name, i) for i in (0, 1)]
+        return first + (last - first) / 2
+    elif name == 'shells':
+        return np.mean([element_nodes(infile, name, i) for i in range(4)], axis=0)
+
+    raise ValueError(f'Invalid element type "{name}" in middles function')
+
+
+# which coordinates of the points are strictly between lower and upper ones, array of bools (n, ndim)
+def inside(points, lower, upper):
+    points = np.asarray(points, dtype=float)
+    return (points > lower) & (points < upper)
+
+
+def distances(queries, points):
+    return np.sqrt(((queries[:, None, :] - points[None, :, :]) ** 2).sum(axis=-1))
+
+
+class SpatialIndex:
+    '''Uniform grid of cubic cells over points. Queries are done in bulk (arrays of query points) and give tags of the
+    points - k nearest are looked for in the cells next to the query cell and the queries for which points beyond
+    these cells may be closer are passed to the grid of twice bigger cells'''
+    def __init__(self, points, tags=None, per_cell=PER_CELL, cell=None):
+        self.points = np.asarray(points, dtype=float).reshape(len(points), -1) if len(points) else np.zeros((0, 3))
+        self.tags = np.arange(len(self.points)) if tags is None else np.asarray(tags)
+        self.per_cell = per_cell
+        self.coarse = None  # index of twice bigger cells, made when needed
+        n, ndim = self.points.shape
+
+        self.lower = self.points.min(axis=0) if n else np.zeros(ndim)
+        self.upper = self.points.max(axis=0) if n else np.zeros(ndim)
+        self.cell = cell if cell else self.cell_size()
+        self.shape, self.strides = self.cells(self.cell)
+        ids = self.grid(self.points) @ self.strides
+        self.sorted = np.argsort(ids, kind='stable')
+        self.starts = np.searchsorted(ids[self.sorted], np.arange(self.shape.prod() + 1))
+
+    # shape of the grid of given cells and steps between them in the flat numbering
+    def cells(self, cell):
+        shape = ((self.upper - self.lower) // cell).astype(np.int64) + 1
+        return shape, np.append(np.cumprod(shape[::-1])[-2::-1], 1)
+
+    # cell size for about per_cell points in each cell: first by the volume of the grid, then reduced until the cells
+    # with points (e.g. along beams) hold about per_cell of them, with no more than 16 cells per point
+    def cell_size(self):
+        extent = self.upper - self.lower
+        axes, cell = extent > 0, 1.
+        while axes.any():
+            cell = (extent[axes].prod() * self.per_cell / len(self)) ** (1 / axes.sum())
+            if (extent[axes] >= cell).all():
+                break
+            axes &= extent >= cell
+
+        for _ in range(8):
+            self.cell, (self.shape, self.strides) = cell, self.cells(cell)
+            counts = np.bincount(self.grid(self.points) @ self.strides)
+            occupied = counts[counts > 0].mean() if len(self) else 0
+            smaller = cell * (self.per_cell / occupied) ** (1 / max(axes.sum(), 1)) if occupied else cell
+            if occupied < 2 * self.per_cell or self.cells(smaller)[0].prod() > 16 * len(self):
+                break
+            cell = smaller
+
+        return cell
+
+    @classmethod
+    def of_nodes(cls, infile):
+        return cls(infile.nodes.values, infile.nodes.tags)
+
+    @classmethod
+    def of_middles(cls, infile, name='beams'):
+        return cls(middles(infile, name), getattr(infile, name).tags)
+
+    def __len__(self):
+        return len(self.points)
+
+    # cells of the points, the ones outside the grid are moved to the nearest cell
+    def grid(self, points):
+        return np.clip(np.floor((points - self.lower) / self.cell), 0, self.shape - 1).astype(np.int64)
+
+    def queries(self, points):
+        points = np.asarray(points, dtype=float)
+        return points.reshape(len(points), self.points.shape[1])
+
+    def coarser(self):
+        if self.coarse is None:
+            self.coarse = SpatialIndex(self.points, self.tags, per_cell=self.per_cell, cell=2 * self.cell)
+        return self.coarse
+
+    # cells of the lower and upper corners of query boxes (q, ndim), all cells for small sets
+    def window(self, low, high):
+        if len(self) <= SMALL:
+            return np.zeros_like(self.grid(low)), np.broadcast_to(self.shape - 1, low.shape)
+        return self.grid(low), self.grid(high)
+
+    # indices of points in cells from low to high (grid coordinates, both included) of each query, for which
+    # match(query indices, point indices) is true, list of arrays in order of the points - spans of the cells are
+    # found for all queries at once, pairs of queries and points of these cells are compared in chunks of queries
+    def search(self, low, high, match):
+        n = high - low + 1
+        spans = n[:, :-1].prod(axis=1)  # rows of cells along the last axis (spans of sorted points) of each query
+        owners = np.repeat(np.arange(len(low)), spans)
+        j = np.arange(len(owners)) - np.repeat(np.cumsum(spans) - spans, spans)
+        heads = np.zeros(len(owners), dtype=np.int64)
+        for a in range(low.shape[1] - 2, -1, -1):
+            heads += (low[owners, a] + j % n[owners, a]) * self.strides[a]
+            j //= n[owners, a]
+        begins = self.starts[heads + low[owners, -1]]
+        lengths = self.starts[heads + high[owners, -1] + 1] - begins
+        pairs = np.bincount(owners, lengths, minlength=len(low)).astype(np.int64)
+
+        found, ends, start = [], np.cumsum(pairs), 0
+        while start < len(low):
+            stop = max(start + 1, int(np.searchsorted(ends, ends[start] - pairs[start] + CHUNK, side='right')))
+            first, last = np.searchsorted(owners, [start, stop])
+            b, c = begins[first:last], lengths[first:last]
+            points = self.sorted[np.arange(c.sum()) + np.repeat(b - np.cumsum(c) + c, c)]
+            queries = np.repeat(owners[first:last], c)
+            keep = match(queries, points)
+            queries, points = queries[keep], points[keep]
+            points = np.sort((queries - start) * len(self) + points) % len(self)  # by query, then by point
+            found += np.split(points, np.cumsum(np.bincount(queries, minlength=stop)[start:stop])[:-1])
+            start = stop
+
+        return found
+
+    # k nearest points in the cells next to the query cells, all pairs of queries and points of these cells are
+    # compared at once (in chunks of queries)
+    def sweep(self, queries, cells, k):
+        rows, dists = np.full((len(queries), k), -1), np.full((len(queries), k), np.inf)
+        offsets = np.indices((3,) * len(self.shape)).reshape(len(self.shape), -1).T - 1
+        neighbours = cells[:, None, :] + offsets
+        valid = ((neighbours >= 0) & (neighbours < self.shape)).all(axis=2)
+        ids = np.where(valid, neighbours @ self.strides, 0)
+        begins = self.starts[ids]
+        counts = np.where(valid, self.starts[ids + 1] - begins, 0)
+        pairs = counts.sum(axis=1)
+
+        ends = np.cumsum(pairs)
+        start = 0
+        while start < len(queries):
+            stop = max(start + 1, int(np.searchsorted(ends, ends[start] - pairs[start] + CHUNK, side='right')))
+            b, c = begins[start:stop].ravel(), counts[start:stop].ravel()
+            members = np.repeat(np.arange(start, stop), pairs[start:stop])
+            candidates = self.sorted[np.arange(c.sum()) + np.repeat(b - np.cumsum(c) + c, c)]
+            d = np.sqrt(((queries[members] - self.points[candidates]) ** 2).sum(axis=-1))
+
+            if k == 1 and len(d):
+                # pairs of each query are next to each other: minimum of each group, the first point if tied
+                found = np.flatnonzero(pairs[start:stop]) + start
+                firsts = np.searchsorted(members, found)
+                dists[found, 0] = np.minimum.reduceat(d, firsts)
+                tied = np.where(d == dists[members, 0], candidates, len(self))
+                rows[found, 0] = np.minimum.reduceat(tied, firsts)
+            elif len(d):
+                order = np.lexsort((candidates, d, members))
+                members, candidates, d = members[order], candidates[order], d[order]
+                rank = np.arange(len(members)) - np.searchsorted(members, members)
+                keep = rank < k
+                rows[members[keep], rank[keep]], dists[members[keep], rank[keep]] = candidates[keep], d[keep]
+            start = stop
+
+        return rows, dists
+
+    # distance from the queries to the nearest point which may lie beyond the cells next to the query cells - the
+    # grid without these cells is the sum of boxes below and above them along each axis
+    def bound(self, queries, cells):
+        gaps = np.maximum(np.maximum(self.lower - queries, queries - self.upper), 0) ** 2
+        bound = np.full(len(queries), np.inf)
+        for a in range(queries.shape[1]):
+            others, q = gaps.sum(axis=1) - gaps[:, a], queries[:, a]
+            below = self.lower[a] + (cells[:, a] - 1) * self.cell
+            above = self.lower[a] + (cells[:, a] + 2) * self.cell
+            for exists, gap in [(cells[:, a] > 1, np.maximum(self.lower[a] - q, q - below)),
+                                (cells[:, a] < self.shape[a] - 2, np.maximum(above - q, q - self.upper[a]))]:
+                bound = np.where(exists, np.minimum(bound, np.sqrt(others + np.maximum(gap, 0) ** 2)), bound)
+
+        return bound * (1 - 1e-12)
+
+    # indices and distances of k nearest points to each query (q, k)
+    def k_nearest_rows(self, queries, k):
+        queries, k = self.queries(queries), min(k, len(self))
+        if not k:
+            return np.zeros((len(queries), 0), dtype=np.int64), np.zeros((len(queries), 0))
+
+        if len(self) <= SMALL:
+            rows, dists = np.zeros((len(queries), k), dtype=np.int64), np.zeros((len(queries), k))
+            step = CHUNK // len(self)
+            for s in range(0, len(queries), step):
+                d = distances(queries[s:s + step], self.points)
+                order = np.argsort(d, axis=1, kind='stable')[:, :k]
+                rows[s:s + step], dists[s:s + step] = order, np.take_along_axis(d, order, axis=1)
+            return rows, dists
+
+        cells = self.grid(queries)
+        rows, dists = self.sweep(queries, cells, k)
+        todo = np.flatnonzero(~(dists[:, -1] < self.bound(queries, cells)))
+        if len(todo):
+            rows[todo], dists[todo] = self.coarser().k_nearest_rows(queries[todo], k)
+
+        return rows, dists
+
+    def nearest(self, points):
+        '''Tags of the nearest point to each of the points and the distances to them'''
+        rows, dists = self.k_nearest_rows(points, 1)
+        return self.tags[rows[:, 0]], dists[:, 0]
+
+    def k_nearest(self, points, k):
+        '''Tags of k nearest points to each of the points (q, k) ordered by distance and the distances to them'''
+        rows, dists = self.k_nearest_rows(points, k)
+        return self.tags[rows], dists
+
+    def radius(self, points, r):
+        '''Tags of points not further than r from each of the points, list of arrays'''
+        queries = self.queries(points)
+        found = self.search(*self.window(queries - r, queries + r),
+                            lambda q, p: np.sqrt(((queries[q] - self.points[p]) ** 2).sum(axis=1)) <= r)
+
+        return [self.tags[f] for f in found]
+
+    def box(self, lower, upper):
+        '''Tags of points inside the box (borders included) - one array for a single box, list of arrays if lower
+        and upper are arrays of corners'''
+        lower, upper = np.asarray(lower, dtype=float), np.asarray(upper, dtype=float)
+        if lower.ndim == 1:
+            return self.box(lower[None], upper[None])[0]
+
+        lower, upper = self.queries(lower), self.queries(upper)
+        found = self.search(*self.window(lower, upper),
+                            lambda q, p: ((self.points[p] >= lower[q]) & (self.points[p] <= upper[q])).all(axis=1))
+
+        return [self.tags[f] for f in found]
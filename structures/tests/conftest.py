@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+# scripts of the repository import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmark
+import mock_safir
+
+
+# XML results of mock SAFIR for a frame of benchmark.py, each run in its own directory
+@pytest.fixture
+def mock_results(tmp_path, monkeypatch):
+    def run(name='frame', steps=4, bays=1, load=-10000.0):
+        directory = tmp_path / name
+        directory.mkdir()
+        path = directory / f'{name}.IN'
+        benchmark.frame(str(path), bays=bays, storeys=1, fibers=4)
+        path.write_text(path.read_text().replace('-10000.0', str(load)))
+        for profile in benchmark.PROFILES:
+            (directory / f'{profile}.tem').touch()
+        monkeypatch.chdir(directory)
+        assert mock_safir.run(name, steps=steps) == 0
+
+        return str(directory / f'{name}.XML')
+
+    return run
@@ -0,0 +1,133 @@
+import sys
+from math import isclose
+from types import ModuleType
+
+import numpy as np
+
+import benchmark
+import mock_safir
+from safir_tools import read_in
+
+# meshing (gmsh) and reading of DXF areas are not needed to map reactions to beams, the modules are only imported
+for name in ('gmsh', 'dxfgrabber'):
+    try:
+        __import__(name)
+    except (ImportError, OSError):
+        sys.modules[name] = ModuleType(name)
+
+from area2lineload import Convert, distance, is_between
+
+
+def converter(path_to_in):
+    convert = Convert.__new__(Convert)    # without meshing the edges of areas
+    convert.paths = {'infile': path_to_in, 'calc': str(path_to_in.parent)}
+    convert.parse_cache = None
+    return convert
+
+
+# mapping as it was done before the spatial index - every reaction point is checked for every beam
+def brute_force(points, reactions):
+    middle = points[1][1:]
+    length = distance(points[0][1:], points[2][1:])
+    d1, d2 = 999, 999
+    to_inter = [None, None]
+    for r in reactions:
+        d_r = distance(r[0], middle)
+        if all([isclose(middle[i], r[0][i], rel_tol=0.01) for i in range(3)]):
+            return [-load / length for load in r[1]]
+        elif d_r < d1:
+            d1 = d_r
+            to_inter[0] = r
+
+    for r in reactions:
+        if is_between(to_inter[0][0], middle, r[0]):
+            d_r = distance(r[0], middle)
+            if d_r < d2:
+                d2 = d_r
+                to_inter[1] = r
+
+    if to_inter[1] is None:
+        return []
+    return [-np.interp(0, [-d1, d2], [to_inter[i][1][dof] for i in (0, 1)]) / length for dof in range(6)]
+
+
+def mapped(path):
+    loads = {}
+    with open(path) as file:
+        for line in file:
+            if line.startswith(' DISTRBEAM'):
+                tag, *values = line.split()[1:]
+                loads.setdefault(int(tag), [float(v) for v in values])  # mapped loads are before the original ones
+            elif 'END_LOAD' in line:
+                break
+    return loads
+
+
+# reaction points along the beams of the frame, every <spacing> from <start>, with random reactions
+def reactions_along(infile, start, spacing, rng):
+    nodes = {int(n[0]): np.array(n[1:]) for n in infile.nodes}
+    points = []
+    for be in infile.beams:
+        first, last = nodes[int(be[1])], nodes[int(be[3])]
+        if first[2] == last[2]:
+            length = np.linalg.norm(last - first)
+            points += [first + (last - first) * s / length for s in np.arange(start, length, spacing)]
+    return [[p.tolist(), rng.uniform(-1e4, 1e4, 7).tolist()] for p in points]
+
+
+def test_map_l2e_matches_brute_force(tmp_path):
+    path = tmp_path / 'frame.in'
+    benchmark.frame(str(path), bays=3, storeys=1, fibers=4)
+    infile = read_in(str(path))
+    rng = np.random.default_rng(0)
+
+    # middle points of the beams between reaction points and on reaction points
+    dummies = [reactions_along(infile, 0.1, 0.35, rng), reactions_along(infile, 0., 0.25, rng)]
+    assert len(dummies[0]) > 256     # spatial grid is used rather than brute force of small sets
+
+    # reaction point next to the middle of the last beam surrounded by points out of its axis, so the opposite one is
+    # beyond the nearest 16
+    first, middle = [np.array(infile.nodes.entity(int(infile.beams[-1][i]))[1:]) for i in (1, 2)]
+    axis = (middle - first) / np.linalg.norm(middle - first)
+    sparse = [r for r in dummies[0] if not is_between(middle - 3 * axis, r[0], middle + 3 * axis)]
+    sparse += [[(middle + 0.2 * axis).tolist(), [1e3] * 7], [(middle - 2.9 * axis).tolist(), [-1e3] * 7]]
+    sparse += [[(middle + [0, 0, 0.5] + 0.1 * i * axis).tolist(), [0] * 7] for i in range(-10, 10)]
+    dummies.append(sparse)
+
+    order = np.argsort([distance(r[0], middle) for r in sparse])
+    assert list(order).index(len(sparse) - 21) >= 16    # opposite point found by the fallback to all points
+
+    for no, dummy in enumerate(dummies):
+        converter(path).assign_loads([[str(no)] + dummy])
+        loads = mapped(tmp_path / 'frame_ll.in')
+
+        expected = {}
+        for be in infile.beams:
+            points = [infile.nodes.entity(int(i)) for i in be[1:4]]
+            e_load = brute_force(points, dummy)
+            if e_load:
+                expected[int(be[0])] = e_load[:3]
+        assert expected
+        assert loads.keys() == expected.keys()
+        for tag, e_load in expected.items():
+            assert np.allclose(loads[tag], e_load, rtol=1e-12)
+
+
+def test_read_results(tmp_path, monkeypatch):
+    calc = tmp_path / 'out-files'
+    calc.mkdir()
+    benchmark.frame(str(calc / 'dummy_0.IN'), bays=1, storeys=1, fibers=4)
+    for profile in benchmark.PROFILES:
+        (calc / f'{profile}.tem').touch()
+    monkeypatch.chdir(calc)
+    assert mock_safir.run('dummy_0', steps=2) == 0
+
+    convert = converter(tmp_path / 'frame.in')
+    convert.paths['calc'] = str(calc)
+    reactions = convert.read_results()
+
+    model = mock_safir.MockModel('dummy_0')
+    share = [-f / len(model.fixed) for f in model.load]
+    assert [r[0] for r in reactions] == ['0']
+    assert [r[0] for r in reactions[0][1:]] == [model.nodes[n] for n in model.fixed]
+    assert all(np.allclose(r[1][:3], share, rtol=1e-4) for r in reactions[0][1:])
@@ -0,0 +1,26 @@
+import pytest
+
+from safir_tools import EntityTable
+
+
+def test_rows_write_through():
+    nodes = EntityTable([1, 2, 3], [[0., 0.], [1., 0.], [2., 0.]])
+    nodes[1][2] = 5.
+    for node in nodes:
+        node[1] += 10.
+
+    assert nodes.tolist() == [[1, 10., 0.], [2, 11., 5.], [3, 12., 0.]]
+    copy = nodes[:]
+    copy[0][1] = -1.
+    assert nodes[0] == [1, 10., 0.]
+
+
+def test_index_made_again_when_tags_change():
+    beams = EntityTable([1, 2, 3], [[1, 2, 1], [2, 3, 1], [3, 4, 2]], dtype=int)
+    beams[2] = [7, 3, 4, 2]
+    beams[0][0] = 5
+    assert beams.stale
+
+    assert beams.entity(7) == [7, 3, 4, 2] and beams.row(5) == 0
+    with pytest.raises(KeyError):
+        beams.row(3)
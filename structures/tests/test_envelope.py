@@ -0,0 +1,38 @@
+import csv
+
+import numpy as np
+
+from envelope import Envelope, envelope, scenario_envelope
+from safir_tools import load_results
+
+
+# envelope of scenarios run in parallel is the max/min over all steps of all scenarios, with the scenario and time of
+# the governing value
+def test_merged_envelope_matches_serial(mock_results, tmp_path):
+    paths = [mock_results(f'scenario{i}', steps=steps, load=load)
+             for i, (steps, load) in enumerate([(3, -10000.0), (5, -25000.0), (4, 5000.0)])]
+    results = [load_results(p) for p in paths]
+    total = envelope(paths, output=str(tmp_path / 'envelope.csv'), jobs=2)
+
+    assert sorted(total.arrays) == ['displacements', 'mnv', 'reactions']
+    for name, env in total.arrays.items():
+        steps = np.concatenate([getattr(r, name) for r in results])
+        assert np.array_equal(env[0], steps.max(axis=0))
+        assert np.array_equal(env[3], steps.min(axis=0))
+        for value in (0, 3):
+            for index in np.ndindex(*env[value].shape):
+                r = results[env[value + 1][index]]
+                assert getattr(r, name)[list(r.times).index(env[value + 2][index])][index] == env[value][index]
+
+    # merging order does not change the values
+    serial = Envelope()
+    for i in reversed(range(len(paths))):
+        serial.merge(scenario_envelope(paths[i], i))
+    for name, env in total.arrays.items():
+        assert np.array_equal(serial.arrays[name][0], env[0]) and np.array_equal(serial.arrays[name][3], env[3])
+
+    with open(tmp_path / 'envelope.csv') as file:
+        rows = list(csv.DictReader(file))
+    assert len(rows) == sum(env[0].size for env in total.arrays.values())
+    assert {r['max_scenario'] for r in rows} <= {'scenario0/scenario0.XML', 'scenario1/scenario1.XML',
+                                                 'scenario2/scenario2.XML'}
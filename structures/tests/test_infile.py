@@ -0,0 +1,76 @@
+import numpy as np
+
+import benchmark
+from safir_tools import InFile, read_entities, read_in
+
+
+# tables of the single pass parser are the same as the ones of read_entities, for thermal solids with real values too
+def test_parse_matches_read_entities(tmp_path):
+    benchmark.frame(str(tmp_path / 'frame.IN'), bays=2, storeys=1, fibers=4)
+    benchmark.section(str(tmp_path / 'hea180.IN'), 'hea180', fibers=9)
+
+    for name in ['frame', 'hea180']:
+        infile = read_in(str(tmp_path / f'{name}.IN'))
+        tables, blocks = read_entities(infile.file_lines)
+        for entity, table in tables.items():
+            assert np.array_equal(getattr(infile, entity).tags, table.tags)
+            assert np.array_equal(getattr(infile, entity).values, table.values)
+
+    solids = read_in(str(tmp_path / 'hea180.IN')).solids
+    assert len(solids) == 9 and solids.values.dtype == np.float64
+    assert (solids.values[:, -2:] == [1, 0]).all()
+
+
+def test_legacy_get(tmp_path):
+    benchmark.frame(str(tmp_path / 'frame.IN'), bays=1, storeys=1, fibers=4)
+    infile = read_in(str(tmp_path / 'frame.IN'))
+    legacy = InFile.__new__(InFile)
+    legacy.file_lines = infile.file_lines
+
+    assert legacy.get('nodes') == [list(r) for r in infile.nodes]
+    assert legacy.get('beams') == [list(r) for r in infile.beams]
+
+
+# all nodes transformed at once, the NODES block written again and the other lines kept
+def test_transforms_written_to_nodes(tmp_path):
+    path = str(tmp_path / 'frame.IN')
+    benchmark.frame(path, bays=1, storeys=1, fibers=4)
+    infile = read_in(path)
+    lines = list(infile.file_lines)
+
+    expected = []
+    for x, y, z in infile.nodes.values.tolist():
+        x, y = 3 - (y - 3), 3 + (x - 3)     # 90 degrees about Z axis through (3, 3)
+        x = 2 - x   # mirrored in the plane x = 1
+        expected.append([2 * x + 1, y + 2, 0.5 * z + 3])
+    infile.rotate(90, point=(3, 3, 0))
+    infile.mirror((1, 0, 0), point=(1, 0, 0))
+    infile.scale((2, 1, 0.5))
+    infile.move((1, 2, 3))
+    assert np.allclose(infile.nodes.values, expected)
+
+    infile.save_line('transformed.IN', path=str(tmp_path))
+    transformed = read_in(str(tmp_path / 'transformed.IN'))
+    assert np.array_equal(transformed.nodes.values, infile.nodes.values)
+    assert np.array_equal(transformed.nodes.tags, infile.nodes.tags)
+    assert np.array_equal(transformed.beams.values, infile.beams.values)
+    assert [line for line in transformed.file_lines if 'NODE' not in line.split()[:1]] == \
+           [line for line in lines if 'NODE' not in line.split()[:1]]
+
+    # right angles are exact
+    for _ in range(4):
+        transformed.rotate(90, axis=(1, 0, 0), point=(1, 2, 3))
+    assert np.array_equal(transformed.nodes.values, infile.nodes.values)
+
+
+# 2D models are transformed in their XY plane
+def test_transform_2d(tmp_path):
+    path = str(tmp_path / 'hea180.IN')
+    benchmark.section(path, 'hea180', fibers=9)
+    infile = read_in(path)
+    coords = infile.nodes.values.copy()
+
+    infile.move((0.5, -0.25, 1))
+    assert infile.nodes.values.shape[1] == 2
+    assert np.array_equal(infile.nodes.values, coords + [0.5, -0.25])
+    assert len(infile.file_lines) == len(read_in(path).file_lines)
@@ -0,0 +1,66 @@
+import numpy as np
+
+import benchmark
+from safir_tools import EntityTable, Geometry, Material, NewInFile
+
+
+def same_geometry(a, b):
+    for name in Geometry.KINDS:
+        assert np.array_equal(getattr(a, name).table.tags, getattr(b, name).table.tags)
+        assert np.array_equal(getattr(a, name).table.values, getattr(b, name).table.values)
+    assert a.profiles == b.profiles
+
+
+# geometry written to the lines and read from them again is the same, for structural and thermal models
+def test_geometry_round_trip(tmp_path):
+    benchmark.frame(str(tmp_path / 'frame.IN'), bays=2, storeys=1, fibers=4)
+    benchmark.section(str(tmp_path / 'hea180.IN'), 'hea180', fibers=9)
+
+    for name in ['frame', 'hea180']:
+        with open(tmp_path / f'{name}.IN') as file:
+            lines = file.readlines()
+        geometry = Geometry().read(lines)
+        written = geometry.write(list(lines))
+        assert len(written) == len(lines)
+        same_geometry(Geometry().read(written), geometry)
+
+    beams = Geometry().read(lines, dim='beams')
+    assert len(beams.beams) == 0 and len(beams.nodes) == 0
+    assert set(Geometry().write(dim=[0, 'beams'])) == {'nodes', 'beams'}
+
+
+# file is not changed by the round trip, changed data is written and read back
+def test_new_in_file_round_trip(tmp_path):
+    path = str(tmp_path / 'frame.IN')
+    benchmark.frame(path, bays=2, storeys=1, fibers=4)
+    with open(path) as file:
+        original = file.readlines()
+
+    model = NewInFile('Structural3D').read_sim(path)
+    assert model.chid == 'frame' and model.nfiber == 4 and model.time_end == benchmark.T_END
+    assert [m.name for m in model.materials] == ['STEELEC3EN']
+    model.write_lines(str(tmp_path / 'same.IN'))
+    with open(tmp_path / 'same.IN') as file:
+        assert file.readlines() == original
+
+    model.time_end = 3600.0
+    model.nfiber = 8
+    model.description = 'Frame changed by the round trip'
+    model.materials.append(Material('STEELEC3EN', [[2.1e11, 0.3, 2.35e8, 1200.0, 1200.0]]))
+    beams = model.geom.beams.table
+    model.geom.beams.table = EntityTable(beams.tags[:-2], beams.values[:-2])
+    model.geom.profiles['b'] = model.geom.profiles['b'][:1]
+    model.write_lines(str(tmp_path / 'changed.IN'))
+
+    changed = NewInFile('Structural3D').read_sim(str(tmp_path / 'changed.IN'))
+    assert changed.description == 'Frame changed by the round trip'
+    assert changed.time_end == 3600.0 and changed.nfiber == 8
+    assert [[m.name, m.parameters] for m in changed.materials] == [[m.name, m.parameters] for m in model.materials]
+    same_geometry(changed.geom, model.geom)
+    assert changed.find('BEAM', end=changed.find('NODES')) is not None
+    assert changed.lines[changed.find('BEAM')].split()[1:] == [str(len(beams) - 2), '1']
+    assert changed.lines[changed.find('NMAT')].split()[1] == '2'
+
+    # header, materials and time only
+    header = NewInFile('Structural3D').read_sim(str(tmp_path / 'changed.IN'), dim=[])
+    assert header.time_end == 3600.0 and len(header.geom.beams) == 0
@@ -0,0 +1,43 @@
+import os
+
+import benchmark
+from safir_tools import read_in
+
+
+def test_restored_from_relative_path(tmp_path, monkeypatch):
+    cache = str(tmp_path / 'cache')
+    (tmp_path / 'model').mkdir()
+    benchmark.frame(str(tmp_path / 'model' / 'frame.IN'), bays=1, storeys=1, fibers=4)
+    monkeypatch.chdir(tmp_path / 'model')
+    parsed = read_in('frame.IN', cache=cache)
+
+    restored = read_in('frame.IN', cache=cache)
+    monkeypatch.chdir(tmp_path)
+    assert restored.file_lines == parsed.file_lines
+    assert (restored.nodes.values == parsed.nodes.values).all()
+
+
+def test_previous_versions_kept(tmp_path):
+    cache, path = str(tmp_path / 'cache'), str(tmp_path / 'frame.IN')
+    benchmark.frame(path, bays=1, storeys=1, fibers=4)
+    read_in(path, cache=cache)
+    with open(path, 'a') as file:
+        file.write('\n')
+    read_in(path, cache=cache)
+
+    assert len([e for e in os.listdir(cache) if e != 'paths']) == 2
+
+
+# corrupt entries are reported and removed, the file is parsed and stored again
+def test_corrupt_entry_removed(tmp_path, capsys):
+    cache, path = str(tmp_path / 'cache'), str(tmp_path / 'frame.IN')
+    benchmark.frame(path, bays=1, storeys=1, fibers=4)
+    parsed = read_in(path, cache=cache)
+    entry = next(e.path for e in os.scandir(cache) if e.name != 'paths')
+    with open(os.path.join(entry, 'beams.npz'), 'wb') as file:
+        file.write(b'corrupt')
+
+    assert read_in(path, cache=cache).beams == parsed.beams
+    assert '[WARNING] Parse cache entry of frame.IN is corrupt' in capsys.readouterr().out
+    assert read_in(path, cache=cache).beams == parsed.beams
+    assert capsys.readouterr().out == ''
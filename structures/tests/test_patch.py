@@ -0,0 +1,58 @@
+import random
+
+from safir_tools import Patch
+
+
+# edits applied to a copy of the lines one by one, from the last line number, so the numbers do not shift
+def edited(lines, edits):
+    lines = list(lines)
+    for i in sorted({i for kind, i, text in edits}, reverse=True):
+        replaced = [text for kind, j, text in edits if j == i and kind != 'insert']
+        if replaced:
+            lines[i:i + 1] = [replaced[-1]] if replaced[-1] else []
+        lines[i:i] = [text for kind, j, text in edits if j == i and kind == 'insert']
+    return lines
+
+
+def test_edits_keyed_by_original_lines():
+    lines = [f'line {i}\n' for i in range(10)]
+    patch = Patch(lines)
+    patch.insert(0, 'first\n')
+    patch.replace(3, 'replaced 3\n')
+    patch.insert(3, 'before 3\n')
+    patch.insert(3, 'before 3 again\n')
+    patch.delete(4)
+    patch.insert(4, 'before deleted 4\n')
+    patch.replace(5, 'replaced 5\n')
+    patch.delete(5)     # the last edit of the line wins
+    patch.insert(10, 'last\n')
+
+    assert list(patch) == ['first\n', 'line 0\n', 'line 1\n', 'line 2\n', 'before 3\n', 'before 3 again\n',
+                           'replaced 3\n', 'before deleted 4\n', 'line 6\n', 'line 7\n', 'line 8\n', 'line 9\n',
+                           'last\n']
+    assert patch[3] == 'replaced 3\n' and patch[4] == '' and patch[6] == 'line 6\n'
+    assert lines == [f'line {i}\n' for i in range(10)]   # nothing is changed until applied
+
+    applied = patch.apply()
+    assert applied is lines and lines[0] == 'first\n' and len(lines) == 13
+    assert not patch.replaced and not patch.inserted
+    patch.replace(0, 'first replaced\n')
+    assert list(patch)[0] == 'first replaced\n'
+
+
+def test_random_edits(tmp_path):
+    rng = random.Random(0)
+    lines = [f'line {i}\n' for i in range(50)]
+    for _ in range(20):
+        patch, edits = Patch(lines), []
+        for _ in range(30):
+            kind, i = rng.choice(['replace', 'delete', 'insert']), rng.randrange(len(lines) + 1)
+            i = min(i, len(lines) - 1) if kind != 'insert' else i
+            text = '' if kind == 'delete' else f'{kind} {i} {rng.random()}\n'
+            patch.delete(i) if kind == 'delete' else getattr(patch, kind)(i, text)
+            edits.append((kind, i, text))
+        assert list(patch) == edited(lines, edits)
+
+    patch.write(str(tmp_path / 'patched.IN'))
+    with open(tmp_path / 'patched.IN') as file:
+        assert file.readlines() == edited(lines, edits)
@@ -0,0 +1,87 @@
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import benchmark
+import iso2nf
+from preflight import check_in, check_t0r, check_transfer
+
+
+def edited(path, old, new, count=1):
+    with open(path) as file:
+        text = file.read()
+    assert old in text
+    with open(path, 'w') as file:
+        file.write(text.replace(old, new, count))
+
+
+def test_valid_files(tmp_path):
+    benchmark.frame(str(tmp_path / 'frame.IN'), bays=1, storeys=1, fibers=4)
+    benchmark.section(str(tmp_path / 'hea180.IN'), 'hea180', fibers=9)
+    benchmark.torsion(str(tmp_path / 'hea180-1.T0R'), 9)
+    benchmark.transfer(str(tmp_path / 'cfd.txt'), [0, 6, 0, 6, 0, 4])
+
+    assert check_in(str(tmp_path / 'frame.IN'))[0] == []
+    assert check_in(str(tmp_path / 'hea180.IN')) == ([], {'nfiber': None, 'solids': 9, 'time_end': benchmark.T_END})
+    assert check_t0r(str(tmp_path / 'hea180-1.T0R')) == ([], {'nfiber': 9})
+    assert check_transfer(str(tmp_path / 'cfd.txt')) == ([], {'time_end': benchmark.T_END})
+
+
+def test_malformed_in(tmp_path):
+    path = str(tmp_path / 'frame.IN')
+    benchmark.frame(path, bays=1, storeys=1, fibers=4)
+    edited(path, 'NNODE    ', 'NNODE    1')     # NNODE 1xx
+    edited(path, '      ELEM    1    1    ', '      ELEM    1    999    ')
+    edited(path, '      NMAT    1', '      NMAT    2')
+    edited(path, ' PRECISION', 'curve.txt\n PRECISION')
+
+    problems = check_in(path)[0]
+    assert any('NNODE is 1' in p for p in problems)
+    assert any('refer to nodes not defined (element 1 - node 999)' in p for p in problems)
+    assert any('NMAT is 2, but there are 1 materials' in p for p in problems)
+    assert any('curve.txt was not found' in p for p in problems)
+
+    edited(path, '     NODES\n', '\n')
+    assert check_in(path) == (['frame.IN: there is no NODES block'], {})
+
+
+def test_malformed_t0r(tmp_path):
+    path = str(tmp_path / 'hea180-1.T0R')
+    assert check_t0r(path)[0] == ['hea180-1.T0R: torsion file was not found']
+
+    benchmark.torsion(path, 9)
+    edited(path, ' GJ', ' XX')
+    assert check_t0r(path) == (['hea180-1.T0R: there are no torsion results'], {'nfiber': 9})
+    edited(path, 'NFIBERBEAM', 'NFIBER')
+    assert check_t0r(path)[0][-1] == 'hea180-1.T0R: there is no NFIBERBEAM line'
+
+
+def test_malformed_transfer(tmp_path):
+    path = str(tmp_path / 'cfd.txt')
+    benchmark.transfer(path, [0, 6, 0, 6, 0, 4])
+    with open(path) as file:
+        lines = file.readlines()
+    with open(path, 'w') as file:
+        file.writelines(lines[:-2])     # the last time step is being written
+    problems = check_transfer(path)[0]
+    assert len(problems) == 1 and 'the last time step has' in problems[0]
+
+    edited(path, 'NP\n    ', 'NP\n    1')
+    assert 'NP is 1' in check_transfer(path)[0][0]
+
+    with open(path, 'w') as file:
+        file.writelines(lines[:lines.index('XYZ_INTENSITIES\n') + 2] + ['END_XYZ\n'])
+    assert check_transfer(path)[0][-1] == 'cfd.txt: there are no time steps'
+
+
+# unexpected errors of a checker are reported as problems of that file only
+def test_checker_error_reported(tmp_path, monkeypatch):
+    path = str(tmp_path / 'frame.IN')
+    benchmark.frame(path, bays=1, storeys=1, fibers=4)
+
+    def broken(in_file_path):
+        raise TypeError('malformed line')
+    monkeypatch.setattr(iso2nf, 'ProcessPoolExecutor', ThreadPoolExecutor)
+    monkeypatch.setattr(iso2nf, 'check_in', broken)
+    check = iso2nf.Check(SimpleNamespace(input_file=path, thermals=[]), jobs=1)
+
+    assert check.files() == {path: (['frame.IN could not be read: TypeError: malformed line'], {})}
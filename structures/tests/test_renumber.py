@@ -0,0 +1,41 @@
+import numpy as np
+
+import benchmark
+from safir_tools import read_in
+
+
+# edits recorded in the patch before renumbering are written on the lines they were made for
+def test_patch_then_renumber(tmp_path):
+    path = str(tmp_path / 'frame.IN')
+    benchmark.frame(path, bays=2, storeys=2, fibers=4)
+
+    def edit(infile):
+        loads = [i for i, line in enumerate(infile.file_lines) if line.split()[:1] == ['DISTRBEAM']]
+        infile.patch.replace(0, 'Frame patched before renumbering\n')
+        infile.patch.insert(2, '\n')
+        infile.patch.delete(loads[0])
+        infile.patch.replace(loads[1], infile.file_lines[loads[1]].replace('-10000.0', '-5000.0'))
+        # fixations are sorted by the new node tags, so the line is moved
+        fixed = next(i for i, line in enumerate(infile.file_lines) if line.split()[:2] == ['BLOCK', '1'])
+        infile.patch.replace(fixed, infile.file_lines[fixed].replace('F0', 'NO', 1))
+
+    infile = read_in(path)
+    edit(infile)
+    old = infile.renumber()
+    infile.save_line('renumbered.IN', path=str(tmp_path))
+
+    # the same edits saved first and the saved file renumbered
+    expected = read_in(path)
+    edit(expected)
+    expected.save_line('patched.IN', path=str(tmp_path))
+    expected = read_in(str(tmp_path / 'patched.IN'))
+    assert (expected.renumber() == old).all()
+
+    with open(tmp_path / 'renumbered.IN') as file:
+        lines = file.readlines()
+    assert lines == expected.patch.lines
+    assert lines[0] == 'Frame patched before renumbering\n' and lines[2] == '\n'
+    assert sum('-5000.0' in line for line in lines) == 1
+    assert sum(line.split()[:3] == ['BLOCK', str(old.tolist().index(1) + 1), 'NO'] for line in lines) == 1
+    renumbered = read_in(str(tmp_path / 'renumbered.IN'))
+    assert np.array_equal(renumbered.nodes.tags, np.arange(1, len(old) + 1))
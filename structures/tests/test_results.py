@@ -0,0 +1,111 @@
+from xml.dom.minidom import parse
+
+import numpy as np
+import pytest
+
+import benchmark
+from safir_tools import LoadFullXML, ReadXML, ResultsNpy, decimate, xml2npy
+
+
+# streamed reader gives the same results as the NumPy bundle and as the minidom reader it replaced
+def test_read_xml_matches_bundle(mock_results):
+    path = mock_results(steps=5)
+    xml = ReadXML(path)
+    npy = ResultsNpy(xml2npy(path))
+
+    assert np.array_equal(xml.times(), npy.times)
+    assert np.array_equal(xml.nodes(), npy.nodes)
+    for step in range(len(npy.times)):
+        reactions = xml.reactions(step)
+        assert [r[0] for r in reactions] == npy.reaction_nodes.tolist()
+        assert np.array_equal([r[1:] for r in reactions], npy.reactions[step])
+    # MNV blocks are numbered from the second one, as the minidom reader did
+    for step in range(len(npy.times) - 1):
+        assert np.array_equal(xml.mnvs(step), npy.mnv[step + 1])
+    with pytest.raises(IndexError):
+        xml.reactions(len(npy.times))
+
+    doc = parse(path)
+    last = [float(r.firstChild.data) for r in doc.getElementsByTagName('REACTIONS')[-1].childNodes if r.nodeName == 'R']
+    assert last == [v for r in xml.reactions(-1) for v in r[1:]]
+    ngb = int(doc.getElementsByTagName('NGBM')[0].firstChild.data)
+    assert xml.ngb == ngb
+
+
+# MNV of mock SAFIR is (time / end time) * (beam + gauss point + quantity), both from the XML and from the bundle
+def test_mnv_array(mock_results):
+    path = mock_results(steps=5, bays=2)
+    xml = ReadXML(path)
+    factor = xml.times() / benchmark.T_END
+    beams = np.arange(1, xml.mnv_array(steps=0).shape[1] + 1)
+    expected = factor[:, None, None, None] * (beams[None, :, None, None] + np.arange(2)[:, None] + np.arange(7))
+
+    for bundle in [False, True]:
+        xml2npy(path) if bundle else None
+        assert xml.mnv_array().shape == (5, len(beams), 2, 7)
+        assert np.allclose(xml.mnv_array(), expected, rtol=1e-4)
+        assert np.allclose(xml.mnv_array(steps=-1), expected[-1:], rtol=1e-4)
+        assert np.allclose(xml.mnv_array(steps=slice(1, 4), beams=[3, 1]), expected[1:4, [2, 0]], rtol=1e-4)
+        assert np.allclose(xml.mnv_array(steps=[0, 4], beams=[len(beams)]), expected[[0, 4]][:, -1:], rtol=1e-4)
+        assert xml.mnv_array(steps=[]).shape[0] == 0
+
+
+# displacements of mock SAFIR are -(time / end time) * (z + DOF - 1) / 1000, MNV as above
+def test_history(mock_results):
+    path = mock_results(steps=4)
+    xml = ReadXML(path)
+    factor = xml.times() / benchmark.T_END
+    z = np.array(xml.nodes())[:, 2]
+    nodes = [len(z), 1, 5]
+
+    for bundle in [False, True]:
+        xml2npy(path) if bundle else None
+        for dof in [1, 3, 7]:
+            expected = -factor[:, None] * (z[np.array(nodes) - 1] + dof - 1) * 1e-3
+            assert np.allclose(xml.history(nodes, dof), expected, rtol=1e-4)
+            assert np.allclose(xml.history(nodes, dof, steps=slice(2, None)), expected[2:], rtol=1e-4)
+
+        mnv = xml.mnv_array()
+        assert np.array_equal(xml.history_beam([2, 7], 'My'), mnv[:, [1, 6]][..., 2])
+        assert np.array_equal(xml.history_beam([2, 7], 3, steps=[0, -1]), mnv[[0, -1]][:, [1, 6]][..., 2])
+        assert np.allclose(xml.history_beam([4], 'N', steps=-1), [[[4, 5]]], rtol=1e-4)
+
+
+# the same arrays as in the bundle, whether blocks of steps are parsed by a pool of processes or one by one
+@pytest.mark.parametrize('processes', [1, 2])
+def test_load_full_xml(mock_results, processes):
+    path = mock_results(steps=5)
+    npy = ResultsNpy(xml2npy(path))
+    full = LoadFullXML(path, processes=processes, blocks_per_process=2)
+
+    assert sorted(full.db) == sorted(set(npy.meta['arrays']))
+    for name in full.db:
+        assert np.array_equal(full.db[name], getattr(npy, name), equal_nan=True)
+    assert full.meta['ngbm'] == npy.meta['ngbm']
+
+
+# first step of every Nth ones and the last one are kept, results of the kept steps are not changed
+def test_decimate(mock_results, tmp_path):
+    path = mock_results(steps=5)
+    xml = ReadXML(path)
+    times = xml.times()
+
+    for every, times_kept, steps in [(2, None, [0, 2, 4]), (3, None, [0, 3, 4]), (None, [400, 700], [0, 1, 4])]:
+        small = str(tmp_path / f'decimated_{every}.XML')
+        assert decimate(path, every=every, times=times_kept, path=small) == 0
+        decimated = ReadXML(small)
+        assert np.array_equal(decimated.times(), times[steps])
+        assert np.array_equal(decimated.nodes(), xml.nodes())
+        assert np.array_equal(decimated.mnv_array(), xml.mnv_array(steps=steps))
+        assert np.array_equal(decimated.history([1, 5], 3), xml.history([1, 5], 3, steps=steps))
+
+    # nodes in the box and beams made of them only, both renumbered
+    boxed = str(tmp_path / 'boxed.XML')
+    assert decimate(path, every=4, bbox='0,0,3,6,6,5', path=boxed) == 0
+    decimated = ReadXML(boxed)
+    inside = [i for i, n in enumerate(xml.nodes()) if n[2] >= 3]
+    assert np.array_equal(decimated.times(), times[[0, 4]])
+    assert np.array_equal(decimated.nodes(), np.array(xml.nodes())[inside])
+    expected = xml.history(np.array(inside) + 1, 1, steps=[0, 4])
+    assert np.array_equal(decimated.history(range(1, len(inside) + 1), 1), expected)
+    assert decimated.mnv_array().shape[1] == 4    # beams of the storey, columns stick out of the box
@@ -0,0 +1,72 @@
+import json
+import os
+from os.path import join
+
+import benchmark
+from safir_cache import SafirCache
+from safir_tools import run_safir
+from scheduler import Scheduler
+
+
+# frame with two beam types and their sections heated by LOCAFI, both thermal analyses run in the same directory
+def natural_fire(directory):
+    benchmark.frame(join(directory, 'frame.IN'), bays=1, storeys=1, fibers=4)
+    for btype, profile in enumerate(benchmark.PROFILES, start=1):
+        path = join(directory, f'{profile}.IN')
+        benchmark.section(path, profile, fibers=4)
+        with open(path) as file:
+            lines = file.read().replace('MAKE.TEM\n', f'MAKE.TEMLF\nframe.IN\nBEAM_TYPE {btype}\n')
+        with open(path, 'w') as file:
+            file.write(lines)
+
+    return [join(directory, f'{p}.IN') for p in benchmark.PROFILES]
+
+
+def beams(directory, btype):
+    with open(join(directory, 'frame.IN')) as file:
+        elements = [line.split() for line in file if line.split()[:1] == ['ELEM']]
+    return {f'b{int(e[1]):05d}_{g}.tem' for e in elements if int(e[-1]) == btype for g in (1, 2)}
+
+
+def test_concurrent_jobs_in_one_directory(tmp_path, monkeypatch):
+    monkeypatch.setenv('MOCK_SAFIR_DELAY', '0.05')
+    model_dir, cache = tmp_path / 'model', SafirCache(str(tmp_path / 'cache'))
+    model_dir.mkdir()
+    in_files = natural_fire(str(model_dir))
+
+    report = Scheduler(in_files, benchmark.MOCK_SAFIR, cores=2, fix_rlx=False, cache=cache).run()
+    assert [r['rc'] for r in report] == [0, 0]
+
+    entries = {}
+    for used, size, path in cache.entries():
+        with open(join(path, 'meta.json')) as file:
+            meta = json.load(file)
+        entries[os.path.basename(meta['in_file'])] = set(meta['files'])
+    for btype, profile in enumerate(benchmark.PROFILES, start=1):
+        assert entries[f'{profile}.IN'] == {f'{profile}.XML', f'{profile}.OUT'} | beams(str(model_dir), btype)
+
+    # restored results of one job do not overwrite results of the other one
+    results = {n: (model_dir / n).read_bytes() for n in os.listdir(model_dir) if not n.endswith('.IN')}
+    (model_dir / 'ipe300.XML').write_text('changed')
+    assert cache.restore(cache.key(in_files[0], benchmark.MOCK_SAFIR), in_files[0])
+    assert (model_dir / 'ipe300.XML').read_text() == 'changed'
+    assert all((model_dir / n).read_bytes() == r for n, r in results.items() if n.startswith(('hea180', 'b')))
+
+
+def test_torsion_results_owned(tmp_path):
+    path = str(tmp_path / 'hea180.IN')
+    benchmark.section(path, 'hea180', fibers=4)
+    names = ['hea180.XML', 'hea180-1.T0R', 'hea180-t.TOR', 'ipe300-1.T0R', 'hea180.IN', 'hea180_fixed.XML']
+
+    assert SafirCache.owned(path, names) == ['hea180.XML', 'hea180-1.T0R', 'hea180-t.TOR']
+
+
+# relaxations of restored results are repaired, the same as of calculated ones
+def test_fixed_xml_restored(tmp_path):
+    path, cache = str(tmp_path / 'hea180.IN'), SafirCache(str(tmp_path / 'cache'))
+    benchmark.section(path, 'hea180', fibers=4)
+    for _ in range(2):
+        assert run_safir(path, benchmark.MOCK_SAFIR, print_time=False, fix_rlx=True, cache=cache) == 0
+        assert (tmp_path / 'hea180_fixed.XML').exists()
+        os.remove(tmp_path / 'hea180_fixed.XML')
+    assert len(cache.entries()) == 1
@@ -0,0 +1,23 @@
+import os
+
+import benchmark
+from scheduler import Scheduler
+
+
+# results are moved back from the job directories, the license linked to them is not
+def test_isolated_async_jobs(tmp_path):
+    key = tmp_path / 'identity.key'
+    key.write_text('license')
+    model_dir = tmp_path / 'model'
+    model_dir.mkdir()
+    in_files = []
+    for profile in benchmark.PROFILES:
+        in_files.append(str(model_dir / f'{profile}.IN'))
+        benchmark.section(in_files[-1], profile, fibers=4)
+
+    report = Scheduler(in_files, benchmark.MOCK_SAFIR, cores=2, isolate=True, fix_rlx=False, key=str(key)).run_async()
+
+    assert [r['rc'] for r in report] == [0, 0]
+    names = set(os.listdir(model_dir))
+    assert {f'{p}.{e}' for p in benchmark.PROFILES for e in ['IN', 'XML', 'OUT']} <= names
+    assert 'identity.key' not in names and not any(n.endswith('.job') for n in names)
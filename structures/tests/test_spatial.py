@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from spatial import SpatialIndex
+
+
+# brute force results of radius and box queries, tags in order of the points
+@pytest.mark.parametrize('n, ndim', [(0, 3), (50, 3), (5000, 3), (5000, 2), (1000, 1)])
+def test_radius_and_box(n, ndim):
+    rng = np.random.default_rng(n + ndim)
+    points = rng.random((n, ndim)) * 10
+    points[:n // 2, -1] = 1.0   # points of a plane, as nodes of slabs
+    tags = rng.permutation(n) + 1
+    index = SpatialIndex(points, tags)
+    queries = rng.random((300, ndim)) * 12 - 1
+
+    for r in [0.0, 0.5, 3.0]:
+        found = index.radius(queries, r)
+        for q, f in zip(queries, found):
+            assert np.array_equal(f, tags[np.sqrt(((points - q) ** 2).sum(axis=1)) <= r])
+
+    upper = queries + rng.random((300, ndim)) * 2
+    for low, high, f in zip(queries, upper, index.box(queries, upper)):
+        assert np.array_equal(f, tags[((points >= low) & (points <= high)).all(axis=1)])
+    assert np.array_equal(index.box(queries[0], upper[0]), index.box(queries, upper)[0])
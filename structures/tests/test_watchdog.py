@@ -0,0 +1,33 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+from safir_tools import Watchdog, run_safir, run_safir_async
+
+
+# SAFIR stand-in printing only undecodable bytes, without ever reporting a time step
+@pytest.fixture
+def garbage(tmp_path):
+    exe = tmp_path / 'garbage.py'
+    exe.write_text(f'#!{sys.executable}\nimport sys, time\nwhile True:\n'
+                   f'    sys.stdout.buffer.write(b"\\xff\\xfe\\n")\n    sys.stdout.flush()\n    time.sleep(0.05)\n')
+    os.chmod(exe, 0o755)
+    (tmp_path / 'model.IN').write_text('TIME\n    1.0    60.0\nENDTIME\n')
+    return str(exe), str(tmp_path / 'model.IN')
+
+
+def test_stalled_undecodable_output(garbage):
+    exe, path = garbage
+    watchdog = Watchdog(stall_timeout=0.5)
+    assert run_safir(path, exe, print_time=False, fix_rlx=False, timeline=False, watchdog=watchdog) == -1
+    assert watchdog.reason.startswith('no new time step')
+
+
+def test_stalled_undecodable_output_async(garbage):
+    exe, path = garbage
+    watchdog = Watchdog(stall_timeout=0.5)
+    assert asyncio.run(run_safir_async(path, exe, print_time=False, fix_rlx=False, timeline=False,
+                                       watchdog=watchdog)) == -1
+    assert watchdog.reason.startswith('no new time step')